@@ -2,10 +2,11 @@
 # -*- coding: utf-8 -*-
 
 """
-二次変性時のAIIAC膜電位波形(AIIAC_x*_y*.txt)から 5–15 Hz のバンドパワーを計算
+二次変性時のAIIAC膜電位波形(AIIAC_x*_y*.trace / .txt)から 5–15 Hz のバンドパワーを計算
 gRBC2AC(%) × gjAC2CB(%) のスイープ結果を2DヒートマップとCSVで出力
 
-入力: ROOT_DIR内の AIIAC_x{gRBC2AC}_y{gjAC2CB}.txt
+入力: ROOT_DIR内の AIIAC_x{gRBC2AC}_y{gjAC2CB}.trace（同名の .txt しか無ければ .txt）
+      PREFIX="PSD" ならシミュレーション中に計算した PSD_x*_y*.psd（sweep_coupling_2d.py の BANDPOWER_ONLY）
 処理: 1000–6000 ms を抽出 → FFT/PSD → 5–15 Hz を積分
 出力: AIIAC_bandpower_gRBC2AC_vs_gjAC2CB.csv / .pdf
 """
@@ -19,8 +20,13 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from bandpower import BANDPOWER_SUFFIX, open_bandpower
+from traces import VOLTAGE_SUFFIXES, load_trace, prefer_binary
+
 # ======================= CONFIG ============================
 ROOT_DIR = "Dim_AIIAC_8-9M_gRBC2ACx_gjAC2CBy"
+PREFIX = "AIIAC"       # バンドル（sweep_coupling_2d.py の RECORD）を読むときは "BUNDLE"、BANDPOWER_ONLY の .psd は "PSD"
+CELL = "AIIAC[0]"      # バンドルから読む列（1細胞だけのファイルでは無視）
 
 CROP_MS = (1000.0, 6000.0)
 BAND_HZ = (5.0, 15.0)
@@ -38,12 +44,11 @@ OUT_CSV = "AIIAC_bandpower_gRBC2AC_vs_gjAC2CB.csv"
 OUT_PNG = "AIIAC_bandpower_gRBC2AC_vs_gjAC2CB.pdf"
 # ===========================================================
 
-FILENAME_RE = re.compile(r"^AIIAC_x(\d+)_y(\d+)\.txt$", re.IGNORECASE)
+FILENAME_RE = re.compile(rf"^{PREFIX}_x(\d+)_y(\d+)\.(?:psd|trace|txt)$", re.IGNORECASE)
 
 
 def load_aiiac(path: Path):
-    data = np.loadtxt(path, delimiter=",", skiprows=1)
-    return data[:, 0], data[:, 1]
+    return load_trace(path, CELL)
 
 
 def periodogram_psd(x, fs, use_hann=True):
@@ -61,6 +66,11 @@ def periodogram_psd(x, fs, use_hann=True):
 
 
 def bandpower(path: Path) -> float:
+    if path.suffix == BANDPOWER_SUFFIX:
+        # シミュレーション中に計算済み（sweep.BandPowerTarget）
+        bp = open_bandpower(path)
+        bp.check(CROP_MS, BAND_HZ, USE_HANN)
+        return bp.power(CELL)
     t_ms, v = load_aiiac(path)
     mask = (t_ms >= CROP_MS[0]) & (t_ms <= CROP_MS[1])
     t = t_ms[mask]
@@ -80,7 +90,7 @@ def main():
         np.nan
     )
 
-    for p in folder.glob("AIIAC_x*_y*.txt"):
+    for p in prefer_binary(folder.glob(f"{PREFIX}_x*_y*.*"), (BANDPOWER_SUFFIX,) + VOLTAGE_SUFFIXES):
         m = FILENAME_RE.match(p.name)
         if not m:
             continue
@@ -27,10 +27,15 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 
+from bandpower import BANDPOWER_SUFFIX, open_bandpower
+from traces import VOLTAGE_SUFFIXES, load_trace, prefer_binary
+
 TARGET = "AIIAC"
 # ======================= USER CONFIG (edit once) ============================
 ROOT_DIR: str = f"Dim_{TARGET}_fovea"                 # "" → use this script's folder; or set absolute path
-PATTERN: str = f"{TARGET}_R*_C*.txt"                  # filename glob pattern
+PREFIX: str = TARGET                                  # "BUNDLE" → sweep_rodcone.py の RECORD で作ったバンドルを読む / "PSD" → BANDPOWER_ONLY の .psd を読む
+CELL: str = f"{TARGET}[0]"                            # バンドルから読む列（1細胞だけのファイルでは無視）
+PATTERN: str = f"{PREFIX}_R*_C*.*"                    # filename glob pattern (.psd / .trace / .txt)
 RECURSIVE: bool = False                              # also search subfolders
 # Analysis window & band (ms and Hz)
 CROP_MS: Tuple[float, float] = (1000.0, 6000.0)
@@ -53,7 +58,7 @@ OUT_CSV: str = "AIIAC_bandpower_matrix_5-15Hz.csv"
 OUT_PNG: str = "AIIAC_bandpower_matrix_5-15Hz.pdf"
 # ===========================================================================
 
-FILENAME_RE = re.compile(rf"^{TARGET}_R(\d+)_C(\d+)\.txt$", re.IGNORECASE)
+FILENAME_RE = re.compile(rf"^{PREFIX}_R(\d+)_C(\d+)\.(?:psd|trace|txt)$", re.IGNORECASE)
 
 # ----------------------- helpers (NEW) -----------------------
 def trapz_compat(y, x=None, dx=1.0, axis=-1) -> float:
@@ -140,10 +145,8 @@ def integrate_band(f: np.ndarray, Pxx: np.ndarray, fmin: float, fmax: float) ->
 
 
 def load_aiiac(path: Path) -> Tuple[np.ndarray, np.ndarray]:
-    data = np.loadtxt(path, delimiter=",", skiprows=1)
-    if data.ndim != 2 or data.shape[1] < 2:
-        raise RuntimeError(f"File {path} does not have two numeric columns.")
-    return data[:, 0], data[:, 1]
+    # .trace は memmap で開く（.txt は従来どおり2列CSVとして読む）
+    return load_trace(path, CELL)
 
 
 def pick_folder(cli_folder: Optional[Path]) -> Path:
@@ -159,7 +162,7 @@ def pick_folder(cli_folder: Optional[Path]) -> Path:
 
 def iter_files(folder: Path, pattern: str, recursive: bool) -> List[Path]:
     it = folder.rglob(pattern) if recursive else folder.glob(pattern)
-    return sorted([p for p in it if p.is_file()], key=lambda p: p.name)
+    return prefer_binary((p for p in it if p.is_file()), (BANDPOWER_SUFFIX,) + VOLTAGE_SUFFIXES)
 
 
 def rc_from_name(path: Path) -> Optional[Tuple[int, int]]:
@@ -170,6 +173,13 @@ def rc_from_name(path: Path) -> Optional[Tuple[int, int]]:
 
 
 def compute_bandpower_for_file(path: Path, crop_ms: Tuple[float, float], band_hz: Tuple[float, float], detrend_linear: bool, use_hann: bool) -> float:
+    if path.suffix == BANDPOWER_SUFFIX:
+        # シミュレーション中に計算済み（sweep.BandPowerTarget）。条件が違えばトレースから計算し直すしかない
+        if detrend_linear:
+            raise ValueError("linear detrend is not available for .psd (run without --detrend-linear)")
+        bp = open_bandpower(path)
+        bp.check(crop_ms, band_hz, use_hann)
+        return bp.power(CELL)
     t_ms, v_mV = load_aiiac(path)
     tmin, tmax = crop_ms
     mask = (t_ms >= tmin) & (t_ms <= tmax)
@@ -197,7 +207,7 @@ def build_matrix(powers: Dict[Tuple[int, int], float], rod_counts: List[int], co
 
 def main(argv: Optional[Iterable[str]] = None) -> int:
     ap = argparse.ArgumentParser(description="Compute 5–15 Hz band power and plot a blue heatmap with colorbar min=0.")
-    ap.add_argument("folder", nargs="?", type=Path, default=None, help="Folder with AIIAC_R*_C*.txt (default: ROOT_DIR or script folder)")
+    ap.add_argument("folder", nargs="?", type=Path, default=None, help="Folder with AIIAC_R*_C*.trace/.txt (default: ROOT_DIR or script folder)")
     ap.add_argument("--pattern", default=PATTERN)
     ap.add_argument("--recursive", action="store_true", default=RECURSIVE)
     ap.add_argument("--crop", nargs=2, type=float, metavar=("MS_MIN", "MS_MAX"), default=None)
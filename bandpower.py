@@ -0,0 +1,180 @@
+"""
+シミュレーション中に膜電位をブロックごとに受け取り、5–15 Hz のバンドパワーだけを計算するモジュール。
+
+aiiac_bandpower_heatmap_*.py は保存したトレースから CROP_MS を切り出して
+Hann 窓付きの片側ペリオドグラムを計算し、BAND_HZ の範囲を台形積分している。
+ここでは同じ値を、トレースを保存せずに（膜電位を一度に全部持たずに）計算する:
+- 帯域内の周波数ビン f_k = k * fs / N についてだけ、窓を掛けた DFT の和
+  sum_n x[n] w[n] exp(-2πi k n / N) をブロックごとに足し込む
+- 平均の除去は最後に行う（窓の DFT sum_n w[n] exp(...) も同時に足し込んでおき、平均 × それ を引く）
+- N（切り出し区間のサンプル数）は区間と記録間隔から前もって決まるので、途中で全体を見直す必要はない
+
+使い方（recording.BandPowerRecorder がシミュレーション中に呼ぶ）:
+    acc = BandPowerAccumulator(["AIIAC[0]", "AIIAC[1]"], record_dt=0.0625, t_stop=6000.0)
+    acc.feed(k0, block)           # block は (サンプル数, 列数)。k0 は先頭サンプルの番号（t = k * record_dt）
+    summary = acc.summary()       # 列ごとのバンドパワーと帯域内の PSD
+    write_bandpower("PSD_R400_C20.psd", summary, meta=...)
+
+    bp = open_bandpower("PSD_R400_C20.psd")
+    bp.power("AIIAC[0]")          # mV^2（ヒートマップの値と同じ）
+
+補足:
+- 区間の終わりは min(crop_ms[1], t_stop)。保存したトレース（t_stop の点まで入る）を切り出したときと同じ
+- 最後まで足し込んだサンプル数が N に届かなければ psd() / power() は RuntimeError
+- .psd は小さな JSON（列名・区間・帯域・バンドパワー・帯域内の PSD・メタデータ）
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+BANDPOWER_SUFFIX = ".psd"
+# aiiac_bandpower_heatmap_*.py の CROP_MS / BAND_HZ と同じ
+CROP_MS = (1000.0, 6000.0)
+BAND_HZ = (5.0, 15.0)
+# 1回の行列積で扱うサンプル数（exp の表を作る一時メモリをこの大きさに抑える）
+CHUNK_SAMPLES = 4096
+
+
+class BandPowerAccumulator:
+    """
+    列ごとの帯域内 DFT をブロック単位で足し込み、最後にバンドパワーを求める。
+
+    結果は crop_ms の区間を切り出して periodogram_psd_onesided → integrate_band した値と一致する。
+    """
+
+    def __init__(self, columns: list[str], record_dt: float, t_stop: float,
+                 crop_ms: tuple[float, float] = CROP_MS, band_hz: tuple[float, float] = BAND_HZ,
+                 use_hann: bool = True):
+        self.columns = list(columns)
+        self.record_dt = float(record_dt)
+        self.crop_ms = (float(crop_ms[0]), float(crop_ms[1]))
+        self.band_hz = (float(band_hz[0]), float(band_hz[1]))
+        self.use_hann = bool(use_hann)
+        # 区間に入るサンプル番号 k_first..k_last（t = k * record_dt。t_stop の点まで記録される）
+        self.k_first = math.ceil(self.crop_ms[0] / self.record_dt - 1e-6)
+        self.k_last = math.floor(min(self.crop_ms[1], float(t_stop)) / self.record_dt + 1e-6)
+        self.n_samples = self.k_last - self.k_first + 1
+        if self.n_samples < 2:
+            raise ValueError(f"crop {self.crop_ms} ms has no samples before t_stop={t_stop} ms")
+        self.fs = 1000.0 / self.record_dt
+
+        f = np.fft.rfftfreq(self.n_samples, d=1.0 / self.fs)
+        self.bins = np.flatnonzero((f >= self.band_hz[0]) & (f <= self.band_hz[1]))
+        self.freqs = f[self.bins]
+        self._x_sum = np.zeros(len(self.columns))
+        self._xw_dft = np.zeros((len(self.columns), len(self.bins)), dtype=complex)
+        self._w_dft = np.zeros(len(self.bins), dtype=complex)
+        self._w2_sum = 0.0
+        self.n_seen = 0
+
+    def _window(self, n: np.ndarray) -> np.ndarray:
+        if not self.use_hann:
+            return np.ones(len(n))
+        # np.hanning(N)[n] と同じ
+        return 0.5 - 0.5 * np.cos(2.0 * np.pi * n / (self.n_samples - 1))
+
+    def feed(self, k0: int, block: np.ndarray) -> None:
+        """サンプル番号 k0 から始まるブロック（(サンプル数,) か (サンプル数, 列数)）を足し込む。"""
+        block = np.asarray(block, dtype=float)
+        if block.ndim == 1:
+            block = block[:, None]
+        # 区間外のサンプルは捨てる
+        lo = max(self.k_first - k0, 0)
+        hi = min(self.k_last - k0 + 1, len(block))
+        for start in range(lo, hi, CHUNK_SAMPLES):
+            stop = min(start + CHUNK_SAMPLES, hi)
+            n = np.arange(k0 + start, k0 + stop) - self.k_first
+            w = self._window(n)
+            e = w[:, None] * np.exp(-2j * np.pi * np.outer(n, self.bins) / self.n_samples)
+            x = block[start:stop]
+            self._x_sum += x.sum(axis=0)
+            self._xw_dft += x.T @ e
+            self._w_dft += e.sum(axis=0)
+            self._w2_sum += float(w @ w)
+            self.n_seen += stop - start
+
+    def psd(self) -> np.ndarray:
+        """帯域内の片側 PSD（(列数, ビン数)。mV^2/Hz）。"""
+        if self.n_seen != self.n_samples:
+            raise RuntimeError(f"received {self.n_seen} of {self.n_samples} samples in crop {self.crop_ms} ms")
+        n = self.n_samples
+        mean = self._x_sum / n
+        X = self._xw_dft - mean[:, None] * self._w_dft[None, :]
+        U = self._w2_sum / n
+        pxx = np.abs(X) ** 2 / (self.fs * n * U)
+        # 直流とナイキスト以外は片側にまとめるので2倍
+        nyquist = n // 2 if n % 2 == 0 else -1
+        pxx[:, (self.bins != 0) & (self.bins != nyquist)] *= 2.0
+        return pxx
+
+    def power(self) -> np.ndarray:
+        """列ごとのバンドパワー（mV^2）。帯域内の PSD を台形積分する。"""
+        pxx = self.psd()
+        if len(self.bins) == 0:
+            return np.zeros(len(self.columns))
+        df = self.fs / self.n_samples
+        return (pxx[:, 1:] + pxx[:, :-1]).sum(axis=1) * 0.5 * df
+
+    def summary(self) -> dict:
+        """.psd に保存する内容。"""
+        pxx = self.psd()
+        return {"columns": self.columns, "crop_ms": list(self.crop_ms), "band_hz": list(self.band_hz),
+                "use_hann": self.use_hann, "fs": self.fs, "n_samples": self.n_samples,
+                "power": [float(p) for p in self.power()],
+                "freqs": [float(f) for f in self.freqs],
+                "psd": [[float(p) for p in row] for row in pxx]}
+
+
+class BandPower:
+    """開いた .psd ファイル。"""
+
+    def __init__(self, path: Path, summary: dict, meta: dict):
+        self.path = Path(path)
+        self.columns = list(summary["columns"])
+        self.crop_ms = tuple(summary["crop_ms"])
+        self.band_hz = tuple(summary["band_hz"])
+        self.use_hann = bool(summary["use_hann"])
+        self.fs = float(summary["fs"])
+        self.n_samples = int(summary["n_samples"])
+        self.freqs = np.asarray(summary["freqs"])
+        self._power = dict(zip(self.columns, summary["power"]))
+        self._psd = dict(zip(self.columns, summary["psd"]))
+        self.meta = meta
+
+    def _column(self, column: str | None) -> str:
+        if column is None or (column not in self._power and len(self.columns) == 1):
+            return self.columns[0]
+        if column not in self._power:
+            raise KeyError(f"{column!r} not in {self.path.name} (columns: {self.columns})")
+        return column
+
+    def power(self, column: str | None = None) -> float:
+        """バンドパワー (mV^2)。"""
+        return float(self._power[self._column(column)])
+
+    def psd(self, column: str | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """帯域内の (周波数 Hz, PSD mV^2/Hz)。"""
+        return self.freqs, np.asarray(self._psd[self._column(column)])
+
+    def check(self, crop_ms, band_hz, use_hann: bool = True) -> None:
+        """解析条件が保存時と違えば ValueError（保存した値は区間・帯域を変えて計算し直せない）。"""
+        want = (tuple(map(float, crop_ms)), tuple(map(float, band_hz)), bool(use_hann))
+        have = (self.crop_ms, self.band_hz, self.use_hann)
+        if want != have:
+            raise ValueError(f"{self.path.name} was computed for crop/band/hann={have}, not {want}")
+
+
+def write_bandpower(path, summary: dict, meta: dict | None = None) -> None:
+    """BandPowerAccumulator.summary() を .psd（JSON）に書き出す。"""
+    Path(path).write_text(json.dumps({**summary, "meta": meta or {}}), encoding="utf-8")
+
+
+def open_bandpower(path) -> BandPower:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    meta = data.pop("meta", {})
+    return BandPower(path, data, meta)
@@ -0,0 +1,206 @@
+"""
+シミュレーション結果（トレースの txt）をパラメータ一式のハッシュで保存・再利用するキャッシュ。
+
+キー（sha256）に含めるもの:
+- 実際に使われるパラメータの値（network.effective_params。上書き値を評価した後の全変数）
+- 構造を決める hoc / テンプレート（createcells.hoc, src/netconnection_fovea.hoc, cell/*.tem）の中身
+- メカニズム一式（mod/*.mod の中身。nrnivmodl でビルドされるもの）
+- 何をどう記録したか（SomaTarget / SynapseTarget の describe()、RECORD_START_MS）
+- 実行モード（classic / coreneuron。CoreNEURON は計算の順序が違い、結果がビット単位で同じとは限らない）
+
+どれか1つでも変われば別のキーになるので、古い結果を間違って使うことはない。
+
+保存場所:
+- CACHE_DIR/ab/abcdef....txt / .trace / .spikes （トレース本体。出力と同じ書式で、拡張子ごとに別に持つ）
+- CACHE_DIR/ab/abcdef....json （キーの元になった値と作成時刻）
+
+古いものの削除:
+- evict(max_bytes=..., max_age_days=...) で、期限切れ → 最近使われていない順に削除
+- コマンドラインからも実行できる:
+    python cache.py --max-gb 5 --max-age-days 30
+    python cache.py --stats
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+BASE = Path(__file__).resolve().parent
+CACHE_DIR = BASE / ".sim_cache"
+
+# 結果を左右するファイル（パラメータ以外）
+TOPOLOGY_FILES = ("createcells.hoc", "src/netconnection_fovea.hoc", "src/photo_wave.hoc")
+TEMPLATE_GLOB = "cell/*.tem"
+MOD_GLOB = "mod/*.mod"
+# キャッシュするトレースの拡張子（traces.py の .trace / .spikes、bandpower.py の .psd と従来の .txt）
+TRACE_SUFFIXES = (".trace", ".spikes", ".psd", ".txt")
+
+
+def _hash_files(paths: Iterable[Path], base: Path = BASE) -> str:
+    """ファイル名（BASE からの相対パス）と中身をまとめたハッシュ。"""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(str(path.relative_to(base)).encode())
+        digest.update(b"\0")
+        digest.update(path.read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def model_fingerprint(base: Path = BASE) -> dict[str, str]:
+    """パラメータ以外で結果を左右するもの（トポロジーとメカニズム一式）のハッシュ。"""
+    return {
+        "topology": _hash_files([base / f for f in TOPOLOGY_FILES] + list(base.glob(TEMPLATE_GLOB)), base),
+        "mechanisms": _hash_files(base.glob(MOD_GLOB), base),
+    }
+
+
+def result_key(params: dict[str, float], target: dict, fingerprint: dict[str, str],
+               run_mode: str = "classic") -> str:
+    """パラメータ・記録対象・モデルのハッシュと実行モードから結果のキーを作る。"""
+    payload = {
+        # float.hex で丸め誤差なくそのまま比較する
+        "params": {name: float(value).hex() for name, value in sorted(params.items())},
+        "target": target,
+        "model": fingerprint,
+        "run_mode": run_mode,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """キー → トレースファイル の保存場所。"""
+
+    # entries() / evict() の対象にする拡張子
+    suffixes = TRACE_SUFFIXES
+
+    def __init__(self, root: Path = CACHE_DIR):
+        self.root = Path(root)
+        self._fingerprint = None
+
+    @property
+    def fingerprint(self) -> dict[str, str]:
+        # 1回のスイープの間はファイルが変わらない前提で、最初に1回だけ計算する
+        if self._fingerprint is None:
+            self._fingerprint = model_fingerprint()
+        return self._fingerprint
+
+    def key(self, params: dict[str, float], target: dict, run_mode: str = "classic") -> str:
+        return result_key(params, target, self.fingerprint, run_mode)
+
+    def _path(self, key: str, suffix: str = ".txt") -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str, suffix: str = ".txt") -> Path | None:
+        """あればキャッシュ内のトレースのパス（使った時刻も更新する）、無ければ None。"""
+        path = self._path(key, suffix)
+        if not path.exists():
+            return None
+        os.utime(path)   # 最近使った順に消すための印
+        return path
+
+    def put(self, key: str, src: Path, meta: dict | None = None) -> Path:
+        """src のトレースをキャッシュに登録する（一時ファイル → os.replace）。"""
+        path = self._path(key, Path(src).suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, path)
+        info = dict(meta or {}, key=key, created=time.time())
+        meta_tmp = tmp.with_suffix(".json.tmp")
+        meta_tmp.write_text(json.dumps(info, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(meta_tmp, path.with_suffix(".json"))   # 拡張子違いのトレースとは共有
+        return path
+
+    def copy_to(self, key: str, dest: Path) -> bool:
+        """ヒットしたら dest にコピーして True を返す。"""
+        dest = Path(dest)
+        path = self.get(key, dest.suffix)
+        if path is None:
+            return False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, dest)
+        return True
+
+    def entries(self) -> list[tuple[Path, int, float]]:
+        """(トレースのパス, バイト数, 最後に使った時刻) の一覧。"""
+        out = []
+        paths = [p for suffix in self.suffixes for p in self.root.glob(f"*/*{suffix}")]
+        for path in paths:
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue   # 他のプロセスが消した
+            out.append((path, st.st_size, st.st_mtime))
+        return out
+
+    def _remove(self, path: Path) -> None:
+        targets = [path]
+        # .json は拡張子違いのトレースと共有なので、最後の1つを消すときだけ消す
+        if not any(path.with_suffix(s).exists() for s in self.suffixes if s != path.suffix):
+            targets.append(path.with_suffix(".json"))
+        for p in targets:
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def evict(self, max_bytes: int | None = None, max_age_days: float | None = None) -> int:
+        """
+        max_age_days より長く使われていないもの → 合計が max_bytes を超える分を古い順に削除する。
+        消した件数を返す。
+        """
+        entries = self.entries()
+        removed = 0
+        if max_age_days is not None:
+            limit = time.time() - max_age_days * 86400
+            keep = []
+            for path, size, used in entries:
+                if used < limit:
+                    self._remove(path)
+                    removed += 1
+                else:
+                    keep.append((path, size, used))
+            entries = keep
+        if max_bytes is not None:
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in sorted(entries, key=lambda e: e[2]):
+                if total <= max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                removed += 1
+        return removed
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Evict / inspect the simulation result cache.")
+    ap.add_argument("--root", type=Path, default=CACHE_DIR)
+    ap.add_argument("--max-gb", type=float, default=None, help="keep at most this many GB")
+    ap.add_argument("--max-age-days", type=float, default=None, help="drop entries unused for this many days")
+    ap.add_argument("--stats", action="store_true")
+    args = ap.parse_args(argv)
+
+    cache = ResultCache(args.root)
+    if args.max_gb is not None or args.max_age_days is not None:
+        max_bytes = None if args.max_gb is None else int(args.max_gb * 1024 ** 3)
+        n = cache.evict(max_bytes=max_bytes, max_age_days=args.max_age_days)
+        print(f"[CACHE] evicted {n} entries")
+    if args.stats or (args.max_gb is None and args.max_age_days is None):
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"[CACHE] {cache.root}: {len(entries)} entries, {total / 1024 ** 2:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
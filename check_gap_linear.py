@@ -0,0 +1,130 @@
+"""
+ギャップ結合の解き方（gap_linear）を切り替えて、LinearMechanism（1）が Gap.mod（0）と同じ結合を
+解いているかを調べる。
+
+処理:
+- 収束: step_dt を小さくしながら、両方の解き方で最初の WINDOW_MS を実行し、ギャップ結合のある細胞の
+  膜電位の最大差を表示する。dt とともに差が小さくなれば同じ方程式を解いている
+  （ネットワークはカオス的で、長く実行するとスパイクのずれで差が広がるため、最初の区間だけを比べる）
+- 統計: noise_trial を変えて複数回実行し、GC の発火率と AIIAC のバンドパワーを check_syn_dt.py と同じ基準
+  （max(rel_tol × 基準値, 2 × 標準誤差)）で Gap.mod と比べる。1回あたりの実行時間も表示する
+
+使い方:
+    python check_gap_linear.py                       # 収束（dt = 0.0625, 0.015625, 0.00390625）と 5 試行の統計
+    python check_gap_linear.py --trials 0            # 収束だけ
+    python check_gap_linear.py --dt 0.0625 0.03125 --trials 10
+
+結果（parameters_new.hoc の既定値）:
+  収束（最初の 20 ms。dt = 0.00390625 の Gap.mod との最大差 (mV)、最後の列は同じ dt での2つの差）
+    dt          backend  AIIAC[0]  ON_CBC[0]  OFF_CBC[0]  gap-linear
+    0.0625      gap      4.04      1.58       0.585
+    0.0625      linear   3.8       1.32       0.332       1.27
+    0.015625    gap      1.29      0.448      0.157
+    0.015625    linear   1         0.342      0.118       0.342
+    0.00390625  linear   0.083     0.0449     0.0168      0.083
+  統計（6 s, noise_trial = 1..5。試行平均、[] は Gap.mod からの相対差）
+    backend  s/run  ON_GC (Hz)     OFF_GC (Hz)    AIIAC 5-15 Hz (mV^2)
+    gap      33.1   1.358          15.64          0.1238
+    linear   34.7   1.356 [-0.1%]  15.84 [+1.3%]  0.1238 [+0.0%]
+  - 2つの差は dt にほぼ比例して小さくなる（同じ結合を解いている）。同じ dt では LinearMechanism の方が
+    細かい dt の解に近いが、差の大部分は結合以外（チャネル・シナプス）の dt 依存性
+  - 発火率・バンドパワーは試行間のばらつきの範囲で一致。実行時間は LinearMechanism の方が 5 % ほど長い
+  - そのため既定は gap_linear = 0 のまま
+
+補足:
+- Gap.mod は相手の電位（vgap）をステップの始めの値に固定した陽的な電流で、LinearMechanism は結合を
+  膜電位と一緒に陰的に解く。どちらも dt について1次なので、同じ dt では差が残る
+- LinearMechanism があると NEURON は行列を木構造（Hines 法）ではなく疎行列（sparse13）で解くので、
+  結合の計算が減っても1ステップは遅くなる。CoreNEURON では使えない（execution.py が classic に戻す）
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+from neuron import h
+
+from check_syn_dt import METRICS, mean_se, run_once
+from network import Network
+from recording import Probe
+
+BACKENDS = {"gap": 0, "linear": 1}
+DT_LIST = (0.0625, 0.015625, 0.00390625)
+# 収束を比べる区間と、比べる細胞（ギャップ結合のある細胞種）
+WINDOW_MS = 20.0
+# （Cone / Rod-Cone の結合は既定の Num_C_RP = 0 では作られない）
+CELLS = (("AIIAC", 0), ("ON_CBC", 0), ("OFF_CBC", 0))
+TRIALS = 5
+REL_TOL = 0.10
+
+
+def trace_window(net: Network, overrides: dict, record_dt: float) -> np.ndarray:
+    """最初の WINDOW_MS を実行し、CELLS の膜電位（record_dt 間隔）を (細胞, 時刻) で返す。"""
+    net.apply(overrides)
+    probes = [Probe.soma(getattr(h, pop)[i], "v", record_dt=record_dt, per_step=True) for pop, i in CELLS]
+    net.simulate(WINDOW_MS)
+    n = int(round(WINDOW_MS / record_dt)) + 1
+    return np.array([p.samples()[:n] for p in probes])
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare LinearMechanism gap coupling with Gap.mod.")
+    ap.add_argument("--dt", type=float, nargs="+", default=list(DT_LIST), help="step_dt values for the convergence check (ms)")
+    ap.add_argument("--trials", type=int, default=TRIALS, help="noise_trial = 1..TRIALS (0: skip the statistics)")
+    ap.add_argument("--rel-tol", type=float, default=REL_TOL)
+    args = ap.parse_args(argv)
+
+    net = Network()
+    dts = sorted(args.dt, reverse=True)
+    record_dt = dts[0]
+    traces = {(b, dt): trace_window(net, {"gap_linear": g, "step_dt": dt}, record_dt)
+              for dt in dts for b, g in BACKENDS.items()}
+    ref = traces[("gap", dts[-1])]
+    print(f"max |v - v_ref| (mV) over the first {WINDOW_MS:g} ms, v_ref = gap at dt={dts[-1]}")
+    print(f"{'dt':>10} {'backend':<7} " + " ".join(f"{f'{pop}[{i}]':>10}" for pop, i in CELLS) + f" {'gap-linear':>11}")
+    for dt in dts:
+        for b in BACKENDS:
+            err = np.abs(traces[(b, dt)] - ref).max(axis=1)
+            between = np.abs(traces[("gap", dt)] - traces[("linear", dt)]).max()
+            print(f"{dt:>10g} {b:<7} " + " ".join(f"{e:10.3g}" for e in err)
+                  + (f" {between:11.3g}" if b == "linear" else ""))
+
+    if args.trials <= 0:
+        return 0
+
+    results = {b: {k: [] for k in METRICS} for b in BACKENDS}
+    wall = {b: [] for b in BACKENDS}
+    for b, g in BACKENDS.items():
+        for trial in range(1, args.trials + 1):
+            t0 = time.perf_counter()
+            metrics = run_once(net, {"gap_linear": g, "noise_trial": trial})
+            wall[b].append(time.perf_counter() - t0)
+            for k, v in metrics.items():
+                results[b][k].append(v)
+            print(f"[{b}] trial {trial}: " + ", ".join(f"{k}={v:.4g}" for k, v in metrics.items())
+                  + f" ({wall[b][-1]:.1f} s)", flush=True)
+
+    print(f"\nreference: gap, {args.trials} trials, rel_tol={args.rel_tol}")
+    print(f"{'backend':<7} {'s/run':>6}  " + "  ".join(f"{k:>26}" for k in METRICS))
+    all_ok = True
+    for b in BACKENDS:
+        cells = []
+        for k in METRICS:
+            m, se = mean_se(results[b][k])
+            m_ref, se_ref = mean_se(results["gap"][k])
+            tol = max(args.rel_tol * abs(m_ref), 2.0 * math.hypot(se, se_ref))
+            ok = abs(m - m_ref) <= tol
+            all_ok &= ok
+            rel = (m - m_ref) / m_ref if m_ref else math.nan
+            cells.append(f"{m:9.4g}±{se:<7.2g}[{rel:+6.1%}]{' ' if ok else '*'}")
+        print(f"{b:<7} {np.mean(wall[b]):6.1f}  " + "  ".join(f"{c:>26}" for c in cells))
+    print("(* = outside tolerance)")
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
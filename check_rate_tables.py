@@ -0,0 +1,92 @@
+"""
+チャネルの速度定数の表（TABLE。parameters_new.hoc の rate_tables）と直接計算の差を調べる。
+
+処理:
+- 1つの section に spike2 と視細胞のチャネル（Kvpub / Kv_conepub / h_conepub）を入れる
+- 表の範囲（-100〜100 mV）を表の刻み（0.1 mV）と揃わない間隔で走査し、各電位で
+  速度定数の手続き（rate / evaluate_fct_*）を usetable_* = 1 と 0 で呼んで、出力（spike2 は RANGE、他は GLOBAL）を比べる
+- 出力ごとに最大の相対誤差（|表 - 直接| / max(|直接|, 1e-12)）と、その電位を表示する
+
+使い方:
+    python check_rate_tables.py
+    python check_rate_tables.py --step 0.013 --dt 0.0625
+
+補足:
+- 表は線形補間なので、誤差は刻み 0.1 mV に対して2次（速度定数の電位スケールが 10 mV なら 1e-5 程度）
+- spike2 の *_exp（1 - exp(-dt/tau)）は dt に依存するので、dt を変えると表が作り直される
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Iterable, Optional
+
+import numpy as np
+from neuron import h
+
+from network import load_model
+
+# 表を持つメカニズム → (速度定数の手続き, 表にしている出力)
+TABLES = {
+    "spike2": (("evaluate_fct_nak", "evaluate_fct_ca"),
+               ("m_inf", "tau_m", "m_exp", "h_inf", "tau_h", "h_exp",
+                "n_inf", "tau_n", "n_exp", "c_inf", "tau_c", "c_exp")),
+    "Kvpub": (("rate",), ("infmKv", "taumKv")),
+    "Kv_conepub": (("rate",), ("infmKv", "taumKv", "infhKv", "tauhKv")),
+    "h_conepub": (("rate",), ("infh", "tauh")),
+}
+V_RANGE = (-100.0, 100.0)
+
+
+def evaluate(sec, mech: str, v: np.ndarray, use_table: int) -> dict[str, np.ndarray]:
+    """各電位で mech の速度定数を計算し、出力名 → 値の配列を返す。"""
+    procs, outputs = TABLES[mech]
+    setattr(h, f"usetable_{mech}", use_table)
+    values = {name: np.empty(len(v)) for name in outputs}
+    # THREADSAFE のメカニズムの PROCEDURE を hoc から呼ぶときは、先に setdata_* でインスタンスを選ぶ
+    getattr(h, f"setdata_{mech}")(0.5, sec=sec)
+    funcs = [getattr(h, f"{proc}_{mech}") for proc in procs]
+    seg = sec(0.5)
+    # RANGE の出力は setdata_* で選んだインスタンス（seg）から、GLOBAL は h から読む
+    owners = {name: seg if hasattr(seg, f"{name}_{mech}") else h for name in outputs}
+    for k, vk in enumerate(v):
+        for func in funcs:
+            func(vk)
+        for name in outputs:
+            values[name][k] = getattr(owners[name], f"{name}_{mech}")
+    return values
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare channel rate tables with direct evaluation.")
+    ap.add_argument("--step", type=float, default=0.0137, help="voltage step of the scan (mV)")
+    ap.add_argument("--dt", type=float, default=0.0625, help="dt for the dt-dependent factors of spike2 (ms)")
+    args = ap.parse_args(argv)
+
+    load_model()
+    h.dt = args.dt
+    sec = h.Section(name="rate_table_check")
+    for mech in TABLES:
+        sec.insert(mech)
+    # 表の作成と *_exp は NrnThread の dt を使い、THREADSAFE の GLOBAL はスレッドごとの領域に入るので、
+    # 先に1回 finitialize しておく
+    h.finitialize(-65.0)
+
+    v = np.arange(V_RANGE[0], V_RANGE[1], args.step)
+    worst = 0.0
+    print(f"{'mechanism':<11} {'output':<7} {'max rel err':>12}  {'at v (mV)':>9}")
+    for mech in TABLES:
+        direct = evaluate(sec, mech, v, 0)
+        table = evaluate(sec, mech, v, 1)
+        for name in TABLES[mech][1]:
+            err = np.abs(table[name] - direct[name]) / np.maximum(np.abs(direct[name]), 1e-12)
+            k = int(np.nanargmax(err))
+            worst = max(worst, float(err[k]))
+            print(f"{mech:<11} {name:<7} {err[k]:12.3e}  {v[k]:9.3f}")
+        setattr(h, f"usetable_{mech}", 1)
+    print(f"worst relative error: {worst:.3e}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
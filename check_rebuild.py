@@ -0,0 +1,67 @@
+"""
+Network を1プロセス内で作り直した（Num_R を変えた）後に、放出（*_pre[j]）が今の細胞の配列の j 番目の細胞に
+置かれているかを調べる。
+
+処理:
+- builder ごとに Num_R = 40 で構築し、R_BC の細胞を1つ持ったまま（前の構築の Probe を持っている場合と同じ）
+  Num_R = 400 で作り直す
+- R2RB_pre[j] / RBC2AC_pre[j] / OFFCB2AC_pre[j] がそれぞれ Rods[j] / R_BC[j] / OFF_CBC[j] の soma にあるかを調べる
+  （テンプレート名（RBC[j] など）で細胞を指すと、古いインスタンスが残っているときに番号がずれる）
+
+使い方:
+    python check_rebuild.py
+    python check_rebuild.py --builders hoc --sizes 40 400 4000
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Iterable, Optional
+
+from neuron import h
+
+from connectivity import POPULATIONS
+from network import BUILDERS, Network
+
+# 放出の配列 → 置かれる細胞の配列
+RELEASE_CELLS = {
+    "R2RB_pre":     "Rods",
+    "RBC2AC_pre":   "R_BC",
+    "OFFCB2AC_pre": "OFF_CBC",
+}
+
+
+def misplaced() -> dict[str, list[int]]:
+    """放出の配列 → 今の細胞の配列の同じ番号の soma に無い j の列（作っていない放出（g = 0）は数えない）。"""
+    out = {}
+    for arr_name, pop in RELEASE_CELLS.items():
+        arr, cells = getattr(h, arr_name), getattr(h, pop)
+        n = int(getattr(h, POPULATIONS[pop]))
+        out[arr_name] = [j for j in range(n)
+                         if arr[j] is not None and arr[j].get_segment().sec != cells[j].soma]
+    return out
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Check release placement after an in-process rebuild.")
+    ap.add_argument("--builders", nargs="+", choices=BUILDERS, default=list(BUILDERS))
+    ap.add_argument("--sizes", type=int, nargs="+", default=[40, 400], help="Num_R of each build in turn")
+    args = ap.parse_args(argv)
+
+    all_ok = True
+    for builder in args.builders:
+        net = Network({"Num_R": args.sizes[0]}, builder=builder)
+        for num_r in args.sizes[1:]:
+            keep = h.R_BC[0]    # 古い細胞を残す
+            net.apply({"Num_R": num_r})
+            bad = misplaced()
+            ok = not any(bad.values())
+            all_ok &= ok
+            detail = ", ".join(f"{k}: {len(v)}" for k, v in bad.items() if v)
+            print(f"{builder:>6} Num_R={num_r:<6} {'ok' if ok else 'MISPLACED ' + detail}")
+            del keep
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,149 @@
+"""
+シナプスの状態の更新法（syn_exact）と step_dt を変えて 6 s のプロトコルを実行し、
+GC の発火率と AIIAC の 5–15 Hz バンドパワーが基準（前進 Euler, step_dt = 0.0625）から
+どれだけ変わるかを調べる。
+
+処理:
+- 条件（更新法 × step_dt）ごとに noise_trial を変えて複数回実行する
+  （ネットワークはカオス的で、同じ条件でも膜電位の波形そのものは比べられないため、試行平均で比べる）
+- 1回の実行で ON/OFF GC 全細胞のスパイク（recording.SpikeRecorder）と
+  AIIAC 全細胞のバンドパワー（recording.BandPowerRecorder）を記録する
+- 細胞平均の発火率（解析区間全体・刺激中）とバンドパワーを試行で平均し、基準との差が
+  max(rel_tol × 基準値, 2 × 標準誤差) に収まるかを表示する
+
+使い方:
+    python check_syn_dt.py                          # euler / exact × 0.0625, 0.125, 0.25 を 5 試行ずつ
+    python check_syn_dt.py --dt 0.0625 0.25 --trials 10 --csv syn_dt.csv
+
+結果（parameters_new.hoc の既定値, 6 s, noise_trial = 1..5。試行平均、[] は基準からの相対差）:
+    method dt       ON_GC (Hz)       OFF_GC (Hz)      AIIAC 5-15 Hz (mV^2)
+    euler  0.0625   1.354（基準）    15.64（基準）    0.1244（基準）
+    exact  0.0625   1.354 [ 0.0%]    15.64 [ 0.0%]    0.1237 [-0.6%]
+    euler  0.03125  1.24  [-8.4%]    15.83 [+1.2%]    0.1261 [+1.4%]
+    exact  0.03125  1.24  [-8.4%]    15.83 [+1.2%]    0.1241 [-0.2%]
+    euler  0.125    0.522 [-61%]     3.34  [-79%]     0.1206 [-3.1%]
+    exact  0.125    0.542 [-60%]     3.38  [-78%]     0.1207 [-3.0%]
+    euler  0.25     0     [-100%]    0     [-100%]    0.1158 [-6.9%]
+    exact  0.25     0     [-100%]    0     [-100%]    0.1162 [-6.6%]
+  - 同じ dt なら exact と euler の差は試行間のばらつき程度（シナプスの更新法は dt の制約になっていない）
+  - dt = 0.125 で GC の発火率が崩れるのはシナプスではなく GC（spike2）のスパイク生成の dt 依存性:
+    スパイクは出ているがピークが 0 mV（検出の閾値）付近まで下がり、-20 mV で数えると発火率は 10–30 % 高い。
+    dt = 0.25 ではほとんど発火しない。AIIAC のバンドパワーは dt = 0.25 でも 7 % 以内
+  - そのため step_dt は 0.0625 のまま。dt を大きくするには GC 側の積分を見直す必要がある
+
+補足:
+- exact（syn_exact = 1）は各状態を「他の状態はステップ開始時の値に固定した x' = c - k*x」として
+  1ステップ分を厳密に緩和する。前進 Euler と同じく1次精度だが、dt を大きくしても発散せず、
+  w（beta = 1.1 /ms）や p1（u/tau_1A）のような速い緩和の誤差が小さい
+- 細胞の膜電位・チャネル（cnexp）の誤差も dt に依存するので、ここで測るのはモデル全体としての dt 依存性
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import math
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from neuron import h
+
+from network import Network
+from recording import RECORD_START_MS, BandPowerRecorder, RecordSpec, SpikeRecorder
+
+METHODS = {"euler": 0, "exact": 1}
+# 基準（以前の設定）
+REFERENCE = ("euler", 0.0625)
+DT_LIST = (0.0625, 0.125, 0.25)
+TRIALS = 5
+# 基準との差の許容（相対）。試行間のばらつき（2 × 標準誤差）の方が大きければそちらを使う
+REL_TOL = 0.10
+
+METRICS = ("ON_GC_rate", "OFF_GC_rate", "ON_GC_rate_stim", "OFF_GC_rate_stim", "AIIAC_bandpower")
+
+
+def mean_rate(spikes: dict[str, np.ndarray], pop: str, t0: float, t1: float) -> float:
+    """pop の細胞平均の発火率 (Hz)。[t0, t1) のスパイクを数える。"""
+    counts = [np.count_nonzero((t >= t0) & (t < t1)) for name, t in spikes.items() if name.startswith(pop + "[")]
+    return float(np.mean(counts)) / ((t1 - t0) / 1000.0) if counts else math.nan
+
+
+def run_once(net: Network, overrides: dict) -> dict[str, float]:
+    """1条件・1試行を実行して指標を返す。"""
+    net.apply(overrides)
+    tstop = float(h.tstop)
+    spikes = SpikeRecorder(RecordSpec({"ON_GC": "all", "OFF_GC": "all"}))
+    bp = BandPowerRecorder(RecordSpec({"AIIAC": "all"}), t_stop=tstop)
+    net.simulate(block_ms=bp.block_ms, on_block=bp.on_block)
+
+    times = spikes.spikes()
+    stim0 = float(h.stim)
+    stim1 = stim0 + float(h.ton_stim)
+    summary = bp.summary()
+    return {
+        "ON_GC_rate": mean_rate(times, "ON_GC", RECORD_START_MS, tstop),
+        "OFF_GC_rate": mean_rate(times, "OFF_GC", RECORD_START_MS, tstop),
+        "ON_GC_rate_stim": mean_rate(times, "ON_GC", stim0, stim1),
+        "OFF_GC_rate_stim": mean_rate(times, "OFF_GC", stim0, stim1),
+        "AIIAC_bandpower": float(np.mean(summary["power"])),
+    }
+
+
+def mean_se(values: list[float]) -> tuple[float, float]:
+    a = np.asarray(values, dtype=float)
+    se = float(a.std(ddof=1) / math.sqrt(len(a))) if len(a) > 1 else 0.0
+    return float(a.mean()), se
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare synapse update methods and step_dt on GC rates / AIIAC band power.")
+    ap.add_argument("--dt", type=float, nargs="+", default=list(DT_LIST), help="step_dt values (ms)")
+    ap.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS))
+    ap.add_argument("--trials", type=int, default=TRIALS, help="noise_trial = 1..TRIALS")
+    ap.add_argument("--rel-tol", type=float, default=REL_TOL)
+    ap.add_argument("--csv", type=Path, default=None, help="write per-trial metrics here")
+    ap.add_argument("--run-mode", default="classic", choices=("classic", "coreneuron"))
+    args = ap.parse_args(argv)
+
+    conditions = [REFERENCE] + [(m, dt) for m in args.methods for dt in args.dt if (m, dt) != REFERENCE]
+    net = Network(run_mode=args.run_mode)
+    rows = []
+    results: dict[tuple[str, float], dict[str, list[float]]] = {}
+    for method, dt in conditions:
+        per_metric = results.setdefault((method, dt), {k: [] for k in METRICS})
+        for trial in range(1, args.trials + 1):
+            metrics = run_once(net, {"syn_exact": METHODS[method], "step_dt": dt, "noise_trial": trial})
+            for k, v in metrics.items():
+                per_metric[k].append(v)
+            rows.append({"method": method, "dt": dt, "trial": trial, **metrics})
+            print(f"[{method} dt={dt}] trial {trial}: "
+                  + ", ".join(f"{k}={v:.4g}" for k, v in metrics.items()), flush=True)
+
+    if args.csv is not None:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    ref = {k: mean_se(v) for k, v in results[REFERENCE].items()}
+    print(f"\nreference: {REFERENCE[0]} dt={REFERENCE[1]}, {args.trials} trials, rel_tol={args.rel_tol}")
+    print(f"{'method':<6} {'dt':>7}  " + "  ".join(f"{k:>26}" for k in METRICS))
+    all_ok = True
+    for (method, dt), per_metric in results.items():
+        cells = []
+        for k in METRICS:
+            m, se = mean_se(per_metric[k])
+            m_ref, se_ref = ref[k]
+            tol = max(args.rel_tol * abs(m_ref), 2.0 * math.hypot(se, se_ref))
+            ok = abs(m - m_ref) <= tol
+            all_ok &= ok or (method, dt) == REFERENCE
+            rel = (m - m_ref) / m_ref if m_ref else math.nan
+            cells.append(f"{m:9.4g}±{se:<7.2g}[{rel:+6.1%}]{' ' if ok else '*'}")
+        print(f"{method:<6} {dt:>7}  " + "  ".join(f"{c:>26}" for c in cells))
+    print("(* = outside tolerance)")
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,64 @@
+"""
+parallel_net.py のネットワークをスレッド数を変えて実行し、結果が1スレッドと同じかと実行時間を比べる。
+
+処理:
+- 1プロセスでネットワークを1回だけ構築し、set_threads() でスレッド数を変えながら同じ tstop まで実行する
+- ON/OFF GC 全部のスパイク時刻が最初のスレッド数（既定は 1）のときとビット単位で同じかと、実行時間・速度向上を表示する
+- スレッドごとの細胞数・負荷の見積もり・計算時間（pc.thread_ctime）を表示する
+
+使い方:
+    python check_threads.py                                   # 1, 2, 4, 8, 16 スレッド、既定の Num_R
+    python check_threads.py --threads 1 8 --tstop 2000 --thread-balance round_robin
+
+補足:
+- Ifluct1（noise_r123 = 0）を使うとスレッドにできない（全部1スレッドで実行される）
+- コア数より多いスレッドは速くならない
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+from parallel_net import THREAD_BALANCE, ParallelNetwork, print_threads
+
+THREADS = (1, 2, 4, 8, 16)
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Check that threaded runs match the single-thread run.")
+    ap.add_argument("--threads", type=int, nargs="+", default=list(THREADS))
+    ap.add_argument("--thread-balance", choices=THREAD_BALANCE, default="complexity")
+    ap.add_argument("--tstop", type=float, default=None, help="ms (default: tstop of parameters_new.hoc)")
+    args = ap.parse_args(argv)
+
+    net = ParallelNetwork()
+    ref = None
+    wall_1 = None
+    all_ok = True
+    rows = []
+    for n in args.threads:
+        used = net.set_threads(n, args.thread_balance)
+        t0 = time.perf_counter()
+        net.simulate(args.tstop)
+        wall = time.perf_counter() - t0
+        spikes = net.spikes()
+        if ref is None:
+            ref, wall_1 = spikes, wall
+        ok = ref.keys() == spikes.keys() and all(np.array_equal(ref[k], spikes[k]) for k in ref)
+        all_ok &= ok
+        rows.append((n, used, wall, ok))
+        print(f"--- {used} threads ({args.thread_balance})")
+        print_threads(net.thread_report())
+
+    print(f"{'threads':>8} {'used':>5} {'run (s)':>8} {'speedup':>8}  identical")
+    for n, used, wall, ok in rows:
+        print(f"{n:>8} {used:>5} {wall:8.1f} {wall_1 / wall:8.2f}  {'yes' if ok else 'NO'}")
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
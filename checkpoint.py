@@ -0,0 +1,204 @@
+"""
+刺激前のウォームアップの状態を SaveState で保存し、構造と刺激前のパラメータが同じ実行で使い回すチェックポイント。
+
+処理:
+- 1回目: finitialize から t_save（既定は刺激の開始 = stim / stim_Dim / stim_C の最も早いもの）まで実行し、
+  次のものを CHECKPOINT_DIR に保存する
+    - SaveState（膜電位・STATE・イベントキュー）
+    - SaveState が持たない値: 次のステップに持ち越す ASSIGNED（CARRY_VARS。IfluctR123 の x、
+      source_var / target_var で受け取る w_pre / wave、リボンの acm、SpikeHyst の armed）と、IfluctR123 の乱数列の位置（rng_seq()）
+    - 記録側（recording.Probe / MultiProbe / SpikeRecorder / BandPowerRecorder）がそれまでに記録した値
+- 2回目以降: finitialize の直後に読み込んで、t_save から続きを実行する
+
+キー（cache.result_key と同じ作り方）:
+- 刺激の振幅・長さと tstop（STIMULUS_PARAMS）を除いた、実際に使われるパラメータの値
+  （刺激の開始時刻 stim* と回数 num* はキーに入る。入力の INITIAL が開始時刻に自分宛てのイベントを
+  予約し、それがイベントキューとして保存されるため）
+- トポロジーとメカニズム一式のハッシュ（cache.model_fingerprint）
+- t_save、記録側の構成（checkpoint_signature()）、メカニズムの種類ごとの point process の数
+- 実行モード（classic / coreneuron）
+
+使い方:
+    store = WarmupCheckpoints()
+    for amp in (20, 40, 80):
+        net.apply({"AMP": amp})
+        probe = Probe.soma(h.AIIAC[0], "v")
+        net.simulate(checkpoint=store, recorders=[probe])   # 2点目からは 0 ms–t_save を実行しない
+
+    sweep.run_sweep(points, target, checkpoints=WarmupCheckpoints())   # スイープの各点で使う
+
+    python checkpoint.py --stats
+    python checkpoint.py --max-gb 5 --max-age-days 30
+
+補足:
+- 刺激より前の入力は振幅・長さによらない（photo_play の波形・IinjLT の電流は開始時刻まで 0）ので、
+  それだけが違う点は t_save まで同じ軌道になる。続きから実行した結果は、通しで実行した結果とビット単位で同じ
+- Ifluct1（noise_r123 = 0）は NEURON 全体の乱数列（scop）を使っていてその位置を保存できないので、
+  Ifluct1 があるときは使わない（毎回 0 ms から実行する）
+- パラメータ以外から足した入力（stimulus.StimulusEngine など）の中身はキーに入らないので、一緒に使わないこと
+- classic / CoreNEURON のどちらでも使えるが、チェックポイントは実行モードごとに別（実行モードはキーに入る）
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import pickle
+from pathlib import Path
+from typing import Iterable, Optional
+
+from neuron import h
+
+from cache import CACHE_DIR, ResultCache
+from network import effective_params
+
+CHECKPOINT_DIR = CACHE_DIR / "checkpoints"
+# キーに入れないパラメータ（t_save より後にしか効かない、刺激の振幅・長さと実行時間）
+STIMULUS_PARAMS = ("AMP", "ton_stim", "toff_stim", "amp_Dim", "ton_Dim", "toff_Dim",
+                   "AMP_C", "ton_C", "toff_C", "tstop")
+# 刺激の開始時刻（t_save の上限）
+ONSET_PARAMS = ("stim", "stim_Dim", "stim_C")
+# SaveState が保存しないが、次のステップで使う ASSIGNED（メカニズム → 変数）
+CARRY_VARS = {
+    "IfluctR123": ("x",),
+    "SpikeHyst": ("armed",),
+    "RibbonPost": ("w_pre",),
+    "PhotoPlay": ("wave",),
+    "RibbonRelease": ("acm",),
+    "RibbonRelease_R2RB": ("acm",),
+    "ribbon_syn": ("acm",),
+    "ribbon_syn_C2OFFCB": ("acm",),
+    "ribbon_syn_R2RB": ("acm",),
+}
+
+
+def checkpoint_blockers() -> list[str]:
+    """チェックポイントを使えない理由（空なら使える）。"""
+    reasons = []
+    if h.List("Ifluct1").count() > 0:
+        reasons.append("Ifluct1 は scop の乱数列を使う（noise_r123 = 1 にする）")
+    return reasons
+
+
+def point_process_counts() -> dict[str, int]:
+    """メカニズムの種類ごとの point process の数（構造の確認用。0 のものは入れない）。"""
+    mt = h.MechanismType(1)
+    name = h.ref("")
+    counts = {}
+    for i in range(int(mt.count())):
+        mt.select(i)
+        mt.selected(name)
+        n = int(h.List(name[0]).count())
+        if n:
+            counts[name[0]] = n
+    return counts
+
+
+class WarmupCheckpoints(ResultCache):
+    """キー → 刺激前（t_save まで）の状態 の保存場所。"""
+
+    suffixes = (".ckpt",)
+
+    def __init__(self, root: Path = CHECKPOINT_DIR, t_save: float | None = None):
+        super().__init__(root)
+        # None なら刺激の開始時刻。それより遅い値は開始時刻に切り詰める
+        self.t_save = t_save
+        self._reported = False
+
+    def prepare(self, net, recorders, tstop: float) -> tuple[float, str | None]:
+        """
+        init() 直後に呼び、(t_save, キー) を返す。使えないとき（Ifluct1 がある、t_save が 0 以下か
+        tstop 以降）はキーが None。
+        """
+        blockers = checkpoint_blockers()
+        if blockers:
+            if not self._reported:
+                print("[CHECKPOINT] 使いません: " + "; ".join(blockers))
+                self._reported = True
+            return 0.0, None
+        onset = min(float(getattr(h, name)) for name in ONSET_PARAMS)
+        t_save = onset if self.t_save is None else min(self.t_save, onset)
+        if t_save <= 0 or t_save >= tstop:
+            return t_save, None
+        params = {name: value for name, value in effective_params(net.overrides, net.base_text).items()
+                  if name not in STIMULUS_PARAMS}
+        target = {"t_save": float(t_save).hex(),
+                  "recorders": [r.checkpoint_signature() for r in recorders],
+                  "point_processes": point_process_counts()}
+        return t_save, self.key(params, target, net.run_mode)
+
+    def restore(self, key: str, recorders) -> bool:
+        """保存済みなら init() 直後の状態を t_save の状態に置き換えて True を返す。"""
+        path = self.get(key, ".ckpt")
+        if path is None:
+            return False
+        data = pickle.loads(path.read_bytes())
+        tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp.state")
+        tmp.write_bytes(data["savestate"])
+        try:
+            f = h.File()
+            f.ropen(str(tmp))
+            ss = h.SaveState()
+            ss.fread(f)
+            f.close()
+        finally:
+            tmp.unlink()
+        ss.restore(0)
+        for (mech, var), values in data["carry"].items():
+            for obj, value in zip(h.List(mech), values):
+                setattr(obj, var, value)
+        for obj, pos in zip(h.List("IfluctR123"), data["rng_seq"]):
+            obj.set_rng_seq(pos)
+        for rec, state in zip(recorders, data["recorders"]):
+            rec.restore_checkpoint(state)
+        return True
+
+    def save(self, key: str, recorders) -> Path:
+        """現在（t_save）の状態を保存する。"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".{key}.{os.getpid()}.tmp"
+        f = h.File()
+        f.wopen(str(tmp))
+        ss = h.SaveState()
+        ss.save()
+        ss.fwrite(f)
+        f.close()
+        data = {
+            "t": h.t,
+            "savestate": tmp.read_bytes(),
+            "carry": {(mech, var): [getattr(obj, var) for obj in h.List(mech)]
+                      for mech, names in CARRY_VARS.items() if hasattr(h, mech) for var in names},
+            "rng_seq": [obj.rng_seq() for obj in h.List("IfluctR123")],
+            "recorders": [rec.checkpoint_state() for rec in recorders],
+        }
+        src = tmp.with_suffix(".ckpt")
+        try:
+            src.write_bytes(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+            return self.put(key, src, meta={"t_save": h.t})
+        finally:
+            tmp.unlink()
+            src.unlink()
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Evict / inspect the warm-up checkpoints.")
+    ap.add_argument("--root", type=Path, default=CHECKPOINT_DIR)
+    ap.add_argument("--max-gb", type=float, default=None, help="keep at most this many GB")
+    ap.add_argument("--max-age-days", type=float, default=None, help="drop entries unused for this many days")
+    ap.add_argument("--stats", action="store_true")
+    args = ap.parse_args(argv)
+
+    store = WarmupCheckpoints(args.root)
+    if args.max_gb is not None or args.max_age_days is not None:
+        max_bytes = None if args.max_gb is None else int(args.max_gb * 1024 ** 3)
+        n = store.evict(max_bytes=max_bytes, max_age_days=args.max_age_days)
+        print(f"[CHECKPOINT] evicted {n} entries")
+    if args.stats or (args.max_gb is None and args.max_age_days is None):
+        entries = store.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"[CHECKPOINT] {store.root}: {len(entries)} entries, {total / 1024 ** 2:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,262 @@
+"""
+網膜回路の結合（シナプス・ギャップ結合）を、前細胞・後細胞の番号の表として作るモジュール。
+
+処理:
+- src/netconnection_fovea.hoc が hoc のループで作っている結合を、同じ規則で (前細胞の番号, 後細胞の番号) の
+  配列にする（Rod -> RBC の全対全、Cone i -> ONCB i、Rod (i*10 + k) % Num_R <-> Cone i、ONCB / OFFCB の
+  格子状のギャップ結合など）
+- 有効な g が 0 になる結合（g_R2RB = 0、Num_C_RP 以降の Cone など）は表に入れない
+  （drop_zero=False なら、hoc が g = 0 でも作る結合（RBC -> AIIAC など。後から g を入れ直せるように）は入れる）
+- NEURON を使わないので、どのプロセス（MPI のランク）でも同じ表を作れる
+- 番号の表（fovea_edges()）と g の入れ方（table_connections()。結合の種類ごとの規則は FAMILIES）は分けてあり、
+  mosaic.py の近傍探索で作った番号の表にも同じ規則で g を入れる
+
+使い方:
+    from network import effective_params
+    params = effective_params({"Num_R": 4000}, base_text)
+    for fam in fovea_connections(params):
+        print(fam.name, fam.pre, "->", fam.post, len(fam))
+
+補足:
+- 結合の種類（Family.kind）:
+    "ribbon"     : 前細胞ごとの放出（Family.release = RibbonRelease / RibbonRelease_R2RB）→ 後細胞の RibbonPost
+    "depsyn"     : depsyn（weight 本ぶんを1つで計算する）
+    "gap"        : ギャップ結合（pre / post は GapPair の1つ目 / 2つ目の細胞。sym = 1 なら両方の細胞に
+                   電流が流れる。0 なら pre 側だけ）
+- 後細胞の番号の順（同じ後細胞の中では前細胞の番号の順）は hoc で作る順と同じ
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+# 細胞種（createcells.hoc の配列名） → 細胞数を決める parameters_new.hoc の変数
+POPULATIONS = {
+    "Rods":    "Num_R",
+    "Cones":   "Num_C",
+    "R_BC":    "Num_RBC",
+    "ON_CBC":  "Num_ONCBC",
+    "OFF_CBC": "Num_OFFCBC",
+    "AIIAC":   "Num_AC",
+    "ON_GC":   "Num_ONGC",
+    "OFF_GC":  "Num_OFFGC",
+}
+
+# ONCB / OFFCB どうしのギャップ結合の g（netconnection_fovea.hoc の ONCB_GJ_set() / OFFCB_GJ_set() と同じ固定値）
+GJ_BIPOLAR = 0.00072
+
+# OFFCB <-> OFFCB の格子（netconnection_fovea.hoc の Gap_OFFCB_*_arr。(始点の番号, 相手との番号の差)）
+OFFCB_ALPHA_ONE = (0, 1, 2, 3, 10, 11, 12, 13, 30, 31, 32, 33, 40, 41, 42, 43)
+OFFCB_ALPHA_TWO = (19, 20, 21, 22)
+OFFCB_BETA = (4, 5, 6, 7, 8, 14, 15, 16, 17, 18)
+OFFCB_GAMMA = (9, 23)
+
+
+class Family:
+    """同じメカニズム・同じ前後の細胞種の結合すべて（1本 = pre_idx[k] -> post_idx[k]）。"""
+
+    def __init__(self, name: str, kind: str, pre: str, post: str, pre_idx, post_idx, g,
+                 release: str | None = None, sym: int = 1, weight: float = 1.0):
+        self.name = name
+        self.kind = kind
+        self.pre = pre
+        self.post = post
+        self.pre_idx = np.asarray(pre_idx, dtype=np.int64)
+        self.post_idx = np.asarray(post_idx, dtype=np.int64)
+        self.g = np.broadcast_to(np.asarray(g, dtype=float), self.pre_idx.shape).copy()
+        self.release = release
+        self.sym = int(sym)
+        self.weight = float(weight)
+
+    def __len__(self) -> int:
+        return len(self.pre_idx)
+
+    def __repr__(self) -> str:
+        return f"Family({self.name}: {self.pre} -> {self.post}, {len(self)} edges)"
+
+
+def cell_counts(params: dict[str, float]) -> dict[str, int]:
+    """細胞種 → 細胞数。"""
+    return {pop: max(int(params[num]), 0) for pop, num in POPULATIONS.items()}
+
+
+def all_to_all(n_pre: int, n_post: int) -> tuple[np.ndarray, np.ndarray]:
+    """後細胞ごとに全部の前細胞（hoc の for i（後）{ for j（前）} と同じ順）。"""
+    post, pre = np.divmod(np.arange(n_pre * n_post, dtype=np.int64), max(n_pre, 1))
+    return pre, post
+
+
+def upper_pairs(n: int) -> tuple[np.ndarray, np.ndarray]:
+    """i < j の組（hoc の for i { for j = i+1 } と同じ順）。"""
+    a, b = np.triu_indices(n, k=1)
+    return a.astype(np.int64), b.astype(np.int64)
+
+
+def oncb_gap_pairs(n: int) -> list[tuple[int, int]]:
+    """
+    ONCB <-> ONCB の組（netconnection_fovea.hoc の ONCB_GJ() と同じ規則・同じ順）。
+
+    hoc と同じく細胞 i ごとに alpha → gamma → beta → delta の順に作る（i = 18 の (18, 21) は alpha と gamma の2本）。
+    """
+    pairs = []
+    j = 0
+    for i in range(n):
+        if i in (0, 1, 2, 8, 9, 10, 16, 17, 18):
+            for d in (3, 4):
+                if i + d < n:
+                    pairs.append((i, i + d))
+        if i == 18 and i + 3 < n:
+            pairs.append((i, i + 3))
+        if i in (7, 15) and i + 4 < n:
+            pairs.append((i, i + 4))
+        if i in (3, 4, 5, 6, 11, 12, 13, 14) and i + 4 < n:
+            pairs.append((i, i + 4))
+        if 22 <= i <= 27:
+            # i = 27 は j を決め直さない（hoc と同じく直前の値のまま）
+            if i in (22, 23, 24):
+                j = i - 22
+            if i in (25, 26):
+                j = i - 17
+            for d in (0, 3, 4, 7, 8, 11):
+                if j + d < n:
+                    pairs.append((i, j + d))
+    return pairs
+
+
+def offcb_gap_pairs(n: int) -> list[tuple[int, int]]:
+    """OFFCB <-> OFFCB の組（netconnection_fovea.hoc の OFFCB_GJ() と同じ規則・同じ順）。"""
+    pairs = []
+    for starts, steps in ((OFFCB_ALPHA_ONE, (4, 5)), (OFFCB_ALPHA_TWO, (5, 6)),
+                          (OFFCB_BETA, (5,)), (OFFCB_GAMMA, (5,))):
+        for j in starts:
+            for d in steps:
+                if j + d < n:
+                    pairs.append((j, j + d))
+    return pairs
+
+
+def _pairs(pairs: list[tuple[int, int]]) -> tuple[np.ndarray, np.ndarray]:
+    arr = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    return arr[:, 0], arr[:, 1]
+
+
+# 結合の種類（Ribbon_syn → Gly_syn → *_GJ の順） →
+#   (kind, 前細胞の種類, 後細胞の種類, g のパラメータ名（None なら GJ_BIPOLAR）, 放出のメカニズム, sym, weight, always)
+# always: hoc が g によらず作る結合（g = 0 でも RibbonPost / depsyn を置き、後から g を入れ直せる）
+FAMILIES = {
+    "R2RB":        ("ribbon", "Rods", "R_BC", "g_R2RB", "RibbonRelease_R2RB", 1, 1.0, False),
+    "C2ONCB":      ("ribbon", "Cones", "ON_CBC", "g_C2ONCB", "RibbonRelease_R2RB", 1, 1.0, False),
+    "C2OFFCB":     ("ribbon", "Cones", "OFF_CBC", "g_C2OFFCB", "RibbonRelease", 1, 1.0, False),
+    "RBC2AC":      ("ribbon", "R_BC", "AIIAC", "g_RBC2AC", "RibbonRelease", 1, 1.0, True),
+    "ONCB2ONGC":   ("ribbon", "ON_CBC", "ON_GC", "g_ONCB2ONGC", "RibbonRelease", 1, 1.0, True),
+    "OFFCB2OFFGC": ("ribbon", "OFF_CBC", "OFF_GC", "g_OFFCB2OFFGC", "RibbonRelease", 1, 1.0, True),
+    "OFFCB2AC":    ("ribbon", "OFF_CBC", "AIIAC", "g_OFFCB2AC", "RibbonRelease", 1, 1.0, True),
+    "AC2OFFGC":    ("depsyn", "AIIAC", "OFF_GC", "g_AC2OFFGC", None, 1, 1.0, True),
+    "AC2OFFCB":    ("depsyn", "AIIAC", "OFF_CBC", "g_AC2OFFCB", None, 1, 2.0, True),
+    "Cone_GJ":     ("gap", "Cones", "Cones", "gj_C2C", None, 1, 1.0, False),
+    "R_C_GJ":      ("gap", "Rods", "Cones", "gj_R2C", None, 0, 1.0, False),
+    "AC_ONBC_GJ":  ("gap", "AIIAC", "ON_CBC", "gj_AC2CB", None, 1, 1.0, False),
+    "AC_GJ":       ("gap", "AIIAC", "AIIAC", "gj_AC2AC", None, 1, 1.0, False),
+    "OFFGC_GJ":    ("gap", "OFF_GC", "OFF_GC", "gj_OFFGC2OFFGC", None, 1, 1.0, False),
+    "ONCB_GJ":     ("gap", "ON_CBC", "ON_CBC", None, None, 1, 1.0, False),
+    "OFFCB_GJ":    ("gap", "OFF_CBC", "OFF_CBC", None, None, 1, 1.0, False),
+}
+
+
+def fovea_edges(params: dict[str, float]) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    netconnection_fovea.hoc の番号の規則で作る結合 → (前細胞の番号, 後細胞の番号)。
+
+    Cone を含む結合は全部の Cone の分を作る（生き残った Cone だけにするのは table_connections()）。
+    """
+    n = cell_counts(params)
+    edges = {
+        "R2RB": all_to_all(n["Rods"], n["R_BC"]),
+        "RBC2AC": all_to_all(n["R_BC"], n["AIIAC"]),
+        "OFFCB2AC": all_to_all(n["OFF_CBC"], n["AIIAC"]),
+        "AC2OFFGC": all_to_all(n["AIIAC"], n["OFF_GC"]),
+        "AC2OFFCB": all_to_all(n["AIIAC"], n["OFF_CBC"]),
+        "Cone_GJ": upper_pairs(n["Cones"]),
+        "AC_GJ": upper_pairs(n["AIIAC"]),
+        "OFFGC_GJ": upper_pairs(n["OFF_GC"]),
+        "ONCB_GJ": _pairs(oncb_gap_pairs(n["ON_CBC"])),
+        "OFFCB_GJ": _pairs(offcb_gap_pairs(n["OFF_CBC"])),
+    }
+    # Cone i -> ONCB i / OFFCB i、ONCB i -> ONGC i、OFFCB i -> OFFGC i
+    for name, pre_pop, post_pop in (("C2ONCB", "Cones", "ON_CBC"), ("C2OFFCB", "Cones", "OFF_CBC"),
+                                    ("ONCB2ONGC", "ON_CBC", "ON_GC"), ("OFFCB2OFFGC", "OFF_CBC", "OFF_GC")):
+        idx = np.arange(min(n[pre_pop], n[post_pop]), dtype=np.int64)
+        edges[name] = (idx, idx)
+    # Rod (i*10 + k) % Num_R <-> Cone i（k < R_cov）
+    r_cov = max(int(params["R_cov"]), 0)
+    cone, k = np.divmod(np.arange(n["Cones"] * r_cov, dtype=np.int64), max(r_cov, 1))
+    edges["R_C_GJ"] = ((cone * 10 + k) % max(n["Rods"], 1), cone) if n["Rods"] else _pairs([])
+    # AIIAC i <-> ONCB j（AIIAC ごとに全部の ONCB）
+    cb_j, ac_i = all_to_all(n["ON_CBC"], n["AIIAC"])
+    edges["AC_ONBC_GJ"] = (ac_i, cb_j)
+    return {name: edges[name] for name in FAMILIES}
+
+
+def table_connections(edges: dict[str, tuple[np.ndarray, np.ndarray]], counts: dict[str, int],
+                      params: dict[str, float], drop_zero: bool = True, hoc_rules: bool = True) -> list[Family]:
+    """
+    結合の番号の表（種類 → (前, 後)）に、今のパラメータの g を入れた Family の列（FAMILIES の順）。
+
+    - 生き残った Cone（番号 < Num_C_RP）を含む結合だけを残す
+    - g が全部 0 の種類は入れない（drop_zero=False なら、always の種類は g が 0 でも入れる。
+      netbuild.py が hoc と同じオブジェクトを作るときに使う）
+    - AIIAC j -> OFFCB は2本（2j, 2j+1 本目）を weight = 2 の1つにまとめる（g_max は2本の平均。AC2OFFCB_g()）。
+      2j, 2j+1 本目という番号は hoc の規則の表（fovea_edges()）のものなので、AC2OFFCB_legacy_g は hoc_rules=True の
+      ときだけ使う（mosaic.py の表は全部 g_AC2OFFCB）
+    """
+    p = params
+    n_rp = int(min(max(p["Num_C_RP"], 0), counts["Cones"]))
+    fams = []
+    for name, (kind, pre_pop, post_pop, g_name, release, sym, weight, always) in FAMILIES.items():
+        if name not in edges:
+            continue
+        pre, post = (np.asarray(a, dtype=np.int64) for a in edges[name])
+        keep = np.ones(len(pre), dtype=bool)
+        if pre_pop == "Cones":
+            keep &= pre < n_rp
+        if post_pop == "Cones":
+            keep &= post < n_rp
+        pre, post = pre[keep], post[keep]
+        if name == "AC2OFFCB":
+            slot = np.stack([2 * pre, 2 * pre + 1])
+            g = np.full(slot.shape, p["g_AC2OFFCB"])
+            if hoc_rules and p["AC2OFFCB_legacy_g"]:
+                g[slot >= counts["AIIAC"]] = p["g_AC2OFFCB_unset"]
+            g = g.mean(axis=0)
+        else:
+            g = GJ_BIPOLAR if g_name is None else p[g_name]
+        fam = Family(name, kind, pre_pop, post_pop, pre, post, g, release=release, sym=sym, weight=weight)
+        if len(fam) and (np.any(fam.g != 0) or (always and not drop_zero)):
+            fams.append(fam)
+    return fams
+
+
+def fovea_connections(params: dict[str, float], drop_zero: bool = True) -> list[Family]:
+    """
+    netconnection_fovea.hoc と同じ結合の表（Ribbon_syn → Gly_syn → *_GJ の順）。
+
+    params は parameters_new.hoc の評価後の値（network.effective_params() の戻り値）。
+    drop_zero は table_connections() と同じ。
+    """
+    return table_connections(fovea_edges(params), cell_counts(params), params, drop_zero)
+
+
+def in_degree(fams: list[Family], counts: dict[str, int]) -> dict[str, np.ndarray]:
+    """細胞種 → 細胞ごとに置かれる point process の数（シナプスの後側・ギャップ結合の両側。負荷の見積もり用）。"""
+    deg = {pop: np.zeros(k, dtype=np.int64) for pop, k in counts.items()}
+    for fam in fams:
+        if fam.kind == "gap":
+            # sym = 0 なら pre 側だけ
+            np.add.at(deg[fam.pre], fam.pre_idx, 1)
+            if fam.sym:
+                np.add.at(deg[fam.post], fam.post_idx, 1)
+        else:
+            # 放出は前細胞ごとに1つ
+            np.add.at(deg[fam.post], fam.post_idx, 1)
+            deg[fam.pre][np.unique(fam.pre_idx)] += 1
+    return deg
@@ -0,0 +1,223 @@
+"""
+シミュレーションの実行モード（classic NEURON / CoreNEURON direct mode）を切り替えるモジュール。
+
+処理:
+- mode="classic"    : recording.run() で continuerun（従来どおり NEURON 本体で計算）
+- mode="coreneuron" : ParallelContext.psolve(tstop) で tstop までの計算を CoreNEURON に渡し、
+                      Vector.record の結果を NEURON 側へ戻す（direct mode、ファイル出力なし）
+- CoreNEURON で動かせない条件なら理由を表示して classic にフォールバック
+
+CoreNEURON で動かせない条件:
+- 使用中のメカニズムが NEURON 専用の乱数関数（normrand / set_seed など）を使っている
+  （例: mod/Ifluct1.mod。CoreNEURON 側にはこれらの関数が無い。noise_r123 = 1 の IfluctR123 なら動かせる）
+- 使用中のメカニズムに THREADSAFE 宣言が無く、POINTER / VERBATIM / GLOBAL を含む
+  （mod2c_core が "not thread safe" として変換を拒否する）
+- LinearMechanism を使っている（gap_linear = 1 のギャップ結合。CoreNEURON には LinearMechanism が無い）
+- CoreNEURON 用のメカニズムライブラリ（nrnivmodl -coreneuron でビルド）が見つからない
+- psolve 自体が失敗した
+
+補足:
+- CoreNEURON が転送できるのは「毎ステップの Vector.record」だけなので、
+  記録側は recording.Probe(..., per_step=True) を使うこと
+- POINTER（ギャップ結合・graded シナプスの v_pre）はスレッドをまたげないため、1スレッドで実行する
+  （複数スレッドで実行するときは POINTER を使わない parallel_net.py の構築を使う。thread_blockers() /
+  partition_threads() / thread_times()）
+- リボンシナプスの放出状態 w（RibbonRelease → RibbonPost）は ParallelContext の source_var / target_var で渡す
+"""
+
+from __future__ import annotations
+
+import platform
+import re
+from pathlib import Path
+
+from neuron import h
+
+from recording import run
+
+RUN_MODES = ("classic", "coreneuron")
+
+BASE = Path(__file__).resolve().parent
+MOD_DIR = BASE / "mod"
+
+# CoreNEURON には存在しない NEURON (scop) の乱数関数
+_NEURON_ONLY_RANDOM_RE = re.compile(r"\b(normrand|set_seed|scop_random|exprand|unirand|poisrand)\s*\(")
+_MECH_NAME_RE = re.compile(r"^\s*(?:SUFFIX|POINT_PROCESS|ARTIFICIAL_CELL)\s+(\w+)", re.MULTILINE)
+
+
+def _strip_mod_comments(text: str) -> str:
+    """COMMENT ... ENDCOMMENT と ':' 以降のコメントを取り除く。"""
+    text = re.sub(r"\bCOMMENT\b.*?\bENDCOMMENT\b", "", text, flags=re.DOTALL)
+    return re.sub(r":[^\n]*", "", text)
+
+
+def mod_files_by_mechanism(mod_dir: Path = MOD_DIR) -> dict[str, Path]:
+    """メカニズム名（SUFFIX / POINT_PROCESS 名）→ mod ファイルの対応表。"""
+    table = {}
+    for path in sorted(mod_dir.glob("*.mod")):
+        text = _strip_mod_comments(path.read_text(encoding="utf-8", errors="replace"))
+        for name in _MECH_NAME_RE.findall(text):
+            table[name] = path
+    return table
+
+
+def mechanisms_in_use() -> set[str]:
+    """現在のモデルで実際に使われている膜メカニズムと point process の名前。"""
+    used = set()
+    for sec in h.allsec():
+        # sec.psection() は CoreNEURON 用の内部構造を古くしてしまうので segment を直接たどる
+        for seg in sec:
+            used.update(mech.name() for mech in seg)
+
+    mt = h.MechanismType(1)   # point process
+    name = h.ref("")
+    for i in range(int(mt.count())):
+        mt.select(i)
+        mt.selected(name)
+        if h.List(name[0]).count() > 0:
+            used.add(name[0])
+    return used
+
+
+def mod_incompatibility(path: Path) -> str | None:
+    """mod ファイルが CoreNEURON で使えない理由（使えるなら None）。"""
+    text = _strip_mod_comments(path.read_text(encoding="utf-8", errors="replace"))
+    m = _NEURON_ONLY_RANDOM_RE.search(text)
+    if m:
+        return f"NEURON 専用の乱数関数 {m.group(1)}() を使用（CoreNEURON には無い）"
+    if not re.search(r"\bTHREADSAFE\b", text):
+        unsafe = [kw for kw in ("POINTER", "VERBATIM", "GLOBAL") if re.search(rf"\b{kw}\b", text)]
+        if unsafe:
+            return f"THREADSAFE 宣言が無い（{'/'.join(unsafe)} を含むため mod2c_core が拒否）"
+    return None
+
+
+def coreneuron_library(base: Path = BASE) -> Path | None:
+    """nrnivmodl -coreneuron で作られた CoreNEURON 用メカニズムライブラリを探す。"""
+    libs = sorted((base / platform.machine()).glob("libcorenrnmech*"))
+    return libs[0] if libs else None
+
+
+def coreneuron_blockers(mod_dir: Path = MOD_DIR) -> list[str]:
+    """CoreNEURON で実行できない理由の一覧（空なら実行可能）。"""
+    blockers = []
+    table = mod_files_by_mechanism(mod_dir)
+    for name in sorted(mechanisms_in_use()):
+        path = table.get(name)
+        if path is None:
+            continue   # pas / IClamp など NEURON 組み込み
+        reason = mod_incompatibility(path)
+        if reason:
+            blockers.append(f"{name} ({path.name}): {reason}")
+    if h.List("LinearMechanism").count() > 0:
+        blockers.append("LinearMechanism（gap_linear = 1 のギャップ結合）は CoreNEURON に無い")
+    if coreneuron_library() is None:
+        blockers.append(f"CoreNEURON 用ライブラリが {platform.machine()}/ に無い"
+                        "（nrnivmodl -coreneuron mod でビルドが必要）")
+    return blockers
+
+
+def report_fallback(blockers: list[str]) -> None:
+    print("[CoreNEURON] classic NEURON にフォールバックします:")
+    for b in blockers:
+        print(f"  - {b}")
+
+
+def thread_incompatibility(path: Path) -> str | None:
+    """mod ファイルを複数スレッド（ParallelContext.nthread）で使えない理由（使えるなら None）。"""
+    text = _strip_mod_comments(path.read_text(encoding="utf-8", errors="replace"))
+    m = _NEURON_ONLY_RANDOM_RE.search(text)
+    if m:
+        return f"NEURON 全体で1本の乱数列（{m.group(1)}()）をスレッドで取り合う（実行順で値が変わる）"
+    if not re.search(r"\bTHREADSAFE\b", text):
+        return "THREADSAFE 宣言が無い（nocmodl がスレッドで使えないメカニズムとして扱う）"
+    if re.search(r"\bPOINTER\b", text):
+        return "POINTER の参照先（前細胞の v など）が別スレッドにあると、更新途中の値を読む"
+    return None
+
+
+def thread_blockers(mod_dir: Path = MOD_DIR) -> list[str]:
+    """複数スレッドで実行できない理由の一覧（空なら実行可能）。"""
+    blockers = []
+    table = mod_files_by_mechanism(mod_dir)
+    for name in sorted(mechanisms_in_use()):
+        path = table.get(name)
+        if path is None:
+            continue
+        reason = thread_incompatibility(path)
+        if reason:
+            blockers.append(f"{name} ({path.name}): {reason}")
+    if h.List("LinearMechanism").count() > 0:
+        blockers.append("LinearMechanism（gap_linear = 1 のギャップ結合）は1スレッドでしか使えない")
+    return blockers
+
+
+def partition_threads(roots_per_thread: list[list]) -> None:
+    """
+    pc.nthread(len(roots_per_thread)) にして、スレッド i に roots_per_thread[i] の根の section（とその子孫）を割り当てる。
+
+    全ての根の section がどれかのスレッドに入っていること（pc.partition の条件）。
+    """
+    pc = h.ParallelContext()
+    pc.partition()   # 前の割り当てを消す
+    pc.nthread(len(roots_per_thread))
+    if len(roots_per_thread) == 1:
+        return
+    for i, roots in enumerate(roots_per_thread):
+        sl = h.SectionList()
+        for sec in roots:
+            sl.append(sec=sec)
+        pc.partition(i, sl)
+
+
+def thread_times() -> list[float]:
+    """スレッドごとの計算時間（s。pc.thread_ctime。直前の実行の分）。"""
+    pc = h.ParallelContext()
+    return [float(pc.thread_ctime(i)) for i in range(int(pc.nthread()))]
+
+
+def run_coreneuron(tstop: float, cell_permute: int = 1) -> None:
+    """finitialize 済みのモデルを CoreNEURON (direct mode) で tstop まで実行する。"""
+    from neuron import coreneuron
+
+    if not h.cvode.cache_efficient():
+        # finitialize 後に切り替えると内部構造が作り直しになるので、ここでは有効化しない
+        raise RuntimeError("h.cvode.cache_efficient(1) を finitialize より前に呼んでください")
+
+    pc = h.ParallelContext()
+    pc.set_maxstep(10)
+    coreneuron.enable = True
+    coreneuron.cell_permute = cell_permute
+    try:
+        pc.psolve(tstop)
+    finally:
+        coreneuron.enable = False
+
+
+def run_simulation(tstop: float, mode: str = "classic", reinit=None, cell_permute: int = 1) -> str:
+    """
+    finitialize 済みのモデルを tstop まで実行し、実際に使った実行モードを返す。
+
+    mode="coreneuron" で実行できない場合は理由を表示して classic で実行する。
+    psolve が途中で失敗した場合は reinit()（init.py の init() など）で初期化し直してから実行する。
+    reinit が None のとき（t = 0 からやり直せない、チェックポイントから再開した実行など）は
+    classic に切り替えずに例外をそのまま上げる。
+    """
+    if mode not in RUN_MODES:
+        raise ValueError(f"mode must be one of {RUN_MODES}, got {mode!r}")
+
+    if mode == "coreneuron":
+        blockers = coreneuron_blockers()
+        if not blockers:
+            try:
+                run_coreneuron(tstop, cell_permute)
+                return "coreneuron"
+            except Exception as e:
+                if reinit is None:
+                    raise
+                blockers = [f"psolve が失敗: {e}"]
+                reinit()
+        report_fallback(blockers)
+
+    run(tstop)
+    return "classic"
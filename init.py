@@ -3,11 +3,14 @@ NEURON網膜回路モデルを実行し、指定した細胞の膜電位トレ
 
 処理:
 - hocファイルを読み込み（parameters / createcells / netconnection）
-- CoreNEURONを有効化してシミュレーションを高速実行
-- 指定セルの膜電位を、t>=1000 ms から保存
+- RUN_MODE で CoreNEURON (direct mode) / classic NEURON を選択
+  （CoreNEURON で動かせないメカニズムがあれば理由を表示して classic で実行）
+- 指定セルの膜電位を Vector.record で記録し、continuerun で一括実行
+- t>=1000 ms の区間をまとめて保存（記録間隔は RECORD_DT で変更可）
 
 出力:
-- {cellname}_R{Num_R}_C{Num_C}.txt（ヘッダ: time(ms), voltage(mV)）
+- {cellname}_{Num_R}.trace（OUTPUT_SUFFIX = ".txt" なら従来の CSV。ヘッダ: time(ms), voltage(mV)）
+- RECORD を指定したときは BUNDLE_{Num_R}.trace（指定した細胞をまとめて1ファイル。列名は AIIAC[0] など）
 
 補足:
 - plot_static() は刺激区間を色分けしてPDF保存
@@ -22,14 +25,15 @@ import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from matplotlib import cm
 import matplotlib.patches as patches
-from neuron import coreneuron
+from recording import Probe, RECORD_START_MS, RecordSpec, noise_seeds, save_trace
+from execution import run_simulation
 
 # --- Load NEURON hoc files ---
 print("=========== init.py =============")
 h.load_file("stdrun.hoc")
-coreneuron.enable = True 
-coreneuron.nthread = 8
-coreneuron.cell_permute = 1 
+# 実行モード: "coreneuron"（psolve を CoreNEURON に渡す） or "classic"
+RUN_MODE = "coreneuron"
+CORENEURON_CELL_PERMUTE = 1
 h.cvode.cache_efficient(1)
 h.load_file("src/parameters_new.hoc")
 h.load_file("createcells.hoc")
@@ -43,6 +47,7 @@ def step():
 
 
 def init():
+    h.dt = h.step_dt      # finitialize より前に設定（後から変えると CoreNEURON 用の内部構造が古くなる）
     h.finitialize()
     h.fcurrent()
     h.dt = h.step_dt
@@ -72,6 +77,7 @@ def start(amp, R, C):
     h.ONCB_GJ_set()       # in netconnection.hoc
     h.OFFCB_GJ()         # in netconnection.hoc
     h.OFFCB_GJ_set()      # in netconnection.hoc
+    h.Gap_linear()        # in netconnection.hoc
     init()
 
 
@@ -170,26 +176,46 @@ def export_data_txt(filename):
     Run a fresh simulation and write time (ms) and membrane potential (mV)
     for t >= 1000 ms into a CSV text file with headers.
     """
-    with open(filename, 'w') as f:
-        f.write("time(ms),voltage(mV)\n")
-        while h.t < h.tstop:
-            step()
-            if h.t >= 1000:
-                voltage = getattr(target_object.soma, name)
-                f.write(f"{h.t:.4f},{voltage:.4f}\n")
+    probe = Probe.soma(target_object, name, record_dt=RECORD_DT,
+                       per_step=(RUN_MODE == "coreneuron"))
+    init()
+    used_mode = run_simulation(h.tstop, RUN_MODE, reinit=init, cell_permute=CORENEURON_CELL_PERMUTE)
+    print(f"[INFO] run mode: {used_mode}")
+    t, v = probe.window(RECORD_START_MS)
+    meta = {"target": {"kind": "soma", "cell": object_name, "index": 0, "var": name},
+            "params": {"Num_R": h.Num_R, "Num_C_RP": h.Num_C_RP, "Num_C": h.Num_C},
+            "param_file": "parameters_new.hoc", "seed": noise_seeds(), "run_mode": used_mode}
+    save_trace(filename, t, v, header="time(ms),voltage(mV)", meta=meta)
 
     print(f"Data exported to {filename}")
 
 
+def export_bundle(filename):
+    """
+    RECORD で指定した細胞の膜電位を1回の実行でまとめて記録し、1つのファイルに列を並べて保存する。
+    """
+    spec = RecordSpec(RECORD)
+    bundle = spec.probes(per_step=(RUN_MODE == "coreneuron"), record_dt=RECORD_DT)
+    init()
+    used_mode = run_simulation(h.tstop, RUN_MODE, reinit=init, cell_permute=CORENEURON_CELL_PERMUTE)
+    print(f"[INFO] run mode: {used_mode}")
+    t, V = bundle.window(RECORD_START_MS)
+    meta = {"target": spec.describe(),
+            "params": {"Num_R": h.Num_R, "Num_C_RP": h.Num_C_RP, "Num_C": h.Num_C},
+            "param_file": "parameters_new.hoc", "seed": noise_seeds(), "run_mode": used_mode}
+    save_trace(filename, t, V, header=bundle.header, meta=meta)
+
+    print(f"Data exported to {filename} ({len(bundle.columns)} cells)")
+
+
 def record_times_and_voltages():
-    times, voltages = [], []
-    while h.t < h.tstop:
-        step()
-        if h.t >= 1000:
-            times.append(h.t / 1000.0)
-            # voltages.append(h.AC2OFFCB[0][0].i)
-            voltages.append(getattr(target_object.soma, name))
-    return times, voltages
+    probe = Probe.soma(target_object, name, record_dt=RECORD_DT,
+                       per_step=(RUN_MODE == "coreneuron"))
+    init()
+    used_mode = run_simulation(h.tstop, RUN_MODE, reinit=init, cell_permute=CORENEURON_CELL_PERMUTE)
+    print(f"[INFO] run mode: {used_mode}")
+    t, v = probe.window(RECORD_START_MS)
+    return list(t / 1000.0), list(v)
 
 
 # run_timer_simple.py
@@ -207,11 +233,18 @@ start(h.AMP, h.Num_R, h.Num_C)
 target_object = h.OFF_GC[0]
 name = 'v'
 object_name = object_names.get(target_object)
+RECORD_DT = h.step_dt   # 記録間隔 (ms)。step_dt の整数倍にすると出力を間引ける
+OUTPUT_SUFFIX = ".trace"   # ".trace"（バイナリ。traces.py） or ".txt"（従来の CSV）
+# まとめて記録する細胞（例: {"AIIAC": "all", "ON_GC": [0], "OFF_GC": "0:5"}）。None なら target_object だけ
+RECORD = None
 
 if __name__ == "__main__":
     # print(f"{object_name}_{h.Num_R:.0f}")
     # plot_static()
-    export_data_txt(f"{object_name}_{h.Num_R:.0f}.txt")
+    if RECORD:
+        export_bundle(f"BUNDLE_{h.Num_R:.0f}{OUTPUT_SUFFIX}")
+    else:
+        export_data_txt(f"{object_name}_{h.Num_R:.0f}{OUTPUT_SUFFIX}")
     # animate_recording()
     print(f"{object_name}_{h.Num_R:.0f}")
     print("complete")
@@ -2,17 +2,19 @@
 NEURON網膜回路モデルを実行し、指定したシナプスの変数をCSV形式で保存するスクリプト。
 
 処理:
-- hocファイルを読み込み、CoreNEURONを有効化してシミュレーションを実行
+- hocファイルを読み込み、RUN_MODE（CoreNEURON direct mode / classic）でシミュレーションを実行
+  （CoreNEURON で動かせないメカニズムがあれば理由を表示して classic で実行）
 - 刺激、ノイズ、リボンシナプス、抑制性シナプス、各種ギャップ結合を設定して初期化
 - シナプス配列名（例: ONCB2ONGC）と pre/postを指定して計測対象を選択
-- 指定変数（例: p1 / u / w / g / i など）を、t>=1000 ms から time(ms) と一緒に保存
+- 指定変数（例: p1 / u / w / g / i など）を Vector.record で記録し、continuerun で一括実行
+- t>=1000 ms の区間を time(ms) と一緒にまとめて保存（記録間隔は RECORD_DT で変更可）
 
 入力:
 - hoc: src/parameters_new.hoc, createcells.hoc, src/netconnection_fovea.hoc など
 
 出力:
-- {SYN_ARRAY_NAME}_{syn_name}_R{Num_R}_C{Num_C_RP}.txt
-  例: ONCB2ONGC_p1_R400_C20.txt（ヘッダ: time(ms), p1）
+- {SYN_ARRAY_NAME}_{syn_name}_R{Num_R}_C{Num_C_RP}.trace（OUTPUT_SUFFIX = ".txt" なら従来の CSV）
+  例: ONCB2ONGC_p1_R400_C20.trace（列名: p1）
 """
 
 import neuron
@@ -23,14 +25,15 @@ import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from matplotlib import cm
 import matplotlib.patches as patches
-from neuron import coreneuron
+from recording import Probe, RECORD_START_MS, noise_seeds, save_trace
+from execution import run_simulation
 
 # --- Load NEURON hoc files ---
 print("=========== init.py =============")
 h.load_file("stdrun.hoc")
-coreneuron.enable = True 
-coreneuron.nthread = 8
-coreneuron.cell_permute = 1 
+# 実行モード: "coreneuron"（psolve を CoreNEURON に渡す） or "classic"
+RUN_MODE = "coreneuron"
+CORENEURON_CELL_PERMUTE = 1
 h.cvode.cache_efficient(1)
 h.load_file("src/parameters_new.hoc")
 h.load_file("createcells.hoc")
@@ -41,6 +44,7 @@ def step():
     h.fadvance()
 
 def init():
+    h.dt = h.step_dt      # finitialize より前に設定（後から変えると CoreNEURON 用の内部構造が古くなる）
     h.finitialize()
     h.fcurrent()
     h.dt = h.step_dt
@@ -128,15 +132,19 @@ def export_data_txt(filename):
     """
     Run a fresh simulation and write time (ms) and synapse variable
     for t >= 1000 ms into a CSV text file with headers.
-    （計測ループや書き方は元のまま。参照先だけシナプスに変更）
+    （参照先はシナプス。記録は Vector.record、書き出しは一括）
     """
-    with open(filename, 'w') as f:
-        f.write(f"time(ms),{syn_name}\n")
-        while h.t < h.tstop:
-            step()
-            if h.t >= 1000:
-                value = getattr(target_synapse, syn_name)  # ★ここだけが本質的な変更
-                f.write(f"{h.t:.4f},{value:.6f}\n")
+    probe = Probe.point_process(target_synapse, syn_name, record_dt=RECORD_DT,
+                                per_step=(RUN_MODE == "coreneuron"))
+    init()
+    used_mode = run_simulation(h.tstop, RUN_MODE, reinit=init, cell_permute=CORENEURON_CELL_PERMUTE)
+    print(f"[INFO] run mode: {used_mode}")
+    t, values = probe.window(RECORD_START_MS)
+    meta = {"target": {"kind": "synapse", "array": SYN_ARRAY_NAME, "post": POST_IDX, "pre": PRE_IDX,
+                       "var": syn_name},
+            "params": {"Num_R": h.Num_R, "Num_C_RP": h.Num_C_RP, "Num_C": h.Num_C},
+            "param_file": "parameters_new.hoc", "seed": noise_seeds(), "run_mode": used_mode}
+    save_trace(filename, t, values, header=f"time(ms),{syn_name}", value_fmt="%.6f", meta=meta)
 
     print(f"Data exported to {filename}")
 
@@ -146,13 +154,13 @@ def record_times_and_voltages():
     関数名はそのまま（呼び出し側を崩さないため）。
     中身は “シナプス値” を返すように変更。
     """
-    times, values = [], []
-    while h.t < h.tstop:
-        step()
-        if h.t >= 1000:
-            times.append(h.t / 1000.0)
-            values.append(getattr(target_synapse, syn_name))  # ★ここだけ変更
-    return times, values
+    probe = Probe.point_process(target_synapse, syn_name, record_dt=RECORD_DT,
+                                per_step=(RUN_MODE == "coreneuron"))
+    init()
+    used_mode = run_simulation(h.tstop, RUN_MODE, reinit=init, cell_permute=CORENEURON_CELL_PERMUTE)
+    print(f"[INFO] run mode: {used_mode}")
+    t, values = probe.window(RECORD_START_MS)
+    return list(t / 1000.0), list(values)
 
 
 # -------------------------------
@@ -192,14 +200,16 @@ target_synapse, syn_order = pick_synapse(SYN_ARRAY_NAME, POST_IDX, PRE_IDX)
 
 syn_name  = "p1"              # 例: "isyn", "i", "g", "u", "P1", "w" など
 syn_label = f"{SYN_ARRAY_NAME}_{syn_name}"
+RECORD_DT = h.step_dt         # 記録間隔 (ms)。step_dt の整数倍にすると出力を間引ける
+OUTPUT_SUFFIX = ".trace"      # ".trace"（バイナリ。traces.py） or ".txt"（従来の CSV）
 
 print(f"[INFO] recording synapse: {syn_label}")
 # （任意）利用可能な変数候補を見たいとき：print([x for x in dir(target_synapse) if x.startswith('_ref_')])
 
 
 if __name__ == "__main__":
-    print(f"{syn_label}_R{h.Num_R:.0f}_C{h.Num_C_RP:.0f}.txt")
-    export_data_txt(f"{syn_label}_R{h.Num_R:.0f}_C{h.Num_C_RP:.0f}.txt")
+    print(f"{syn_label}_R{h.Num_R:.0f}_C{h.Num_C_RP:.0f}{OUTPUT_SUFFIX}")
+    export_data_txt(f"{syn_label}_R{h.Num_R:.0f}_C{h.Num_C_RP:.0f}{OUTPUT_SUFFIX}")
     print("complete")
 
 elapsed = perf_counter() - t0
@@ -0,0 +1,197 @@
+"""
+スイープの進み具合をディスクに記録して、途中で止まっても続きから再開できるようにするモジュール。
+
+処理:
+- RESULTS_DIR/sweep_journal.jsonl に、点ごとの状態の変化を1行1イベントで追記する
+    planned（予定に入った） / running（ワーカーが始めた） / done（出力を書いた） / failed（失敗）
+  各行には時刻・かかった時間・試行回数・ワーカーの pid・失敗理由（最後の1行）が入る
+- 再開時はジャーナルを読み直して
+    - done で出力ファイルもある点は飛ばす
+    - failed は max_attempts 回まで再実行する（それ以上失敗した点は飛ばして報告だけする）
+    - running のまま終わっている点（プロセスごと落ちた）は再実行する
+- 実行中は1点終わるごとに、完了数・スループット（点/分）・残り時間の見込み（ETA）を表示する
+
+使い方（sweep_coupling_2d.py などから）:
+    journal = SweepJournal(RESULTS_DIR / "sweep_journal.jsonl", max_attempts=3)
+    for res in run_journaled(points, target, journal, workers=None, run_mode="coreneuron"):
+        ...
+
+補足:
+- 追記は O_APPEND で1行ずつ1回の write にしているので、複数のワーカーが同時に書いても行は混ざらない
+- 同じ key でもパラメータが前回と違う点は、別の点として最初からやり直す
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from sweep import SweepPoint, run_sweep
+
+STATES = ("planned", "running", "done", "failed")
+
+
+def params_digest(params: dict) -> str:
+    """パラメータの上書き値の短いハッシュ（前回と同じ点かどうかの判定用）。"""
+    text = json.dumps({k: str(v) for k, v in sorted(params.items())}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class PointStatus:
+    """ジャーナルから読み直した1点の最新状態。"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.state = "planned"
+        self.digest = None
+        self.failures = 0
+        self.elapsed = None
+        self.error = None
+
+
+class SweepJournal:
+    """1つのスイープの状態を記録する追記専用のジャーナル。"""
+
+    def __init__(self, path: Path, max_attempts: int = 3):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+
+    def record(self, key: str, state: str, **info) -> None:
+        if state not in STATES:
+            raise ValueError(f"state must be one of {STATES}, got {state!r}")
+        event = {"key": key, "state": state, "time": time.time(), "pid": os.getpid(), **info}
+        line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def load(self) -> dict[str, PointStatus]:
+        """ジャーナルを先頭から読み、点ごとの最新状態を返す（壊れた行は無視する）。"""
+        status: dict[str, PointStatus] = {}
+        if not self.path.exists():
+            return status
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except json.JSONDecodeError:
+                    continue   # 書き込み途中で止まった最後の行など
+                st = status.setdefault(ev["key"], PointStatus(ev["key"]))
+                if ev["state"] == "planned":
+                    if st.digest is not None and st.digest != ev.get("digest"):
+                        # パラメータが変わった → 別の点としてやり直す
+                        status[ev["key"]] = st = PointStatus(ev["key"])
+                    st.digest = ev.get("digest")
+                    st.state = "planned"
+                    continue
+                st.state = ev["state"]
+                if ev["state"] == "failed":
+                    st.failures += 1
+                    st.error = ev.get("error")
+                if "elapsed" in ev:
+                    st.elapsed = ev["elapsed"]
+        return status
+
+    def plan(self, points: list[SweepPoint]) -> tuple[list[SweepPoint], list[SweepPoint], list[SweepPoint]]:
+        """
+        points を (これから実行する点, 完了済みの点, 失敗が上限に達した点) に分ける。
+
+        新しい点・パラメータが変わった点はここで planned を記録する。
+        """
+        status = self.load()
+        todo, done, given_up = [], [], []
+        for point in points:
+            digest = params_digest(point.params)
+            st = status.get(point.key)
+            if st is None or st.digest != digest:
+                self.record(point.key, "planned", digest=digest, output=str(point.output))
+                todo.append(point)
+            elif st.state == "done" and point.output.exists():
+                done.append(point)
+            elif st.failures >= self.max_attempts and st.state == "failed":
+                given_up.append(point)
+            else:
+                todo.append(point)
+        return todo, done, given_up
+
+    def failures(self, key: str) -> int:
+        st = self.load().get(key)
+        return 0 if st is None else st.failures
+
+
+class Progress:
+    """完了数・スループット・ETA の表示。"""
+
+    def __init__(self, total: int, already_done: int = 0, given_up: int = 0):
+        self.total = total
+        self.done = already_done
+        self.given_up = given_up     # 前回までに失敗が上限に達していて、この実行では飛ばす点
+        self.exhausted = 0           # この実行で失敗が上限に達した点（もうやり直さない）
+        self.failed = 0
+        self.simulated = 0
+        self.t0 = time.perf_counter()
+
+    def update(self, res, exhausted: bool = False) -> None:
+        """res を数える。exhausted は失敗が上限に達してもうやり直さない点か。"""
+        if res.ok:
+            self.done += 1
+            if not res.cached:
+                self.simulated += 1
+        else:
+            self.failed += 1
+            if exhausted:
+                self.exhausted += 1
+
+    def line(self) -> str:
+        wall = time.perf_counter() - self.t0
+        # もう実行しない点（飛ばした点・失敗が上限に達した点）は残りに入れない。
+        # キャッシュにある点は run_sweep が最初にまとめて返すので、計算が始まった後の残りは全部計算する点
+        remaining = self.total - self.done - self.given_up - self.exhausted
+        text = f"[PROGRESS] {self.done}/{self.total} done, {self.failed} failed"
+        if self.simulated > 0 and wall > 0:
+            rate = self.simulated / wall          # この実行で計算した点だけで測る（キャッシュは除く）
+            eta = remaining / rate
+            h_, rem = divmod(int(eta), 3600)
+            text += f", {rate * 60:.2f} points/min, ETA {h_}h{rem // 60:02d}m"
+        return text
+
+
+def run_journaled(points: list[SweepPoint], target, journal: SweepJournal, **kwargs):
+    """
+    ジャーナルを見ながら run_sweep を回し、SweepResult を yield する。
+
+    完了済みの点は飛ばし、失敗した点は journal.max_attempts 回まで（この実行中も）やり直す。
+    kwargs は run_sweep にそのまま渡す（workers / run_mode / cache など）。
+    """
+    points = list(points)
+    todo, done, given_up = journal.plan(points)
+    progress = Progress(len(points), already_done=len(done), given_up=len(given_up))
+    print(f"[JOURNAL] {journal.path.name}: {len(done)} done, {len(todo)} to run, "
+          f"{len(given_up)} skipped after {journal.max_attempts} failures")
+    for point in given_up:
+        print(f"[JOURNAL] skip {point.key} (failed {journal.max_attempts} times)")
+
+    while todo:
+        retry = []
+        for res in run_sweep(todo, target, journal=journal, **kwargs):
+            if res.ok:
+                journal.record(res.key, "done", elapsed=res.elapsed, cached=res.cached,
+                               build=res.build, run_mode=res.run_mode)
+            else:
+                last = res.error.strip().splitlines()[-1] if res.error else ""
+                journal.record(res.key, "failed", elapsed=res.elapsed, error=last)
+                if journal.failures(res.key) < journal.max_attempts:
+                    retry.append(res.key)
+            progress.update(res, exhausted=not res.ok and res.key not in retry)
+            yield res
+            print(progress.line())
+        todo = [p for p in todo if p.key in retry]
+        if todo:
+            print(f"[JOURNAL] retrying {len(todo)} failed points")
+            progress.failed -= len(todo)   # やり直す分は失敗から外す
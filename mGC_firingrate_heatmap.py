@@ -2,12 +2,14 @@
 # -*- coding: utf-8 -*-
 """
  mGC発火率ヒートマップ + knee検出（Cones×Rods）
- ON/OFF mGCの膜電位（{TARGET}_R*_C*.txt）からスパイクを検出
+ ON/OFF mGCの膜電位（{TARGET}_R*_C*.trace / .txt）からスパイクを検出
  発火率(Hz)の行列を作ってヒートマップ化、さらに急変点(knee)を推定して線で重ね描き
 
  入力:
- - {TARGET}_fovea フォルダ内の CSV 形式txt（先頭2列が time(ms), voltage(mV)）
-   例: ON_GC_R400_C20.txt など（Rod=R, Cone=C）
+ - {TARGET}_fovea フォルダ内のバイナリ .trace（traces.py）または CSV 形式txt（先頭2列が time(ms), voltage(mV)）
+   例: ON_GC_R400_C20.trace など（Rod=R, Cone=C。同名の .txt と .trace があれば .trace を使う）
+ - スパイク時刻だけを記録した .spikes（sweep.SpikeTarget）があればそれを使う
+   （SpikeHyst が同じ閾値・ヒステリシスで判定済みなので、膜電位から数えた結果と一致する）
 
  出力:
  - ヒートマップPDF（knee線つき）
@@ -31,6 +33,8 @@ import matplotlib.pyplot as plt
 from matplotlib.colors import Normalize, LinearSegmentedColormap
 from mpl_toolkits.axes_grid1 import make_axes_locatable  # ★追加
 
+from traces import SPIKE_SUFFIXES, SPIKES_SUFFIX, load_trace, open_spikes, prefer_binary
+
 # モードと機能フラグ
 MODE = "ON"    # "ON" or "OFF"
 ENABLE_STEEPEST = False
@@ -42,7 +46,11 @@ USE_PAVA = False
 # 入力
 TARGET = "ON_GC" if MODE == "ON" else "OFF_GC"
 ROOT_DIR = Path(f"{TARGET}_fovea")
-PATTERN = f"{TARGET}_R*_C*.txt"
+# バンドル（sweep_rodcone.py の RECORD で複数細胞をまとめたファイル）を読むときは
+# ROOT_DIR を Dim_BUNDLE_fovea、PREFIX を "BUNDLE" にする。CELL はバンドルから読む列
+PREFIX = TARGET
+CELL = f"{TARGET}[0]"
+PATTERN = f"{PREFIX}_R*_C*.*"   # .spikes / .trace / .txt
 RECURSIVE = False
 
 # スパイク検出
@@ -82,12 +90,12 @@ RAPID_PERCENTILE = 90.0
 CSV_GRADMAG     = ROOT_DIR / f"{MODE}mGC_gradient_mag.csv"
 CSV_RAPID_MASK  = ROOT_DIR / f"{MODE}mGC_rapid_region_mask.csv"
 
-FILENAME_RE = re.compile(rf"^{re.escape(TARGET)}_R(\d+)_C(\d+)\.txt$", re.IGNORECASE)
+FILENAME_RE = re.compile(rf"^{re.escape(PREFIX)}_R(\d+)_C(\d+)\.(?:spikes|trace|txt)$", re.IGNORECASE)
 
 # 補助関数
 def iter_files(folder: Path) -> list[Path]:
     it = folder.rglob(PATTERN) if RECURSIVE else folder.glob(PATTERN)
-    return sorted([p for p in it if p.is_file()], key=lambda p: p.name)
+    return prefer_binary((p for p in it if p.is_file()), SPIKE_SUFFIXES)
 
 def rc_from_name(p: Path) -> tuple[int, int] | None:
     m = FILENAME_RE.match(p.name)
@@ -95,15 +103,6 @@ def rc_from_name(p: Path) -> tuple[int, int] | None:
         return None
     return int(m.group(1)), int(m.group(2))
 
-def load_trace(path: Path) -> tuple[np.ndarray, np.ndarray]:
-    try:
-        data = np.loadtxt(path, delimiter=",", skiprows=1)
-    except Exception:
-        data = np.loadtxt(path, skiprows=1)
-    if data.ndim != 2 or data.shape[1] < 2:
-        raise RuntimeError(f"{path.name}: not 2-column numeric data")
-    return data[:, 0], data[:, 1]
-
 def firing_rate_hz(t_ms: np.ndarray, v_mV: np.ndarray) -> float:
     mask = (t_ms >= start_time) & (t_ms <= end_time)
     if not np.any(mask):
@@ -241,7 +240,10 @@ def main():
         rc = rc_from_name(p)
         if rc is None:
             continue
-        t, v = load_trace(p)
+        if p.suffix == SPIKES_SUFFIX:
+            rates[rc] = open_spikes(p).rate_hz(CELL, start_time, end_time)
+            continue
+        t, v = load_trace(p, CELL)
         rates[rc] = firing_rate_hz(t, v)
 
     Z = np.full((len(rod_vals_display), len(cone_vals)), np.nan, float)
@@ -4,6 +4,7 @@ TITLE HH k channel channel
 
 NEURON {
 	SUFFIX A
+	THREADSAFE
 	USEION k READ ek WRITE ik
 	RANGE gIAbar, ik
 	GLOBAL minf, hinf, cfunc, h1tau, h2tau
@@ -4,6 +4,7 @@ TITLE HH k channel channel
 
 NEURON {
 	SUFFIX Ik
+	THREADSAFE
 	USEION k READ ek WRITE ik
 	RANGE gIkbar, ik
 	GLOBAL minf
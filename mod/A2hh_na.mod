@@ -4,6 +4,7 @@ TITLE HH sodium channel
 
 NEURON {
 	SUFFIX HHna
+	THREADSAFE
 	USEION na READ ena WRITE ina
 	RANGE gnabar, ina
 	GLOBAL minf, hinf
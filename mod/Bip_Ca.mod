@@ -7,6 +7,7 @@ INDEPENDENT {t FROM 0 TO 1 WITH 1 (ms)}
 
 NEURON {
  SUFFIX cabip
+ THREADSAFE
  USEION ca READ cai, eca, cao WRITE ica
  RANGE gcabar
  RANGE m_inf, tau_m, m_exp
@@ -7,6 +7,7 @@ INDEPENDENT {t FROM 0 TO 1 WITH 1 (ms)}
 
 NEURON {
  SUFFIX kcabip
+ THREADSAFE
  USEION k READ ek WRITE ik
  USEION ca READ cai
  RANGE gkcabar
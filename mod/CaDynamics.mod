@@ -1,5 +1,6 @@
 NEURON {
     SUFFIX CaDynamics
+    THREADSAFE
     USEION ca READ ica WRITE cai   
     RANGE tau_Ca, cai_inf, R_Ca_channel, R_removal, cai
 }
@@ -13,6 +13,7 @@ UNITS {
 
 NEURON {
  SUFFIX CaT
+ THREADSAFE
  USEION ca READ cai,cao WRITE ica
  RANGE gmax, iCaT
 }
@@ -3,6 +3,7 @@
 NEURON 
 {
 	SUFFIX CPRpub
+	THREADSAFE
 	
 	USEION Ca WRITE iCa VALENCE 2
 	USEION Cl WRITE iCl  VALENCE 1
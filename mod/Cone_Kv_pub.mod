@@ -1,8 +1,11 @@
 : Rod Photoreceptor Kv channel
+: infmKv / taumKv / infhKv / tauhKv come from a voltage table (TABLE, 0.1 mV steps); usetable_Kv_conepub = 0 evaluates them directly
 
 NEURON 
 {
 	SUFFIX Kv_conepub
+	THREADSAFE
+	GLOBAL infmKv, taumKv, infhKv, tauhKv
 	
 	USEION Kv WRITE iKv VALENCE 1
 	
@@ -82,7 +85,11 @@ UNITSOFF
 
 FUNCTION alphamKv(v(mV)) (/ms)
 { 
-	alphamKv = (0.001)*5*(100-v)/( exp( (100-v)/42) -1 )
+	if (fabs(100-v) < 1e-6) {
+		alphamKv = 0.21	: limit at v = 100 (0/0)
+	} else {
+		alphamKv = (0.001)*5*(100-v)/( exp( (100-v)/42) -1 )
+	}
 	:alter from orginal settings where it is in the unit of 1/s
 }
 
@@ -109,6 +116,7 @@ UNITSON
 PROCEDURE rate(v (mV))
 {
         LOCAL a, b
+	TABLE infmKv, taumKv, infhKv, tauhKv FROM -100 TO 100 WITH 2000
 
 	
 	a = alphamKv(v)
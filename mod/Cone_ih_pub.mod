@@ -1,8 +1,11 @@
 : Cone Photoreceptor h channel by using kinetics in Barnes' paper
+: infh / tauh come from a voltage table (TABLE, 0.1 mV steps); usetable_h_conepub = 0 evaluates them directly
 
 NEURON 
 {
 	SUFFIX h_conepub
+	THREADSAFE
+	GLOBAL infh, tauh
 	
 	NONSPECIFIC_CURRENT ih
 	
@@ -95,6 +98,7 @@ FUNCTION betah(v(mV)) (/ms)
 PROCEDURE rate(v (mV))
 {
         LOCAL a, b
+	TABLE infh, tauh FROM -100 TO 100 WITH 2000
 
 	
 	a = alphah(v)
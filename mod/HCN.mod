@@ -13,6 +13,7 @@ UNITS {
 
 NEURON {
  SUFFIX HCN
+ THREADSAFE
  NONSPECIFIC_CURRENT ih
  RANGE gmax, iHCN
 }
@@ -0,0 +1,174 @@
+TITLE Fluctuating current (Random123 stream per instance)
+
+COMMENT
+-----------------------------------------------------------------------------
+
+ Same Ornstein-Uhlenbeck current as Ifluct1.mod (exact update rule, Gillespie 1996):
+
+ x(t+dt) = x(t) + (1. - exp(-dt/tau)) * (m - x) + sqrt(1.-exp(-2.*dt/tau)) * s * N(0,1)
+
+ but N(0,1) is drawn from a counter-based Random123 stream owned by the instance instead of
+ the global normrand() generator. Each instance must be given its stream ids with
+
+     noise.noiseFromRandom123(id1, id2, id3)     (e.g. cell type, cell index, trial)
+
+ The stream restarts at sequence 0 on every finitialize, so the realization of each instance
+ depends only on (id1, id2, id3) and not on the number of threads, the rank decomposition,
+ the order in which instances are created, or whether the run is done by CoreNEURON.
+ Without noiseFromRandom123 the instance injects the constant current -m.
+ rng_seq() / set_rng_seq() read and restore the position in the stream (SaveState does not
+ save it), so a run can be continued from a checkpoint.
+
+ The nrnran123 handling (BBCOREPOINTER, bbcore_write / bbcore_read) follows netstim.mod.
+
+-----------------------------------------------------------------------------
+ENDCOMMENT
+
+
+INDEPENDENT {t FROM 0 TO 1 WITH 1 (ms)}
+
+NEURON {
+    THREADSAFE
+    POINT_PROCESS IfluctR123
+    RANGE m, s, tau, x
+    NONSPECIFIC_CURRENT i
+    BBCOREPOINTER rng
+}
+
+UNITS {
+    (nA) = (nanoamp)
+    (mV) = (millivolt)
+}
+
+PARAMETER {
+     dt   (ms)
+     m   = 0. (nA)      : steady-state expected value of the current amplitude
+     s   = 0. (nA)      : square root of the steady-state variance of the current amplitude
+     tau = 2. (ms)      : steady-state correlation time length of the current
+}
+
+ASSIGNED {
+    i     (nA)          : fluctuating current
+    x                   : state variable
+    rng
+}
+
+VERBATIM
+#include "nrnran123.h"
+ENDVERBATIM
+
+INITIAL {
+VERBATIM
+    if (_p_rng) {
+        nrnran123_setseq((nrnran123_State*)_p_rng, 0, 0);
+    }
+ENDVERBATIM
+    x = m               : to reduce the transient, the state is set to its (expected) steady-state
+}
+
+
+BREAKPOINT {
+    SOLVE oup
+    if (tau <= 0) {  x = m + s  * randn() }  : white-noise is impossible to generate anyway..
+    i = - x
+}
+
+
+PROCEDURE oup() {
+if (tau > 0) {  x = x + (1. - exp(-dt/tau)) * (m - x) + sqrt(1.-exp(-2.*dt/tau)) * s  * randn() }
+}
+
+FUNCTION randn() {
+VERBATIM
+    if (_p_rng) {
+        _lrandn = nrnran123_normal((nrnran123_State*)_p_rng);
+    } else {
+        _lrandn = 0.;
+    }
+ENDVERBATIM
+}
+
+PROCEDURE noiseFromRandom123() {   : (id1, id2, id3)
+VERBATIM
+#if !NRNBBCORE
+ {
+    nrnran123_State** pv = (nrnran123_State**)(&_p_rng);
+    if (*pv) {
+        nrnran123_deletestream(*pv);
+        *pv = (nrnran123_State*)0;
+    }
+    *pv = nrnran123_newstream3((uint32_t)*getarg(1), (uint32_t)*getarg(2), (uint32_t)*getarg(3));
+ }
+#endif
+ENDVERBATIM
+}
+
+FUNCTION rng_seq() {
+    : position of the stream (4 * sequence + which), e.g. for a warm-up checkpoint (checkpoint.py)
+VERBATIM
+    _lrng_seq = 0.;
+    if (_p_rng) {
+        uint32_t seq;
+        char which;
+        nrnran123_getseq((nrnran123_State*)_p_rng, &seq, &which);
+        _lrng_seq = 4. * (double)seq + (double)which;
+    }
+ENDVERBATIM
+}
+
+PROCEDURE set_rng_seq(pos) {
+    : restore a position returned by rng_seq()
+VERBATIM
+    if (_p_rng) {
+        double pos = _lpos;
+        nrnran123_setseq((nrnran123_State*)_p_rng, (uint32_t)(pos / 4.), (char)fmod(pos, 4.));
+    }
+ENDVERBATIM
+}
+
+DESTRUCTOR {
+VERBATIM
+    if (_p_rng) {
+        nrnran123_State** pv = (nrnran123_State**)(&_p_rng);
+        nrnran123_deletestream(*pv);
+        *pv = (nrnran123_State*)0;
+    }
+ENDVERBATIM
+}
+
+VERBATIM
+static void bbcore_write(double* xval, int* d, int* xx, int* offset, _threadargsproto_) {
+    if (d) {
+        char which;
+        uint32_t* di = ((uint32_t*)d) + *offset;
+        nrnran123_State** pv = (nrnran123_State**)(&_p_rng);
+        if (!*pv) {
+            fprintf(stderr, "IfluctR123: noiseFromRandom123 was not called\n");
+            assert(0);
+        }
+        nrnran123_getids3(*pv, di, di+1, di+2);
+        nrnran123_getseq(*pv, di+3, &which);
+        di[4] = (int)which;
+#if NRNBBCORE
+        /* CoreNEURON does not call DESTRUCTOR */
+        nrnran123_deletestream(*pv);
+        *pv = (nrnran123_State*)0;
+#endif
+    }
+    *offset += 5;
+}
+
+static void bbcore_read(double* xval, int* d, int* xx, int* offset, _threadargsproto_) {
+    uint32_t* di = ((uint32_t*)d) + *offset;
+    nrnran123_State** pv = (nrnran123_State**)(&_p_rng);
+#if NRNBBCORE
+    assert(!*pv);
+    *pv = nrnran123_newstream3(di[0], di[1], di[2]);
+#else
+    /* called at the end of a CoreNEURON psolve to hand back the sequence position */
+    assert(*pv);
+#endif
+    nrnran123_setseq(*pv, di[3], (char)di[4]);
+    *offset += 5;
+}
+ENDVERBATIM
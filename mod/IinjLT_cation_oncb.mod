@@ -16,6 +16,7 @@ ENDCOMMENT
 
 NEURON {
 	POINT_PROCESS IinjLT_cation_oncb
+	THREADSAFE
 	RANGE del, ton, toff, num, amp,ssI,i
 	ELECTRODE_CURRENT i
 }
@@ -1,5 +1,6 @@
 NEURON {
     POINT_PROCESS Iphoto_rod
+    THREADSAFE
     RANGE Idark, A, t1, t2, t3, b, amp, i
     ELECTRODE_CURRENT i
 }
@@ -0,0 +1,56 @@
+TITLE Photocurrent from a shared, precomputed waveform
+
+COMMENT
+-----------------------------------------------------------------------------
+
+ Electrode current of a photoreceptor whose time course is given from outside:
+
+     i = ss - amp * wave
+
+ wave is the normalized photocurrent of the flash protocol (del, ton, toff, num).
+ The waveform is computed once per protocol by photo_wave() in createcells.hoc,
+ played into a single PhotoWave and passed to every PhotoPlay that shares the
+ protocol with ParallelContext source_var / target_var (photo_transfer() in
+ netconnection_fovea.hoc), so the exponentials are evaluated once per protocol
+ instead of once per cell and step. With the waveforms of photo_wave() the current
+ is the same as
+
+     RPRInput   (ss = 0.04 nA,        amp)
+     IinjLTDim  (ss = 0.001 * ssI nA, amp)
+
+-----------------------------------------------------------------------------
+ENDCOMMENT
+
+
+NEURON {
+    THREADSAFE
+    POINT_PROCESS PhotoPlay
+    RANGE ss, amp, wave, i
+    ELECTRODE_CURRENT i
+}
+
+UNITS {
+    (pA) = (picoamp)
+    (nA) = (nanoamp)
+}
+
+PARAMETER {
+    ss  = 0.04 (nA)     : steady-state current (dark current)
+    amp = 0 (pA)        : amplitude of the light induced current
+}
+
+ASSIGNED {
+    i (nA)
+    wave                : normalized photocurrent (set by ParallelContext.target_var)
+    ampnA (nA)
+}
+
+INITIAL {
+    ampnA = amp * 0.001
+    : the first transfer comes only after the first step (no light in the first step)
+    wave = 0
+}
+
+BREAKPOINT {
+    i = ss - ampnA * wave
+}
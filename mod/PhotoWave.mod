@@ -0,0 +1,22 @@
+TITLE Holder of a shared photocurrent waveform
+
+COMMENT
+-----------------------------------------------------------------------------
+
+ One instance per flash protocol. wave is driven by Vector.play (the waveform of
+ photo_wave() in src/photo_wave.hoc) and passed by ParallelContext.source_var to every
+ PhotoPlay that shares the protocol. The instance itself injects no current.
+
+-----------------------------------------------------------------------------
+ENDCOMMENT
+
+
+NEURON {
+    THREADSAFE
+    POINT_PROCESS PhotoWave
+    RANGE wave
+}
+
+ASSIGNED {
+    wave                : normalized photocurrent
+}
@@ -1,6 +1,7 @@
 :yonemoto simPR.c
 NEURON {
     POINT_PROCESS RPRInput
+    THREADSAFE
     :SUFFIX RPRInput
     RANGE del, amp, i, v, ton, toff , N, num      
     ELECTRODE_CURRENT i    
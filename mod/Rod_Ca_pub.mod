@@ -1,9 +1,12 @@
 : Rod  Photoreceptor Ca and Calcium  channel
 : Ref. Kourenny and  Liu 2002   ABME 30 : 1196-1203
 : Modification 2004-02-07
+: no rate table: the rates depend on the per-section parameters aomCa ... SCah (RANGE)
 NEURON 
 {
 	SUFFIX Capub
+	THREADSAFE
+	GLOBAL infmCa, taumCa, infhCa, tauhCa
 	
 	USEION Ca WRITE iCa VALENCE 2
         RANGE gCabar,VhalfCam,SCam
@@ -40,6 +40,7 @@ INDEPENDENT {t FROM 0 TO 1 WITH 1 (ms)}
 
 NEURON {
 	SUFFIX Cadpub
+	THREADSAFE
 	USEION Ca READ iCa, Cai WRITE Cai,Cao VALENCE 2	
         RANGE Ca, depth, Cainf, taur, entryF
 }
@@ -1,6 +1,7 @@
 :Yonemoto /* Cl channel */
 NEURON {
     SUFFIX IClyone
+    THREADSAFE
     USEION ca READ cai          
     USEION cl WRITE icl :CHARGE -1
     RANGE gCl, ECl, icl        
@@ -3,6 +3,7 @@
 NEURON 
 {
 	SUFFIX Clcapub
+	THREADSAFE
 		
 	USEION Ca READ Cai VALENCE 2
 	
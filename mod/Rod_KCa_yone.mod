@@ -1,6 +1,7 @@
 :Yonemoto /* Kca channel*/
 NEURON {
     SUFFIX IKCayone
+    THREADSAFE
     USEION ca READ cai           
     USEION k WRITE ik            
     RANGE gKca, EKca, ik         
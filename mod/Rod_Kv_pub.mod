@@ -1,9 +1,12 @@
 : Rod Photoreceptor Kv channel
 :modified 2004-02-05 in obersavation of mixed up of Kx and Kv in Kamiyama's 1996 paper
 :based on HH 1952 paper and Koch book
+:infmKv / taumKv come from a voltage table (TABLE, 0.1 mV steps); usetable_Kvpub = 0 evaluates them directly
 NEURON 
 {
 	SUFFIX Kvpub
+	THREADSAFE
+	GLOBAL infmKv, taumKv
 	
 	USEION Kv WRITE iKv VALENCE 1
 		
@@ -76,7 +79,11 @@ UNITSOFF
 
 FUNCTION alphamKv(v(mV)) (/ms)
 { 
-	alphamKv = 0.005*(20-v)/( exp( (20-v)/22) -1 )
+	if (fabs(20-v) < 1e-6) {
+		alphamKv = 0.11	: limit at v = 20 (0/0)
+	} else {
+		alphamKv = 0.005*(20-v)/( exp( (20-v)/22) -1 )
+	}
  :modified from 10
 }
 
@@ -93,6 +100,7 @@ UNITSON
 PROCEDURE rate(v (mV))
 {
         LOCAL am, bm
+	TABLE infmKv, taumKv FROM -100 TO 100 WITH 2000
 
 	
 	am = alphamKv(v)
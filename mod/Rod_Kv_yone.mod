@@ -1,6 +1,7 @@
 :Yonemoto /* Kv channel */
 NEURON {
     SUFFIX IKvyone
+    THREADSAFE
     USEION k WRITE ik     : Uses potassium ion and writes potassium current
     RANGE gKv, EKv, ik            : Parameters for maximum conductance, reversal potential, and current
     RANGE mKv, m_inf, tau_m       : Activation variable, steady-state value, and time constant for m
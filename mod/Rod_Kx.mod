@@ -2,6 +2,7 @@ INDEPENDENT {t FROM 0 TO 1 WITH 1 (ms)}
 
 NEURON {
     SUFFIX ikxrod
+    THREADSAFE
     USEION k READ ek WRITE ik
     :NONSPECIFIC_CURRENT ikx
     RANGE gkxbar
@@ -3,6 +3,7 @@
 NEURON 
 {
 	SUFFIX Kxpub
+	THREADSAFE
 	
 	USEION Kx WRITE iKx VALENCE 1
 	
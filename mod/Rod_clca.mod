@@ -1,5 +1,6 @@
 NEURON {
     SUFFIX Cl_Ca
+    THREADSAFE
     USEION ca READ cai       : Reads intracellular calcium concentration [Ca2+]i
     USEION cl WRITE icl CHARGE -1     : Outputs chloride current icl
     RANGE gClCa_max, eClCa, iClCa
@@ -1,8 +1,11 @@
 : Rod PhotoReceptor h channel
+: no rate table: the rates depend on the per-section parameters Vhalfh, Sh, aoh (RANGE)
 
 NEURON 
 {
 	SUFFIX hpub
+	THREADSAFE
+	GLOBAL infh, tauh
 	
 	
 	NONSPECIFIC_CURRENT ih
@@ -1,5 +1,6 @@
 NEURON {
     SUFFIX KCa
+    THREADSAFE
     USEION ca READ cai       
     USEION k WRITE ik        : Kalium current
     RANGE gKCa_max, eKCa, iKCa
@@ -1,6 +1,7 @@
 :yonemoto /* Kx channel */
 NEURON {
     SUFFIX IKxyone
+    THREADSAFE
     USEION k READ ek WRITE ik        : Uses potassium ion and writes potassium current
     RANGE gKx, EKx, ik               : Parameters for maximum conductance, reversal potential, and current
     RANGE nKx, n_inf, tau_n          : Activation variable, steady-state value, and time constant for nKx
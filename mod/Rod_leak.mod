@@ -1,5 +1,6 @@
 NEURON {
     SUFFIX leak
+    THREADSAFE
     NONSPECIFIC_CURRENT i         : leak current
     RANGE g_leak, e_leak, i       
 }
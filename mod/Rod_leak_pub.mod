@@ -3,6 +3,7 @@
 NEURON 
 {
 	SUFFIX Leakpub
+	THREADSAFE
 	
 
 	
@@ -1,5 +1,6 @@
 NEURON {
     SUFFIX ILeakyone
+    THREADSAFE
     NONSPECIFIC_CURRENT il         : Defines a non-specific leak current
     RANGE glbar, El             : Parameters for conductance, reversal potential, and current
 }
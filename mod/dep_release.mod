@@ -0,0 +1,66 @@
+: presynaptic part of depsyn (three-state depressing release for graded potentials)
+: integrated once per presynaptic cell and synapse family; the postsynaptic conductance is a RibbonPost
+: (e = -70, g_max = weight * g_max of depsyn) that receives eff via ParallelContext source_var / target_var
+: (parallel_net.py, where the presynaptic cell may be on another rank and depsyn's POINTER v_pre cannot be set)
+: place at the same location depsyn used as v_pre (e.g. AIIAC[j].soma(1))
+: exact = 1: exponential update (each state relaxes exactly toward its target with the other states held at
+:                      the start of the step; stable for any dt), exact = 0 (default): forward Euler (previous SOLVE METHOD euler)
+
+NEURON {
+    POINT_PROCESS DepRelease
+    THREADSAFE
+    RANGE tau_e, tau_r, v_th, v_slp, s, u
+    GLOBAL exact
+}
+
+PARAMETER {
+    dt (ms)
+    tau_e = 2.7 (ms)
+    tau_r = 800 (ms)
+    v_slp = 20.0 (millvolts)
+    v_th = -40.0 (millvolts)
+    u = 0.4
+    exact = 0
+}
+
+ASSIGNED {
+    v (millivolt)
+    s
+}
+
+STATE {
+    eff rec
+}
+
+BREAKPOINT {
+    SOLVE states
+}
+
+INITIAL {
+    eff = 0.01
+    rec = 1.0
+}
+
+PROCEDURE states() { LOCAL deff, drec
+    s = (1.0+tanh((v - v_th)/v_slp))/2.0
+    if (exact) {
+        : x' = c - k*x with c, k taken at the start of the step
+        drec = (1.0-eff)/tau_r
+        eff = relax(eff, u*s*rec, 1/tau_e)
+        rec = relax(rec, drec, 1/tau_r + u*s)
+    } else {
+        deff = -eff/tau_e + u*s*rec
+        drec = (1.0-rec-eff)/tau_r - u*s*rec
+        eff = eff + dt*deff
+        rec = rec + dt*drec
+    }
+}
+
+FUNCTION relax(x, c, k) {
+    : one step of x' = c - k*x with c and k constant over the step
+    if (fabs(k*dt) < 1e-6) {
+        relax = x + dt*(c - k*x)
+    } else {
+        relax = x + (c - k*x)*(1 - exp(-k*dt))/k
+    }
+}
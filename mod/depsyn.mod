@@ -1,13 +1,19 @@
 : three-state depressing synapse model for graded membrane potential
+: weight: number of identical contacts this instance stands for (i = weight * g * (v - e))
+: exact = 1: exponential update (each state relaxes exactly toward its target with the other states held at
+:                      the start of the step; stable for any dt), exact = 0 (default): forward Euler (previous SOLVE METHOD euler)
 
 NEURON {
     POINT_PROCESS depsyn
+    THREADSAFE
     POINTER v_pre
-    RANGE e, tau_e, tau_r, v_th, v_slp, s, g_max, u
+    RANGE e, tau_e, tau_r, v_th, v_slp, s, g_max, u, weight
+    GLOBAL exact
     NONSPECIFIC_CURRENT i
 }
 
 PARAMETER {
+    dt (ms)
     tau_e = 2.7 (ms)
     tau_r = 800 (ms)
     e = -70 (millvolts)
@@ -15,6 +21,8 @@ PARAMETER {
     v_slp = 20.0 (millvolts) :10
     v_th = -40.0 (millvolts) :-40
     u = 0.4 :0.005
+    weight = 1
+    exact = 0
 }
 
 ASSIGNED {
@@ -30,9 +38,9 @@ STATE {
 }
 
 BREAKPOINT {
-    SOLVE states METHOD euler
+    SOLVE states
     g = g_max * eff
-    i = g * (v - e)
+    i = weight * g * (v - e)
 }
 
 INITIAL {
@@ -40,8 +48,26 @@ INITIAL {
     rec = 1.0
 }
 
-DERIVATIVE states {
+PROCEDURE states() { LOCAL deff, drec
     s = (1.0+tanh((v_pre - v_th)/v_slp))/2.0
-    eff' = -eff/tau_e + u*s*rec
-    rec' = (1.0-rec-eff)/tau_r - u*s*rec
+    if (exact) {
+        : x' = c - k*x with c, k taken at the start of the step
+        drec = (1.0-eff)/tau_r
+        eff = relax(eff, u*s*rec, 1/tau_e)
+        rec = relax(rec, drec, 1/tau_r + u*s)
+    } else {
+        deff = -eff/tau_e + u*s*rec
+        drec = (1.0-rec-eff)/tau_r - u*s*rec
+        eff = eff + dt*deff
+        rec = rec + dt*drec
+    }
+}
+
+FUNCTION relax(x, c, k) {
+    : one step of x' = c - k*x with c and k constant over the step
+    if (fabs(k*dt) < 1e-6) {
+        relax = x + dt*(c - k*x)
+    } else {
+        relax = x + (c - k*x)*(1 - exp(-k*dt))/k
+    }
 }
@@ -1,5 +1,6 @@
 NEURON {
     POINT_PROCESS Gap
+    THREADSAFE
     POINTER vgap
     RANGE g, i
     NONSPECIFIC_CURRENT i
@@ -0,0 +1,24 @@
+: one side of a gap junction whose partner voltage arrives by ParallelContext.target_var
+: (same current as Gap, i = (v - vgap)*g; vgap is a RANGE variable instead of a POINTER so that the
+:  partner can live on another rank. Used by parallel_net.py)
+
+NEURON {
+    POINT_PROCESS GapVar
+    THREADSAFE
+    RANGE g, i, vgap
+    NONSPECIFIC_CURRENT i
+}
+
+PARAMETER {
+    g = 1.0 (microsiemens)
+}
+
+ASSIGNED {
+    v (millivolt)
+    vgap (millivolt)
+    i (nanoamp)
+}
+
+BREAKPOINT {
+    i = (v - vgap)*g
+}
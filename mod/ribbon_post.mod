@@ -0,0 +1,35 @@
+: postsynaptic conductance driven by a shared RibbonRelease / RibbonRelease_R2RB
+: g = g_max * w_pre (w_pre is set by ParallelContext.target_var from the w of the presynaptic release;
+: the transfer happens before the release states are advanced, so w_pre lags w by one time step)
+
+NEURON {
+    POINT_PROCESS RibbonPost
+    THREADSAFE
+    RANGE e, g_max, g, isyn, w_pre
+    NONSPECIFIC_CURRENT i
+}
+
+PARAMETER {
+    e = 0 (millivolts)
+    g_max = 0.00256 (umho)  : maximal conductance
+}
+
+ASSIGNED {
+    v (millivolt)
+    w_pre
+    i (nanoamp)
+    isyn (nanoamp)
+    g
+}
+
+INITIAL {
+    : the releases start at w = 0. Clear the value left by the previous run
+    : (the first transfer comes only after the first step)
+    w_pre = 0
+}
+
+BREAKPOINT {
+    g = g_max * w_pre
+    isyn = g * (v - e)
+    i = isyn
+}
@@ -0,0 +1,83 @@
+: presynaptic part of ribbon_syn (four-state depressing release for graded potentials)
+: integrated once per presynaptic cell; the postsynaptic conductances (RibbonPost) receive w via ParallelContext source_var / target_var
+: place at the same location the ribbon_syn instances used as v_pre (e.g. RBC[j].soma(1))
+: exact = 1: exponential update (each state relaxes exactly toward its target with the other states held at
+:                      the start of the step; stable for any dt), exact = 0 (default): forward Euler (previous SOLVE METHOD euler)
+
+NEURON {
+    POINT_PROCESS RibbonRelease
+    THREADSAFE
+    RANGE tau_1A, tau_A3, tau_32, tau_21
+    RANGE v_th, v_slp, acm
+    RANGE u, alpha, beta, P1max, P2max
+    GLOBAL exact
+}
+
+PARAMETER {
+    dt (ms)
+    tau_1A = 2.0 (ms)
+    tau_A3 = 10000 (ms)
+    tau_32 = 2000 (ms)
+    tau_21 = 700 (ms)
+    P1max = 0.01
+    P2max = 0.04
+    v_slp = 10.0 (millivolts)
+    v_th = -40.0 (millivolts)
+    alpha = 1.0 (1/ms)
+    beta = 1.1 (1/ms)
+    exact = 0
+}
+
+ASSIGNED {
+    v (millivolt)
+    u
+    acm
+}
+
+STATE {
+    act p1 p2 w
+}
+
+BREAKPOINT {
+    SOLVE states
+}
+
+INITIAL {
+    act = 0.047
+    p1 = 0.447
+    p2 = 0.7
+    w = 0.0
+}
+
+PROCEDURE states() { LOCAL dact, dp2, dp1, dw, c2, c1
+    u = (1.0 + tanh((v - v_th)/v_slp))/2.0
+    if (exact) {
+        : x' = c - k*x with c, k taken at the start of the step
+        c2 = (1-P1max*p1-P2max*p2-act)/tau_32
+        c1 = p2/tau_21
+        acm = acm + alpha*u*p1
+        act = relax(act, P1max*u*p1/tau_1A, 1/tau_A3)
+        p2 = relax(p2, c2, c2 + (1-p1)*P1max/P2max/tau_21)
+        w = relax(w, alpha*u*p1, beta)
+        p1 = relax(p1, c1, c1 + u/tau_1A)
+    } else {
+        dact = P1max*u*p1/tau_1A - act/tau_A3
+        dp2 = (1-P1max*p1-P2max*p2-act)*(1-p2)/tau_32 - p2*(1-p1)*P1max/P2max/tau_21
+        dp1 = p2*(1-p1)/tau_21 - u*p1/tau_1A
+        dw = alpha*u*p1 -beta*w
+        acm = acm + alpha*u*p1
+        act = act + dt*dact
+        p2 = p2 + dt*dp2
+        p1 = p1 + dt*dp1
+        w = w + dt*dw
+    }
+}
+
+FUNCTION relax(x, c, k) {
+    : one step of x' = c - k*x with c and k constant over the step
+    if (fabs(k*dt) < 1e-6) {
+        relax = x + dt*(c - k*x)
+    } else {
+        relax = x + (c - k*x)*(1 - exp(-k*dt))/k
+    }
+}
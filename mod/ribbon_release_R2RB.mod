@@ -0,0 +1,90 @@
+: presynaptic part of ribbon_syn_R2RB (release is driven by 1-u: sign-inverting rod -> RBC synapse)
+: integrated once per rod; the postsynaptic conductances (RibbonPost) receive w via ParallelContext source_var / target_var
+: exact = 1: exponential update (each state relaxes exactly toward its target with the other states held at
+:                      the start of the step; stable for any dt), exact = 0 (default): forward Euler (previous SOLVE METHOD euler)
+
+NEURON {
+    POINT_PROCESS RibbonRelease_R2RB
+    THREADSAFE
+    RANGE tau_1A, tau_A3, tau_32, tau_21
+    RANGE v_th, v_slp, acm
+    RANGE u, alpha, beta, P1max, P2max
+    GLOBAL exact
+}
+
+PARAMETER {
+    dt (ms)
+    tau_1A = 2.0 (ms)
+    tau_A3 = 10000 (ms)
+    tau_32 = 2000  (ms)
+    tau_21 = 700   (ms)
+
+    P1max  = 0.01
+    P2max  = 0.04
+
+    v_slp = 10.0 (millvolts)
+    v_th  = -40.0 (millvolts)
+
+    alpha = 1.0 (1/ms)
+    beta  = 1.1 (1/ms)
+    exact = 0
+}
+
+ASSIGNED {
+    v (millivolts)
+    u
+    acm
+}
+
+STATE {
+    act
+    p1
+    p2
+    w
+}
+
+INITIAL {
+    act = 0.0
+    p1  = 0.015
+    p2  = 0.58
+    w   = 0.0
+    acm = 0
+}
+
+BREAKPOINT {
+    SOLVE states
+}
+
+PROCEDURE states() { LOCAL dact, dp2, dp1, dw, c2, c1
+    u = (1.0 + tanh((v - v_th)/v_slp)) / 2.0
+    if (exact) {
+        : x' = c - k*x with c, k taken at the start of the step
+        c2 = (1-P1max*p1-P2max*p2-act)/tau_32
+        c1 = p2/tau_21
+        acm = acm + alpha*(1-u)*p1
+        act = relax(act, P1max*u*p1/tau_1A, 1/tau_A3)
+        p2 = relax(p2, c2, c2 + (1-p1)*P1max/P2max/tau_21)
+        w = relax(w, alpha*(1-u)*p1, beta)
+        p1 = relax(p1, c1, c1 + u/tau_1A)
+    } else {
+        dact = P1max*u*p1/tau_1A - act/tau_A3
+        dp2 = (1-P1max*p1-P2max*p2-act)*(1-p2)/tau_32 - p2*(1-p1)*P1max/P2max/tau_21
+        dp1 = p2*(1-p1)/tau_21 - u*p1/tau_1A
+
+        dw = alpha*(1-u)*p1 - beta*w
+        acm = acm + alpha*(1-u)*p1
+        act = act + dt*dact
+        p2 = p2 + dt*dp2
+        p1 = p1 + dt*dp1
+        w = w + dt*dw
+    }
+}
+
+FUNCTION relax(x, c, k) {
+    : one step of x' = c - k*x with c and k constant over the step
+    if (fabs(k*dt) < 1e-6) {
+        relax = x + dt*(c - k*x)
+    } else {
+        relax = x + (c - k*x)*(1 - exp(-k*dt))/k
+    }
+}
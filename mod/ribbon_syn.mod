@@ -1,15 +1,20 @@
 : four-state depressing synapse model for graded membrane potential
+: exact = 1: exponential update; each state relaxes exactly toward its target with the other states held at
+:                      the start of the step (stable for any dt), exact = 0 (default): forward Euler (previous SOLVE METHOD euler)
 
 NEURON {
     POINT_PROCESS ribbon_syn
+    THREADSAFE
     POINTER v_pre
     RANGE e, tau_1A, tau_A3, tau_32, tau_21
     RANGE v_th, v_slp, ca, acm
     RANGE g_max, u, isyn, alpha, beta
+    GLOBAL exact
     NONSPECIFIC_CURRENT i
 }
 
 PARAMETER {
+    dt (ms)
     tau_1A = 2.0 (ms)
 :    tau_AI = 10.0 (ms)
 :    tau_I3 = 10000 (ms) :added
@@ -24,6 +29,7 @@ PARAMETER {
     v_th = -40.0 (millvolts) :-40
     alpha = 1.0 (1/ms)
     beta = 1.1 (1/ms)
+    exact = 0
 }
 
 ASSIGNED {
@@ -42,7 +48,7 @@ STATE {
 }
 
 BREAKPOINT {
-    SOLVE states METHOD euler
+    SOLVE states
 :    g = g_max * u*p1
     g = g_max * w
     isyn = g * (v - e)
@@ -57,21 +63,45 @@ INITIAL {
 :    P3 = 0.9
 }
 
-DERIVATIVE states {
+PROCEDURE states() { LOCAL dact, dp2, dp1, dw, c2, c1
     u = (1.0 + tanh((v_pre - v_th)/v_slp))/2.0
     :ca = 0.038/(exp(-(v_pre-(-34))/6) + exp((v_pre-(23))/40))
     :u = ca*ca*ca/(ca*ca*ca + 0.087*0.087*0.087)
 
-    act' = P1max*u*p1/tau_1A - act/tau_A3
+    if (exact) {
+        : x' = c - k*x with c, k taken at the start of the step
+        c2 = (1-P1max*p1-P2max*p2-act)/tau_32
+        c1 = p2/tau_21
+        acm = acm + alpha*u*p1
+        act = relax(act, P1max*u*p1/tau_1A, 1/tau_A3)
+        p2 = relax(p2, c2, c2 + (1-p1)*P1max/P2max/tau_21)
+        w = relax(w, alpha*u*p1, beta)
+        p1 = relax(p1, c1, c1 + u/tau_1A)
+    } else {
+        dact = P1max*u*p1/tau_1A - act/tau_A3
 :    act' = P1max*u*p1/tau_1A - act/tau_AI
 :    inact' = act/tau_AI - inact/tau_I3
 
 :    P3' = act/tau_A3 - P3*(1-p2)*P2max/tau_32  
 :    p2' = P3*(1-p2)/tau_32 - p2*(1-p1)*P1max/P2max/tau_21
 
-    p2' = (1-P1max*p1-P2max*p2-act)*(1-p2)/tau_32 - p2*(1-p1)*P1max/P2max/tau_21
-    p1' = p2*(1-p1)/tau_21 - u*p1/tau_1A
+        dp2 = (1-P1max*p1-P2max*p2-act)*(1-p2)/tau_32 - p2*(1-p1)*P1max/P2max/tau_21
+        dp1 = p2*(1-p1)/tau_21 - u*p1/tau_1A
 
-    w' = alpha*u*p1 -beta*w
-    acm = acm + alpha*u*p1
-}
\ No newline at end of file
+        dw = alpha*u*p1 -beta*w
+        acm = acm + alpha*u*p1
+        act = act + dt*dact
+        p2 = p2 + dt*dp2
+        p1 = p1 + dt*dp1
+        w = w + dt*dw
+    }
+}
+
+FUNCTION relax(x, c, k) {
+    : one step of x' = c - k*x with c and k constant over the step
+    if (fabs(k*dt) < 1e-6) {
+        relax = x + dt*(c - k*x)
+    } else {
+        relax = x + (c - k*x)*(1 - exp(-k*dt))/k
+    }
+}
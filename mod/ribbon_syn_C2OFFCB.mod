@@ -2,6 +2,7 @@
 
 NEURON {
     POINT_PROCESS ribbon_syn_C2OFFCB
+    THREADSAFE
     POINTER v_pre
     RANGE e, tau_1A, tau_A3, tau_32, tau_21
     RANGE v_th, v_slp, ca, acm
@@ -1,14 +1,21 @@
+: four-state depressing synapse driven by 1-u (sign-inverting rod / cone -> ON bipolar)
+: exact = 1: exponential update (each state relaxes exactly toward its target with the other states held at
+:                      the start of the step; stable for any dt), exact = 0 (default): forward Euler (previous SOLVE METHOD euler)
+
 NEURON {
     POINT_PROCESS ribbon_syn_R2RB
+    THREADSAFE
     POINTER v_pre
     RANGE e, tau_1A, tau_A3, tau_32, tau_21
     RANGE v_th, v_slp, ca, acm
     RANGE g_max, u, isyn, alpha, beta
     RANGE P1max, P2max, i_on_threshold
+    GLOBAL exact
     NONSPECIFIC_CURRENT i
 }
 
 PARAMETER {
+    dt (ms)
     tau_1A = 2.0 (ms)
     tau_A3 = 10000 (ms)
     tau_32 = 2000  (ms)
@@ -25,6 +32,7 @@ PARAMETER {
 
     alpha = 1.0 (1/ms)
     beta  = 1.1 (1/ms)
+    exact = 0
  
     :i_on_threshold = -0.01 (nA)
 }
@@ -57,7 +65,7 @@ INITIAL {
 }
 
 BREAKPOINT {
-    SOLVE states METHOD euler
+    SOLVE states
 
     : compute conductance and current
     g    = g_max * w
@@ -65,14 +73,29 @@ BREAKPOINT {
     i    = isyn
 }
 
-DERIVATIVE states {
+PROCEDURE states() { LOCAL dact, dp2, dp1, dw, c2, c1
     u = (1.0 + tanh((v_pre - v_th)/v_slp)) / 2.0
-    act' = P1max*u*p1/tau_1A - act/tau_A3
-    p2' = (1-P1max*p1-P2max*p2-act)*(1-p2)/tau_32 - p2*(1-p1)*P1max/P2max/tau_21
-    p1' = p2*(1-p1)/tau_21 - u*p1/tau_1A
-
-    w' = alpha*(1-u)*p1 - beta*w
-    acm = acm + alpha*(1-u)*p1
+    if (exact) {
+        : x' = c - k*x with c, k taken at the start of the step
+        c2 = (1-P1max*p1-P2max*p2-act)/tau_32
+        c1 = p2/tau_21
+        acm = acm + alpha*(1-u)*p1
+        act = relax(act, P1max*u*p1/tau_1A, 1/tau_A3)
+        p2 = relax(p2, c2, c2 + (1-p1)*P1max/P2max/tau_21)
+        w = relax(w, alpha*(1-u)*p1, beta)
+        p1 = relax(p1, c1, c1 + u/tau_1A)
+    } else {
+        dact = P1max*u*p1/tau_1A - act/tau_A3
+        dp2 = (1-P1max*p1-P2max*p2-act)*(1-p2)/tau_32 - p2*(1-p1)*P1max/P2max/tau_21
+        dp1 = p2*(1-p1)/tau_21 - u*p1/tau_1A
+
+        dw = alpha*(1-u)*p1 - beta*w
+        acm = acm + alpha*(1-u)*p1
+        act = act + dt*dact
+        p2 = p2 + dt*dp2
+        p1 = p1 + dt*dp1
+        w = w + dt*dw
+    }
 
     :act' = P1max*u*p1/tau_1A - act/tau_A3
 
@@ -83,4 +106,13 @@ DERIVATIVE states {
     :w' =  alpha * (1 - w) - beta * (1-u) * p1 * w
 
     :acm = acm + alpha * (1-u) * p1 * w
-}
\ No newline at end of file
+}
+
+FUNCTION relax(x, c, k) {
+    : one step of x' = c - k*x with c and k constant over the step
+    if (fabs(k*dt) < 1e-6) {
+        relax = x + dt*(c - k*x)
+    } else {
+        relax = x + (c - k*x)*(1 - exp(-k*dt))/k
+    }
+}
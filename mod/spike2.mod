@@ -4,12 +4,15 @@ TITLE HH style channels for spiking retinal ganglion cells
 : by TJ Velte March 17, 1995
 : must be used with calcium pump mechanism, i.e. capump.mod
 :
+: rates (and the dt-dependent factors *_exp) come from voltage tables (TABLE, 0.1 mV steps);
+: usetable_spike2 = 0 evaluates them directly
 :
 
 INDEPENDENT {t FROM 0 TO 1 WITH 1 (ms)}
 
 NEURON {
 	SUFFIX spike2
+	THREADSAFE
 	USEION na READ ena WRITE ina
 	USEION k READ ek WRITE ik
 	USEION ca READ cai, eca, cao WRITE ica
@@ -106,8 +109,13 @@ PROCEDURE states() {	: exact when v held constant
 
 UNITSOFF
 PROCEDURE evaluate_fct_ca(v(mV)) { LOCAL a,b
+	TABLE c_inf, tau_c, c_exp DEPEND dt FROM -100 TO 100 WITH 2000
 :CA channel
-	a = (-1.362 * (v+13)) / (exp(-0.1*(v+13)) - 1)
+	if (fabs(v+13) < 1e-6) {
+		a = 13.62	: limit at v = -13 (0/0)
+	} else {
+		a = (-1.362 * (v+13)) / (exp(-0.1*(v+13)) - 1)
+	}
 	b = 45.41 * exp(-1*(v + 38)/18)
 	tau_c = 1 / (a + b)
 	c_inf = a * tau_c
@@ -115,10 +123,15 @@ PROCEDURE evaluate_fct_ca(v(mV)) { LOCAL a,b
 
 }
 PROCEDURE evaluate_fct_nak(v(mV)) { LOCAL a,b
+	TABLE m_inf, tau_m, m_exp, h_inf, tau_h, h_exp, n_inf, tau_n, n_exp DEPEND dt FROM -100 TO 100 WITH 2000
 	
 :NA m
 	:a = (-2.725 * (v+13)) / (exp(-0.1*(v+35)) - 1)
-	a = (-2.725 * (v+35)) / (exp(-0.1*(v+35)) - 1)
+	if (fabs(v+35) < 1e-6) {
+		a = 27.25	: limit at v = -35 (0/0)
+	} else {
+		a = (-2.725 * (v+35)) / (exp(-0.1*(v+35)) - 1)
+	}
 	b = 90.83 * exp(-1*(v+60)/18)
 	tau_m = 1 / (a + b)
 	m_inf = a * tau_m
@@ -132,7 +145,11 @@ PROCEDURE evaluate_fct_nak(v(mV)) { LOCAL a,b
 	h_exp = 1 - exp(-dt/tau_h)
 
 :K n (non-inactivating, delayed rectifier)
-	a = (-0.09575 * (v+37)) / (exp(-0.1*(v+37)) - 1)
+	if (fabs(v+37) < 1e-6) {
+		a = 0.9575	: limit at v = -37 (0/0)
+	} else {
+		a = (-0.09575 * (v+37)) / (exp(-0.1*(v+37)) - 1)
+	}
 	b = 1.915 * exp(-1*(v + 47)/80)
 	tau_n = 1 / (a + b)
 	n_inf = a * tau_n
@@ -0,0 +1,43 @@
+: hysteresis spike detector (same rule as the thr_hi / thr_lo loops in the analysis scripts)
+: a spike is emitted (net_event) when v crosses thr_hi upward while armed;
+: the detector re-arms after v falls below thr_lo. Record the events with
+: NetCon(detector, nil) + ParallelContext.spike_record (works with CoreNEURON).
+
+NEURON {
+    POINT_PROCESS SpikeHyst
+    THREADSAFE
+    RANGE thr_hi, thr_lo, t_arm, armed
+}
+
+PARAMETER {
+    thr_hi = 0 (millivolt)      : upward crossing -> spike
+    thr_lo = -20 (millivolt)    : re-arm below this value
+    t_arm = 0 (ms)              : force re-arm at this time (start of the analysis window)
+}
+
+ASSIGNED {
+    v (millivolt)
+    armed
+}
+
+INITIAL {
+    armed = 1
+    net_send(0, 1)
+    if (t_arm > 0) {
+        net_send(t_arm, 3)
+    }
+}
+
+NET_RECEIVE(w) {
+    if (flag == 1) {
+        WATCH (v > thr_hi) 2
+        WATCH (v < thr_lo) 3
+    } else if (flag == 2) {
+        if (armed == 1) {
+            net_event(t)
+            armed = 0
+        }
+    } else if (flag == 3) {
+        armed = 1
+    }
+}
@@ -2,6 +2,7 @@
 
 NEURON {
 POINT_PROCESS gradsyn_bip_gan
+THREADSAFE
 POINTER v_pre
 RANGE e, tau, s_inf, V_thr, V_slope, g_max
 NONSPECIFIC_CURRENT i
@@ -0,0 +1,328 @@
+"""
+偏心度とパッチの大きさから、密度モデルで細胞の配置（モザイク）を作り、近い細胞どうしをつないだ結合の表を作るモジュール。
+
+処理:
+- 網膜上の偏心度 ecc_mm を中心（(ecc_mm, 0)、中心窩が原点）にした一辺 size_um の正方形に、細胞種ごとの密度
+  （Lee らの diff_exp。check_density_scaling_rods_gc_aii.py / python/gc_rf_cell_counts_kdtree.py と同じ係数）で
+  細胞を置く
+    細胞数 = 密度のパッチ内の積分 × 細胞種ごとの倍率（偏心度 1 mm・既定の大きさのパッチで parameters_new.hoc の
+             細胞数（REFERENCE_COUNTS）になる倍率。モデルの細胞は間引いた代表なので、偏心度による密度の変化だけを使う）
+    位置   = 密度に比例した棄却法（seed で再現できる）。細胞の番号はパッチの中心に近い順
+             （生き残る Cone（番号 < Num_C_RP）は中心の Cone になる）
+- 結合は cKDTree の近傍探索で作る（O(N log N)）。種類・向き・g は connectivity.FAMILIES と同じ
+    前細胞 → 後細胞: 後細胞ごとに近い順に k 個の前細胞（R_C_GJ は Cone ごとに近い Rod を k 個）
+    同じ細胞種どうし: 各細胞の近い k 個との組（i < j。どちらかが相手の k 個に入っていればつなぐ）
+  k の既定値は netconnection_fovea.hoc の結合の偏心度 1 mm・既定の細胞数での平均の本数（WIRING_K）。
+  既定ではパッチを周期境界にする（端の細胞も中心と同じ本数になる）
+- 位置（µm）と結合の番号を np.savez_compressed で1ファイルに保存する（.npz。細胞数・偏心度などは meta に JSON で）
+  g は入れない（読み込んだときのパラメータで connectivity.table_connections() が入れる）
+
+使い方:
+    python mosaic.py --ecc 5 -o patch_5mm.npz                     # 偏心度 5 mm・既定の大きさ（約 78 µm 四方）
+    python mosaic.py --ecc 12 --size 200 --seed 3 -o patch_12mm.npz
+    python mosaic.py --ecc 1 --k R2RB=100 --open -o patch_1mm.npz  # Rod -> RBC を 100 本、周期境界なし
+
+    patch = generate(5.0)
+    patch.save("patch_5mm.npz")
+    net = Network(table="patch_5mm.npz")
+    net = ParallelNetwork(table="patch_5mm.npz")
+
+補足:
+- NEURON を使わないので、どのプロセスでも同じ表を作れる（numpy と scipy だけを使う）
+- AIIAC の密度は偏心度 0.3 mm 付近で負になるので 0 にする。密度が 0 の細胞種が1つでもあると回路にならないので、
+  偏心度 1–15 mm で使うこと
+- 結合の本数（k）は偏心度によらず一定（樹状突起の広がりは前細胞の密度に合わせて変わる）。変えるときは k で指定する
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from connectivity import FAMILIES, POPULATIONS, Family, fovea_edges, table_connections
+
+# 密度モデル（細胞数/mm²、偏心度 mm）の係数（diff_exp）
+DENSITY_PARAMS = {
+    "Rod":          (5.855e5, -1.388e-1, -5.989e5, -2.998e-1),
+    "Cone":         (3.673e5, -7.828e0,  -2.000e5, -2.000e3,  2.034e4, -2.164e-1),
+    "ONBC":         (1.788e5, -4.755e-1, -1.836e5, -5.618e-1, 8.894e3, -1.832e-2),
+    "OFFMBC":       (4.208e5, -1.225e0,  -4.551e5, -1.387e0,  1.230e4, -6.986e-2),
+    "AIIAC":        (1.297e5, -1.114e0,  -1.392e5, -1.217e0,  2.553e3, -7.214e-2),
+    "Ganglion_Lee": (8.475e5, -1.258e-1, -8.691e5, -1.556e0),
+}
+# 細胞種 → 密度モデル（RBC は Rod の密度に比例させる）
+POP_DENSITY = {
+    "Rods":    "Rod",
+    "Cones":   "Cone",
+    "R_BC":    "Rod",
+    "ON_CBC":  "ONBC",
+    "OFF_CBC": "OFFMBC",
+    "AIIAC":   "AIIAC",
+    "ON_GC":   "Ganglion_Lee",
+    "OFF_GC":  "Ganglion_Lee",
+}
+
+# 倍率を決める基準（parameters_new.hoc の偏心度 1 mm の細胞数と R_cov）
+REFERENCE_ECC_MM = 1.0
+REFERENCE_COUNTS = {"Rods": 400, "Cones": 20, "R_BC": 32, "ON_CBC": 20, "OFF_CBC": 20,
+                    "AIIAC": 8, "ON_GC": 20, "OFF_GC": 20}
+REFERENCE_R_COV = 10
+
+# 密度の積分・棄却法の最大値に使う格子の分割数（一辺あたり）
+GRID = 64
+
+FORMAT_VERSION = 1
+
+
+def diff_exp(x, c1, k1, c2, k2, c3=0, k3=0):
+    """密度モデル（指数関数の和）。"""
+    return c1 * np.exp(k1 * x) + c2 * np.exp(k2 * x) + c3 * np.exp(k3 * x)
+
+
+def density(pop: str, ecc_mm) -> np.ndarray:
+    """細胞種 pop の偏心度 ecc_mm での密度（細胞数/mm²。負の値は 0）。"""
+    return np.maximum(diff_exp(np.asarray(ecc_mm, dtype=float), *DENSITY_PARAMS[POP_DENSITY[pop]]), 0.0)
+
+
+def reference_size_um() -> float:
+    """既定のパッチの一辺（偏心度 1 mm で Rod が REFERENCE_COUNTS["Rods"] 個になる正方形）。"""
+    return float(np.sqrt(REFERENCE_COUNTS["Rods"] / density("Rods", REFERENCE_ECC_MM)) * 1000.0)
+
+
+def _grid(ecc_mm: float, size_um: float) -> tuple[np.ndarray, float]:
+    """パッチの格子点の偏心度 (mm) と1マスの面積 (mm²)。"""
+    step = size_um / 1000.0 / GRID
+    u = (np.arange(GRID) + 0.5) * step - size_um / 2000.0
+    x, y = np.meshgrid(ecc_mm + u, u, indexing="ij")
+    return np.hypot(x, y), step**2
+
+
+def expected_count(pop: str, ecc_mm: float, size_um: float) -> float:
+    """パッチ内の密度の積分（倍率をかける前の細胞数）。"""
+    r, cell_area = _grid(ecc_mm, size_um)
+    return float(density(pop, r).sum() * cell_area)
+
+
+def count_scale() -> dict[str, float]:
+    """細胞種 → 倍率（偏心度 1 mm・既定の大きさのパッチで REFERENCE_COUNTS になる）。"""
+    size = reference_size_um()
+    return {pop: n / expected_count(pop, REFERENCE_ECC_MM, size) for pop, n in REFERENCE_COUNTS.items()}
+
+
+def reference_params() -> dict[str, float]:
+    """fovea_edges() に渡す基準の細胞数と R_cov。"""
+    params = {num: float(REFERENCE_COUNTS[pop]) for pop, num in POPULATIONS.items()}
+    params["R_cov"] = float(REFERENCE_R_COV)
+    return params
+
+
+def wiring_k() -> dict[str, int]:
+    """
+    結合の種類 → k（netconnection_fovea.hoc の規則の基準の細胞数での平均の本数）。
+
+    前細胞 → 後細胞は後細胞1つあたりの前細胞の数、同じ細胞種どうしは1細胞あたりの相手の数。
+    """
+    k = {}
+    for name, (pre, post) in fovea_edges(reference_params()).items():
+        _, pre_pop, post_pop = FAMILIES[name][:3]
+        per = len(pre) * (2 if pre_pop == post_pop else 1) / max(REFERENCE_COUNTS[post_pop], 1)
+        k[name] = max(int(round(per)), 1)
+    return k
+
+
+WIRING_K = wiring_k()
+
+
+def sample_positions(pop: str, n: int, ecc_mm: float, size_um: float, rng: np.random.Generator) -> np.ndarray:
+    """パッチ内に密度に比例して n 個置いた位置 (µm、中心窩が原点)。パッチの中心に近い順。"""
+    r, _ = _grid(ecc_mm, size_um)
+    d_max = float(density(pop, r).max()) * 1.05   # 格子点の間の最大値の見落とし分
+    half = size_um / 2.0
+    out = np.empty((0, 2))
+    while len(out) < n and d_max > 0:
+        m = 2 * (n - len(out)) + 16
+        xy = rng.uniform(-half, half, size=(m, 2)) + (ecc_mm * 1000.0, 0.0)
+        keep = rng.uniform(0.0, d_max, m) < density(pop, np.hypot(xy[:, 0], xy[:, 1]) / 1000.0)
+        out = np.vstack([out, xy[keep]])
+    out = out[:n]
+    dist = np.hypot(out[:, 0] - ecc_mm * 1000.0, out[:, 1])
+    return out[np.argsort(dist, kind="stable")]
+
+
+def _sorted_edges(pre: np.ndarray, post: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """後細胞の番号順（同じ後細胞の中では前細胞の番号順）にする（connectivity の表と同じ順）。"""
+    order = np.lexsort((pre, post))
+    return pre[order].astype(np.int64), post[order].astype(np.int64)
+
+
+class Patch:
+    """1つのパッチの細胞の位置（µm）と結合の番号の表。"""
+
+    def __init__(self, positions: dict[str, np.ndarray], edges: dict[str, tuple[np.ndarray, np.ndarray]],
+                 meta: dict):
+        self.positions = {pop: np.asarray(positions[pop], dtype=float).reshape(-1, 2) for pop in POPULATIONS}
+        self.edges = {name: (np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64))
+                      for name, (a, b) in edges.items()}
+        self.meta = dict(meta)
+
+    @property
+    def counts(self) -> dict[str, int]:
+        """細胞種 → 細胞数。"""
+        return {pop: len(xy) for pop, xy in self.positions.items()}
+
+    def overrides(self) -> dict[str, int]:
+        """細胞数を parameters_new.hoc の変数の上書き値にしたもの（Num_R など）。"""
+        return {POPULATIONS[pop]: n for pop, n in self.counts.items()}
+
+    def with_counts(self, overrides: dict) -> dict:
+        """overrides に細胞数（overrides()）を入れたもの。表と違う細胞数を指定していたら ValueError。"""
+        out = dict(overrides)
+        for name, n in self.overrides().items():
+            if name in out:
+                try:
+                    same = float(out[name]) == n
+                except (TypeError, ValueError):
+                    same = False
+                if not same:
+                    raise ValueError(f"{name}={out[name]!r} does not match the connectivity table ({n})")
+            out[name] = n
+        return out
+
+    def families(self, params: dict[str, float], drop_zero: bool = True) -> list[Family]:
+        """今のパラメータの g を入れた結合の表（connectivity.table_connections()）。"""
+        return table_connections(self.edges, self.counts, params, drop_zero, hoc_rules=False)
+
+    def save(self, path) -> Path:
+        """np.savez_compressed で保存する（位置は float32、番号は int32）。"""
+        path = Path(path)
+        if path.suffix != ".npz":
+            path = path.with_name(path.name + ".npz")   # np.savez_compressed が付けるのと同じ名前
+        arrays = {f"pos_{pop}": xy.astype(np.float32) for pop, xy in self.positions.items()}
+        for name, (pre, post) in self.edges.items():
+            arrays[f"edge_{name}"] = np.stack([pre, post]).astype(np.int32)
+        meta = {**self.meta, "format": FORMAT_VERSION}
+        np.savez_compressed(path, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path) -> "Patch":
+        with np.load(path) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("format") != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported mosaic format {meta.get('format')!r}")
+            positions = {pop: z[f"pos_{pop}"] for pop in POPULATIONS}
+            edges = {name: tuple(z[f"edge_{name}"]) for name in FAMILIES if f"edge_{name}" in z.files}
+        return cls(positions, edges, meta)
+
+
+def load_table(table) -> Patch:
+    """パス（.npz）か Patch。"""
+    return table if isinstance(table, Patch) else Patch.load(table)
+
+
+def wire(positions: dict[str, np.ndarray], ecc_mm: float, size_um: float, k: dict[str, int] | None = None,
+         periodic: bool = True) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """近傍探索で結合の番号の表（種類 → (前, 後)。connectivity.FAMILIES の順）を作る。"""
+    k = {**WIRING_K, **(k or {})}
+    # 周期境界ではパッチの左下の角を原点にして [0, size_um) に入れる
+    corner = np.array([ecc_mm * 1000.0 - size_um / 2.0, -size_um / 2.0])
+    local = {pop: np.mod(xy - corner, size_um) if periodic else xy for pop, xy in positions.items()}
+    trees: dict[str, cKDTree] = {}
+
+    def tree(pop: str) -> cKDTree:
+        if pop not in trees:
+            trees[pop] = cKDTree(local[pop], boxsize=size_um if periodic else None)
+        return trees[pop]
+
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    edges = {}
+    for name, spec in FAMILIES.items():
+        _, pre_pop, post_pop = spec[:3]
+        n_pre, n_post = len(local[pre_pop]), len(local[post_pop])
+        if pre_pop == post_pop:
+            # 自分自身が最も近いので k + 1 個探す
+            kk = min(k[name], n_pre - 1)
+            if kk <= 0:
+                edges[name] = empty
+                continue
+            _, nn = tree(pre_pop).query(local[pre_pop], k=kk + 1)
+            pairs = np.sort(np.c_[np.repeat(np.arange(n_pre), kk), nn[:, 1:].ravel()], axis=1)
+            pairs = np.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0)
+            edges[name] = (pairs[:, 0].astype(np.int64), pairs[:, 1].astype(np.int64))
+        else:
+            kk = min(k[name], n_pre)
+            if kk <= 0 or n_post == 0:
+                edges[name] = empty
+                continue
+            _, nn = tree(pre_pop).query(local[post_pop], k=kk)
+            nn = np.asarray(nn).reshape(n_post, kk)
+            edges[name] = _sorted_edges(nn.ravel(), np.repeat(np.arange(n_post), kk))
+    return edges
+
+
+def generate(ecc_mm: float, size_um: float | None = None, seed: int = 0, k: dict[str, int] | None = None,
+             periodic: bool = True) -> Patch:
+    """偏心度 ecc_mm・一辺 size_um（省略時は reference_size_um()）のパッチを作る。"""
+    size_um = reference_size_um() if size_um is None else float(size_um)
+    rng = np.random.default_rng(seed)
+    scale = count_scale()
+    positions = {}
+    for pop in POPULATIONS:
+        n = int(round(scale[pop] * expected_count(pop, ecc_mm, size_um)))
+        positions[pop] = sample_positions(pop, n, ecc_mm, size_um, rng)
+    k = {**WIRING_K, **(k or {})}
+    meta = {"ecc_mm": float(ecc_mm), "size_um": size_um, "seed": int(seed), "periodic": bool(periodic),
+            "k": k, "counts": {pop: len(xy) for pop, xy in positions.items()}}
+    return Patch(positions, wire(positions, ecc_mm, size_um, k, periodic), meta)
+
+
+def print_patch(patch: Patch) -> None:
+    """細胞数と結合の種類ごとの本数を表示する。"""
+    m = patch.meta
+    print(f"ecc {m['ecc_mm']:g} mm, {m['size_um']:.1f} um square, seed {m['seed']}, "
+          f"{'periodic' if m['periodic'] else 'open'}")
+    for pop, n in patch.counts.items():
+        print(f"  {pop:<8} {n:>8}")
+    for name, (pre, post) in patch.edges.items():
+        post_pop = FAMILIES[name][2]
+        print(f"  {name:<12} {len(pre):>8}  ({len(pre) / max(patch.counts[post_pop], 1):.1f} per {post_pop})")
+
+
+def _parse_k(items: list[str]) -> dict[str, int]:
+    out = {}
+    for item in items:
+        name, sep, value = item.partition("=")
+        if not sep or name.strip() not in FAMILIES:
+            raise SystemExit(f"--k expects FAMILY=INT with FAMILY in {list(FAMILIES)}, got {item!r}")
+        out[name.strip()] = int(value)
+    return out
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Sample cell mosaics from the density models and wire them by proximity.")
+    ap.add_argument("--ecc", type=float, required=True, help="eccentricity of the patch centre (mm)")
+    ap.add_argument("--size", type=float, default=None, help="side of the square patch (um; default: 1 mm counts)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--k", action="append", default=[], metavar="FAMILY=INT",
+                    help="connections per cell of a family (repeatable)")
+    ap.add_argument("--open", action="store_true", help="no periodic boundary")
+    ap.add_argument("-o", "--output", type=Path, default=None, help=".npz connectivity table")
+    args = ap.parse_args(argv)
+
+    patch = generate(args.ecc, args.size, args.seed, _parse_k(args.k), periodic=not args.open)
+    print_patch(patch)
+    empty = [pop for pop, n in patch.counts.items() if n == 0]
+    if empty:
+        print(f"[WARN] no cells for {empty} (enlarge --size)")
+    if args.output is not None:
+        print(f"-> {patch.save(args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,374 @@
+"""
+シナプス・ギャップ結合を、結合の表（connectivity.Family の列）から Python でまとめて作るモジュール。
+
+処理:
+- netconnection_fovea.hoc の Ribbon_syn() / Gly_syn() / *_GJ() + *_set() と同じオブジェクトを作り、
+  同じ hoc の配列・リスト（R2RB[i][j] / R2RB_pre[j] / Gap_AC など）に入れる。作った後は hoc の *_set() /
+  記録・解析スクリプトがそのまま使える（network.Network(builder="table") の構築）
+- 結合の種類ごとのメカニズムとパラメータは SYNAPSES の表にあり、パラメータの値（parameters_new.hoc の変数）は
+  種類ごとに1回だけ読む。g は表の値をその場で入れる（*_set() でもう一度全部に入れ直さない）
+- hoc の構築との違い:
+    全部の R2RB[i][j] に NullSyn を入れてから RibbonPost で置き換える（Ribbon_syn()）のではなく、
+    作らない位置にだけ NullSyn を入れる
+    放出のある種類（R2RB / RBC2AC / OFFCB2AC）の RibbonPost は、後細胞の番号・g_max の Vector を渡して
+    hoc の ribbon_post_table() で1回の呼び出しでまとめて作り、ribbon_transfer() の target_var も
+    ribbon_target_table() でまとめて設定する（R2RB は Num_R = 4000 で 128,000 本。Python から1本ずつ呼ぶと
+    呼び出しの分だけ hoc の構築より遅くなる）
+- 種類ごとの所要時間（秒）を timings に残す
+
+使い方:
+    python netbuild.py --set Num_R=4000                  # hoc と table の構築時間を種類ごとに表示し、同じものができたか比べる
+    python netbuild.py --builders table --set Num_R=4000
+
+    net = Network({"Num_R": 4000}, builder="table")
+    print_timings({"table": net.build_timings})
+
+結果（Num_R = 4000、R2RB は 128,000 本。hoc / table を新しいプロセスで交互に7回ずつ構築した中央値、秒）:
+    step             hoc     table (1本ずつ)  table
+    Ribbon_syn       0.301   -                -
+    Ribbon_syn_set   0.014   -                -
+    R2RB             -       0.210            0.172
+    RBC2AC           -       0.007            0.008
+    ribbon_transfer  -       0.134            0.069
+    total            0.394   0.436            0.329
+  - table (1本ずつ): RibbonPost の作成と target_var を Python から1本ずつ呼んでいたとき。hoc より遅い
+  - table: ribbon_post_table() / ribbon_target_table() でまとめて作る。hoc の構築より 17 % 速い
+    （hoc は全部の R2RB[i][j] に NullSyn を作ってから RibbonPost で置き換えるので、オブジェクトを2倍作る）
+  - R2RB の残り（0.17 s）のほとんどは RibbonPost 自体の作成（hoc のループで 0.09–0.12 s）
+  - total は iclamps / noise など両方に共通の手順も含む。作ったシナプスと 300 ms の膜電位は hoc と同じ
+
+補足:
+- ONCB / OFFCB どうしのギャップ結合（ONCB_GJ / OFFCB_GJ）は番号の決まった hoc の配列（Gap_ONCB_alpha[k] など）に
+  入るので、hoc の proc（ONCB_GJ() / OFFCB_GJ()）で作る（数十本なので時間はかからない）。
+  mosaic.py の表（hoc_rules=False）では表の組をリスト（Gap_ONCB / Gap_OFFCB）に入れ、NullSyn も入れない
+  （表の結合は hoc の *_set() の規則と合わないので、network.Network は *_set() を呼ばずに作り直す）
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+from neuron import h
+
+from connectivity import POPULATIONS, Family, cell_counts
+
+# hoc の配列 → (前細胞の種類, 後細胞の種類)（配列は [後][前]）
+ARRAY_POPS = {
+    "R2RB":        ("Rods", "R_BC"),
+    "C2ONCB":      ("Cones", "ON_CBC"),
+    "C2OFFCB":     ("Cones", "OFF_CBC"),
+    "RBC2AC":      ("R_BC", "AIIAC"),
+    "ONCB2ONGC":   ("ON_CBC", "ON_GC"),
+    "OFFCB2OFFGC": ("OFF_CBC", "OFF_GC"),
+    "OFFCB2AC":    ("OFF_CBC", "AIIAC"),
+    "AC2OFFGC":    ("AIIAC", "OFF_GC"),
+    "AC2OFFCB":    ("AIIAC", "OFF_CBC"),
+}
+
+
+class SynapseSpec:
+    """
+    1種類のシナプスの hoc での作り方（netconnection_fovea.hoc と同じメカニズム・置き場所・パラメータ）。
+
+    params / release_params は 属性 → parameters_new.hoc の変数名（文字列）か値。
+    release があれば前細胞ごとに release_array[j] = release(soma(1)) を作り、後細胞の RibbonPost.w_pre に
+    sgid（netconnection_fovea.hoc の SGID_*） + j で w を渡す（mech は RibbonPost。hoc の ribbon_post_table() で作る）。
+    なければ mech の v_pre を前細胞の soma(1) の v に向ける。
+    null_fill: 作らなかった位置に NullSyn を入れる範囲（"all": [後][前] の全部、"diag": [i][i]、None: 入れない）
+    built: 作った数を入れる hoc の変数（null_fill="all" なら 0 / 1）
+    """
+
+    def __init__(self, array: str, mech: str, params: dict, release: str | None = None,
+                 release_array: str | None = None, release_params: dict | None = None, sgid: str | None = None,
+                 null_fill: str | None = None, built: str | None = None):
+        self.array = array
+        self.mech = mech
+        self.params = params
+        self.release = release
+        self.release_array = release_array
+        self.release_params = release_params or {}
+        self.sgid = sgid
+        self.null_fill = null_fill
+        self.built = built
+
+
+def _named(suffix: str, *attrs: str) -> dict:
+    """attr → "{attr}_{suffix}"（parameters_new.hoc の変数名）。"""
+    return {attr: f"{attr}_{suffix}" for attr in attrs}
+
+
+# 放出の状態の初期値（netconnection_fovea.hoc で数値のまま入れているもの）
+_RELEASE_INIT = {"act": 0.0, "p1": 0.015, "p2": 0.58}
+
+# Ribbon_syn() → Gly_syn() の順
+SYNAPSES = {
+    "R2RB": SynapseSpec(
+        "R2RB", "RibbonPost", {}, release="RibbonRelease_R2RB", release_array="R2RB_pre",
+        release_params=_named("R2RB", "act", "p1", "p2", "u", "v_th", "v_slp", "alpha", "beta"),
+        sgid="SGID_R2RB", null_fill="all", built="R2RB_built"),
+    "C2ONCB": SynapseSpec(
+        "C2ONCB", "ribbon_syn_R2RB",
+        _named("C2ONCB", "act", "p1", "p2", "v_th", "v_slp", "alpha", "beta", "tau_1A"),
+        null_fill="diag", built="C2ONCB_built"),
+    # act / p1 / p2 は C2ONCB の値（C2OFFCB_make() と同じ）
+    "C2OFFCB": SynapseSpec(
+        "C2OFFCB", "ribbon_syn",
+        {**_named("C2ONCB", "act", "p1", "p2"),
+         **_named("C2OFFCB", "v_th", "v_slp", "alpha", "beta", "tau_1A", "tau_21", "tau_A3")},
+        null_fill="diag", built="C2OFFCB_built"),
+    "RBC2AC": SynapseSpec(
+        "RBC2AC", "RibbonPost", {"e": 0.0}, release="RibbonRelease", release_array="RBC2AC_pre",
+        release_params={**_RELEASE_INIT,
+                        **_named("RBC2AC", "alpha", "beta", "v_th", "v_slp", "tau_1A", "tau_21", "tau_A3")},
+        sgid="SGID_RBC2AC"),
+    "ONCB2ONGC": SynapseSpec(
+        "ONCB2ONGC", "ribbon_syn",
+        {**_RELEASE_INIT, **_named("ONCB2ONGC", "v_th", "v_slp", "tau_1A", "tau_21", "tau_A3")}),
+    "OFFCB2OFFGC": SynapseSpec(
+        "OFFCB2OFFGC", "ribbon_syn",
+        {**_RELEASE_INIT, **_named("OFFCB2OFFGC", "v_th", "v_slp", "tau_1A", "tau_21", "tau_A3")}),
+    "OFFCB2AC": SynapseSpec(
+        "OFFCB2AC", "RibbonPost", {}, release="RibbonRelease", release_array="OFFCB2AC_pre",
+        release_params=dict(_RELEASE_INIT), sgid="SGID_OFFCB2AC"),
+    "AC2OFFGC": SynapseSpec(
+        "AC2OFFGC", "depsyn", _named("AC2OFFGC", "v_th", "v_slp", "tau_e", "tau_r", "u")),
+    "AC2OFFCB": SynapseSpec(
+        "AC2OFFCB", "depsyn", _named("AC2OFFCB", "v_th", "v_slp", "tau_e", "tau_r", "u")),
+}
+
+# GapPair を入れる hoc のリスト（*_GJ() と同じ順）
+GAP_LISTS = {
+    "Cone_GJ":    "Gap_Cone",
+    "R_C_GJ":     "Gap_R_C",
+    "AC_ONBC_GJ": "Gap_AC_ONBC",
+    "AC_GJ":      "Gap_AC",
+    "OFFGC_GJ":   "Gap_OFFGC",
+}
+# hoc の proc で作る結合（番号の決まった配列に入るもの）
+HOC_GAPS = {
+    "ONCB_GJ":  ("ONCB_GJ", "ONCB_GJ_set"),
+    "OFFCB_GJ": ("OFFCB_GJ", "OFFCB_GJ_set"),
+}
+# hoc_rules=False のときに HOC_GAPS の代わりに表から作るリスト
+TABLE_GAP_LISTS = {
+    "ONCB_GJ":  "Gap_ONCB",
+    "OFFCB_GJ": "Gap_OFFCB",
+}
+
+
+def _resolve(params: dict) -> dict[str, float]:
+    """属性 → 値（変数名は hoc から読む）。"""
+    return {attr: float(getattr(h, v)) if isinstance(v, str) else float(v) for attr, v in params.items()}
+
+
+def _configure(obj, values: dict[str, float]) -> None:
+    for attr, value in values.items():
+        setattr(obj, attr, value)
+
+
+class TableBuilder:
+    """
+    結合の表から、netconnection_fovea.hoc の構築と同じシナプス・ギャップ結合を作る（細胞は作ってあること）。
+
+    hoc_rules=False は netconnection_fovea.hoc の規則によらない表（mosaic.py）: ONCB_GJ / OFFCB_GJ も表から作り、
+    *_set() 用の NullSyn は入れない（R2RB の [後][前] の全部に入れると Rod の数 × RBC の数になる）。
+    """
+
+    def __init__(self, fams: list[Family], params: dict[str, float], hoc_rules: bool = True):
+        self.fams = {fam.name: fam for fam in fams}
+        self.counts = cell_counts(params)
+        self.hoc_rules = hoc_rules
+        self.timings: dict[str, float] = {}
+        self.n_objects: dict[str, int] = {}
+        self._transfer: list[tuple] = []     # (sgid の始め, 放出の列, RibbonPost の List, その前細胞の番号の Vector)
+
+    def _timed(self, name: str, fn) -> None:
+        t0 = time.perf_counter()
+        fn()
+        self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - t0
+
+    def build(self) -> dict[str, float]:
+        """noise → シナプス → 放出の受け渡し → ギャップ結合 → Gap_linear の順に作り、種類ごとの所要時間を返す。"""
+        for proc in ("noise", "noise_set", "syn_update_set"):
+            self._timed(proc, getattr(h, proc))
+        for name, spec in SYNAPSES.items():
+            self._timed(name, lambda: self._synapse(name, spec))
+        self._timed("ribbon_transfer", self._ribbon_transfer)
+        gap_lists = GAP_LISTS if self.hoc_rules else {**GAP_LISTS, **TABLE_GAP_LISTS}
+        for name, lst in gap_lists.items():
+            self._timed(name, lambda: self._gaps(name, lst))
+        if self.hoc_rules:
+            for name, procs in HOC_GAPS.items():
+                self._timed(name, lambda: [getattr(h, proc)() for proc in procs])
+        self._timed("Gap_linear", h.Gap_linear)
+        return self.timings
+
+    def _cells(self, pop: str) -> list:
+        arr = getattr(h, pop)
+        return [arr[i] for i in range(self.counts[pop])]
+
+    def _synapse(self, name: str, spec: SynapseSpec) -> None:
+        fam = self.fams.get(name)
+        n = 0
+        if fam is not None and len(fam):
+            pre_cells = self._cells(fam.pre)
+            post_cells = self._cells(fam.post)
+            if spec.release is not None:
+                self._ribbon_posts(spec, fam, pre_cells, post_cells)
+            else:
+                self._direct(spec, fam, pre_cells, post_cells)
+            n = len(fam)
+        self.n_objects[name] = n + self._null_fill(spec, fam)
+        if spec.built is not None:
+            # R2RB_built は 0 / 1、C2ONCB_built / C2OFFCB_built は本物のシナプスにした Cone の数
+            setattr(h, spec.built, int(n > 0) if spec.null_fill == "all" else n)
+
+    def _ribbon_posts(self, spec: SynapseSpec, fam: Family, pre_cells: list, post_cells: list) -> None:
+        """放出（前細胞ごと）を作り、RibbonPost は hoc の ribbon_post_table() で1回の呼び出しでまとめて作る。"""
+        rel_arr = getattr(h, spec.release_array)
+        rel_values = _resolve(spec.release_params)
+        release = getattr(h, spec.release)
+        rels = []
+        for j, cell in enumerate(pre_cells):
+            rel = release(cell.soma(1))
+            _configure(rel, rel_values)
+            rel_arr[j] = rel
+            rels.append(rel)
+        cells = h.List()
+        for cell in post_cells:
+            cells.append(cell)
+        posts = h.List()
+        h.ribbon_post_table(cells, h.Vector(fam.post_idx), h.Vector(fam.g), posts)
+        arr = getattr(h, spec.array)
+        values = _resolve(spec.params)
+        for syn, i, j in zip(posts, fam.post_idx.tolist(), fam.pre_idx.tolist()):
+            if values:
+                _configure(syn, values)
+            arr[i][j] = syn
+        self._transfer.append((int(getattr(h, spec.sgid)), rels, posts, h.Vector(fam.pre_idx)))
+
+    def _direct(self, spec: SynapseSpec, fam: Family, pre_cells: list, post_cells: list) -> None:
+        """前細胞の v を POINTER で読むシナプスを1本ずつ作る（どの種類も数百本まで）。"""
+        arr = getattr(h, spec.array)
+        mech = getattr(h, spec.mech)
+        values = _resolve(spec.params)
+        for i, j, g in zip(fam.post_idx.tolist(), fam.pre_idx.tolist(), fam.g.tolist()):
+            syn = mech(post_cells[i].soma(1))
+            h.setpointer(pre_cells[j].soma(1)._ref_v, "v_pre", syn)
+            _configure(syn, values)
+            syn.g_max = g
+            if fam.weight != 1:
+                syn.weight = fam.weight
+            arr[i][j] = syn
+
+    def _null_fill(self, spec: SynapseSpec, fam: Family | None) -> int:
+        """作らなかった位置に NullSyn を入れ、入れた数を返す。"""
+        if spec.null_fill is None or not self.hoc_rules:
+            return 0
+        pre_pop, post_pop = ARRAY_POPS[spec.array]
+        n_pre, n_post = self.counts[pre_pop], self.counts[post_pop]
+        if spec.null_fill == "all":
+            post, pre = np.divmod(np.arange(n_pre * n_post, dtype=np.int64), max(n_pre, 1))
+        else:
+            # [i][i] は Cone の数までしかない（C2ONCB[Num_ONCBC][NC_SAFE]）
+            post = pre = np.arange(min(n_pre, n_post), dtype=np.int64)
+        built = np.zeros((n_post, max(n_pre, n_post)), dtype=bool)
+        if fam is not None:
+            built[fam.post_idx, fam.pre_idx] = True
+        arr = getattr(h, spec.array)
+        missing = ~built[post, pre]
+        for i, j in zip(post[missing].tolist(), pre[missing].tolist()):
+            arr[i][j] = h.NullSyn()
+        return int(missing.sum())
+
+    def _ribbon_transfer(self) -> None:
+        """ribbon_transfer() と同じ source_var / target_var（photo_transfer() は hoc のまま）。"""
+        pc = h.pc_ribbon
+        pc.gid_clear(3)
+        for sgid0, rels, posts, pre_idx in self._transfer:
+            for j, rel in enumerate(rels):
+                pc.source_var(rel._ref_w, sgid0 + j, sec=rel.get_segment().sec)
+            h.ribbon_target_table(posts, pre_idx, sgid0)
+        self._transfer = []
+        h.photo_transfer()
+        pc.setup_transfer()
+
+    def _gaps(self, name: str, list_name: str) -> None:
+        lst = h.List()
+        setattr(h, list_name, lst)
+        fam = self.fams.get(name)
+        if fam is not None:
+            a_cells, b_cells = self._cells(fam.pre), self._cells(fam.post)
+            for a, b, g in zip(fam.pre_idx.tolist(), fam.post_idx.tolist(), fam.g.tolist()):
+                lst.append(h.GapPair(a_cells[a], b_cells[b], g, fam.sym))
+        self.n_objects[name] = int(lst.count())
+
+
+def snapshot() -> dict[str, list]:
+    """構築済みの結合の中身（SYNAPSES の配列の各要素のメカニズム名・g_max、ギャップ結合のリストの細胞・g）。"""
+    out = {}
+    for name, spec in SYNAPSES.items():
+        arr = getattr(h, spec.array)
+        rows = []
+        pre_pop, post_pop = ARRAY_POPS[spec.array]
+        n_pre, n_post = int(getattr(h, POPULATIONS[pre_pop])), int(getattr(h, POPULATIONS[post_pop]))
+        for i in range(n_post):
+            for j in range(n_pre):
+                obj = arr[i][j]
+                if obj is not None:
+                    rows.append((i, j, obj.hname().split("[")[0], float(obj.g_max)))
+        out[name] = rows
+    # 細胞は配列の番号で表す（テンプレート名（AC[8] など）は前の構築の細胞が残っていると番号がずれる）
+    cell_names = {getattr(h, pop)[i].hname(): f"{pop}[{i}]"
+                  for pop, num in POPULATIONS.items() for i in range(int(getattr(h, num)))}
+    for name, list_name in GAP_LISTS.items():
+        lst = getattr(h, list_name)
+        out[name] = [(cell_names[gp.ca.hname()], cell_names[gp.cb.hname()], float(gp.g), int(gp.sym))
+                     for gp in lst]
+    return out
+
+
+def print_timings(timings: dict[str, dict[str, float]]) -> None:
+    """構築方法 → {種類: 秒} を横に並べて表示する。"""
+    names = list(dict.fromkeys(k for t in timings.values() for k in t))
+    print(f"{'step':<16}" + "".join(f"{b:>10}" for b in timings))
+    for name in names:
+        print(f"{name:<16}" + "".join(f"{t[name]:>10.3f}" if name in t else f"{'-':>10}" for t in timings.values()))
+    print(f"{'total':<16}" + "".join(f"{sum(t.values()):>10.3f}" for t in timings.values()))
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    from network import BUILDERS, Network
+    from parallel_net import _parse_set
+
+    ap = argparse.ArgumentParser(description="Time the network build per connection family.")
+    ap.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                    help="override a parameter of parameters_new.hoc (repeatable)")
+    ap.add_argument("--builders", nargs="+", choices=BUILDERS, default=list(BUILDERS))
+    args = ap.parse_args(argv)
+
+    overrides = _parse_set(args.set)
+    timings, snaps = {}, {}
+    for builder in args.builders:
+        net = Network(overrides, builder=builder)
+        timings[builder] = dict(net.build_timings)
+        snaps[builder] = snapshot()
+    print_timings(timings)
+
+    ok = True
+    ref_name, ref = next(iter(snaps.items()))
+    for builder, snap in snaps.items():
+        for name in ref:
+            if snap[name] != ref[name]:
+                ok = False
+                print(f"[DIFF] {name}: {builder} ({len(snap[name])}) != {ref_name} ({len(ref[name])})")
+    if len(snaps) > 1 and ok:
+        print("same synapses and gap junctions")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,317 @@
+"""
+網膜回路ネットワークを1プロセス内で1回だけ構築し、パラメータを差し替えながら繰り返し実行するモジュール。
+
+処理:
+- src/parameters_new.hoc の本文に上書き値（Num_R / g_RBC2AC など）を差し込んで hoc に流す
+  （ファイル自体は書き換えない。sweep_*.py の replace_var と同じ置換）
+- 変わったのがコンダクタンス系のパラメータだけなら、構築済みのシナプス・ギャップ結合に
+  netconnection_fovea.hoc の *_set() で値を入れ直すだけにする（細胞・結合は作り直さない）
+- Num_R など構造に関わるパラメータが変わったときだけ createcells.hoc / netconnection_fovea.hoc を
+  読み直してネットワークを作り直す
+    builder="hoc"  : netconnection_fovea.hoc の proc（BUILD_STEPS）でシナプス・ギャップ結合を作る
+    builder="table": connectivity.py の結合の表から netbuild.TableBuilder が Python でまとめて作る
+                     （hoc の配列・リストには同じものが入るので、*_set() や記録はそのまま使える）
+  構築の手順ごとの所要時間（秒）は build_timings に残る
+- table（mosaic.py の .npz か Patch）を渡すと、細胞数（Num_R など）と結合はその表のものになる（builder は "table"）。
+  表の結合は hoc の *_set() の規則と合わないので、パラメータが1つでも変わったら作り直す
+- 実行ごとに膜電位・ノイズ乱数を新規プロセスと同じ状態に戻してから finitialize する
+
+使い方（sweep_rodcone.py などから）:
+    net = Network(run_mode="coreneuron")
+    for R, C in points:
+        net.apply({"Num_R": R, "Num_C_RP": C, "g_R2RB": g})
+        probe = Probe.soma(h.AIIAC[0], "v", per_step=net.per_step)
+        net.simulate()
+        t, v = probe.window(RECORD_START_MS)
+
+補足:
+- CONDUCTANCE_SETTERS に無いパラメータは安全側に倒して「構造が変わる」扱い（作り直し）にする
+- 作り直すと古い細胞・シナプスは消えるので、Probe は apply() の後に作ること
+- IfluctR123（noise_r123 = 1、既定）のノイズは細胞ごとの Random123 の系列で、finitialize で先頭に戻る
+- Ifluct1（noise_r123 = 0）のノイズは NEURON 全体で1本の乱数列（scop）を使うので、finitialize では巻き戻らない。
+  毎回 SCOP_SEED で種を入れ直して、新規プロセスで1回だけ実行したときと同じ乱数列にする
+"""
+
+from __future__ import annotations
+
+import os
+import platform
+import re
+import time
+from pathlib import Path
+
+from neuron import h
+
+from connectivity import fovea_connections
+from execution import run_simulation
+from netbuild import TableBuilder
+from recording import noise_seeds
+
+BASE = Path(__file__).resolve().parent
+PARAM_PATH = BASE / "src" / "parameters_new.hoc"
+
+# hoc の新しい section の初期膜電位（init.py は finitialize() を引数なしで呼び、この値から始まる）
+V_INIT = -65.0
+# scop 乱数（normrand）のプロセス起動時の種
+SCOP_SEED = 1
+
+# 構築済みのオブジェクトに値を入れ直すだけで済むパラメータ → 呼ぶ hoc proc（順番どおり）
+CONDUCTANCE_SETTERS: dict[str, tuple[str, ...]] = {
+    "g_R2RB":         ("Ribbon_syn_set",),
+    "g_C2ONCB":       ("Ribbon_syn_set",),
+    "g_C2OFFCB":      ("Ribbon_syn_set",),
+    "g_RBC2AC":       ("Ribbon_syn_set",),
+    "g_ONCB2ONGC":    ("Ribbon_syn_set",),
+    "g_OFFCB2OFFGC":  ("Ribbon_syn_set",),
+    "g_OFFCB2AC":     ("Ribbon_syn_set",),
+    "g_AC2OFFGC":     ("Gly_syn_set",),
+    "g_AC2OFFCB":     ("Gly_syn_set",),
+    "AC2OFFCB_legacy_g": ("Gly_syn_set",),
+    "g_AC2OFFCB_unset":  ("Gly_syn_set",),
+    "gj_AC2CB":       ("AC_ONBC_GJ_set", "Gap_linear"),
+    "gj_C2C":         ("Cone_GJ_set", "Gap_linear"),
+    "gj_R2C":         ("R_C_GJ_set", "Gap_linear"),
+    "gj_AC2AC":       ("AC_GJ_set", "Gap_linear"),
+    "gj_OFFGC2OFFGC": ("OFFGC_GJ_set", "Gap_linear"),
+    # シナプスの更新法（mod の GLOBAL exact）を切り替える
+    "syn_exact":      ("syn_update_set",),
+    # チャネルの速度定数を表から引くか（usetable_*）を切り替える
+    "rate_tables":    ("rate_table_set",),
+    # IfluctR123 の系列を付け直す（細胞は作り直さない）
+    "noise_trial":    ("noise_set",),
+    # Cone_GJ_set() / R_C_GJ_set() は生き残った Cone の数が変わると結合を作り直す
+    # （ギャップ結合の g を変えたら、gap_linear = 1 の LinearMechanism も Gap_linear() で作り直す）
+    "Num_C_RP":       ("Ribbon_syn_set", "Cone_GJ_set", "R_C_GJ_set", "Gap_linear"),
+}
+
+# init.py の start() と同じ順番
+BUILD_STEPS = (
+    "noise", "noise_set",
+    "Ribbon_syn", "Ribbon_syn_set",
+    "Gly_syn", "Gly_syn_set",
+    "Cone_GJ", "Cone_GJ_set",
+    "R_C_GJ", "R_C_GJ_set",
+    "AC_ONBC_GJ", "AC_ONBC_GJ_set",
+    "AC_GJ", "AC_GJ_set",
+    "OFFGC_GJ", "OFFGC_GJ_set",
+    "ONCB_GJ", "ONCB_GJ_set",
+    "OFFCB_GJ", "OFFCB_GJ_set",
+    "Gap_linear",
+)
+
+BUILDERS = ("hoc", "table")
+
+
+def replace_var(src: str, name: str, value_str: str) -> str:
+    """
+    hocの「name = value ...」の value 部分だけ差し替える（コメント等は維持）。
+    """
+    pattern = re.compile(
+        rf'^(\s*{re.escape(name)}\s*=\s*)([^/\n]*)(.*)$',
+        re.MULTILINE
+    )
+    if not pattern.search(src):
+        raise KeyError(f"{name} が {PARAM_PATH.name} 内に見つかりません。")
+
+    return pattern.sub(lambda m: f"{m.group(1)}{value_str}{m.group(3)}", src, count=1)
+
+
+def format_value(value) -> str:
+    """上書き値を hoc の式にする（文字列はそのまま式として使う）。"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))   # 丸めずにそのまま渡す
+
+
+def make_param_text(overrides: dict, base_text: str) -> str:
+    """parameters_new.hoc の本文に overrides の値を差し込んだテキストを返す。"""
+    text = base_text
+    for name, value in overrides.items():
+        text = replace_var(text, name, format_value(value))
+    return text
+
+
+def exec_params(text: str) -> None:
+    """パラメータのテキストを hoc で実行する（hoc の構文エラーは例外にする）。"""
+    if not h(text):
+        raise RuntimeError("パラメータの hoc テキストを実行できませんでした（上の hoc のエラーを参照）")
+
+
+# parameters_new.hoc で値を代入している変数名（行頭が // のものは除く）
+_ASSIGN_RE = re.compile(r"^\s*([A-Za-z_]\w*)\s*=", re.MULTILINE)
+
+
+def effective_params(overrides: dict, base_text: str) -> dict[str, float]:
+    """
+    overrides を差し込んだパラメータを hoc で評価し、実際に使われる値を {名前: 値} で返す。
+
+    "0.0012 * 0.20" のような式も評価後の値になるので、書き方が違っても同じ値なら同じ結果になる。
+    （hoc のグローバル変数を書き換えるので、構築済みの Network には apply() で入れ直すこと）
+    """
+    text = make_param_text(overrides, base_text)
+    exec_params(text)
+    return {name: float(getattr(h, name)) for name in dict.fromkeys(_ASSIGN_RE.findall(text))}
+
+
+def load_model() -> None:
+    """stdrun と CoreNEURON 用の設定を読み込む（hoc 内の相対パスに合わせて BASE に移動）。"""
+    os.chdir(BASE)
+    if not hasattr(h, "ribbon_syn"):
+        # 別のディレクトリで neuron を import した（sweep のワーカーなど）ときは、ここで mod を読み込む
+        h.nrn_load_dll(str(BASE / platform.machine() / ".libs" / "libnrnmech.so"))
+    h.load_file("stdrun.hoc")
+    h.cvode.cache_efficient(1)
+
+
+class Network:
+    """1回構築したネットワークを、パラメータを差し替えながら使い回す。"""
+
+    def __init__(self, overrides: dict | None = None, run_mode: str = "classic",
+                 cell_permute: int = 1, param_path: Path = PARAM_PATH, builder: str = "hoc", table=None):
+        if builder not in BUILDERS:
+            raise ValueError(f"builder must be one of {BUILDERS}, got {builder!r}")
+        load_model()
+        self.table = None
+        if table is not None:
+            from mosaic import load_table   # scipy は表を使うときだけ
+            self.table = load_table(table)
+            builder = "table"
+        self.builder = builder
+        self.build_timings: dict[str, float] = {}
+        self.run_mode = run_mode
+        self.cell_permute = cell_permute
+        self.base_text = Path(param_path).read_text(encoding="utf-8")
+        self.overrides: dict = {}
+        self.built = False
+        self.n_builds = 0
+        # overrides を省略したときは最初の apply() で構築する（作ってすぐ作り直すのを避ける）
+        if overrides is not None:
+            self.apply(overrides)
+
+    @property
+    def per_step(self) -> bool:
+        """Probe を毎ステップ記録にする必要があるか（CoreNEURON 用）。"""
+        return self.run_mode == "coreneuron"
+
+    def apply(self, overrides: dict) -> str:
+        """
+        パラメータの上書き値を overrides に切り替える（指定しなかった値はファイルの値に戻る）。
+
+        戻り値: "build"（作り直し） / "set"（*_set のみ） / "none"（変更なし）
+        """
+        overrides = dict(overrides) if self.table is None else self.table.with_counts(overrides)
+        changed = {name for name in set(self.overrides) | set(overrides)
+                   if self.overrides.get(name) != overrides.get(name)}
+
+        try:
+            # 依存する値（stim_Dim = stim など）もまとめて評価し直すため、本文全体を流す
+            exec_params(make_param_text(overrides, self.base_text))
+            h.dt = h.step_dt   # Probe(per_step=True) は作成時の h.dt を記録間隔とみなす
+            self.overrides = overrides
+
+            if (not self.built or any(name not in CONDUCTANCE_SETTERS for name in changed)
+                    or (self.table is not None and changed)):
+                self._build()
+                return "build"
+
+            if not changed:
+                return "none"
+
+            # 同じ proc は1回だけ、最後に出てきた位置で呼ぶ（Gap_linear は各 *_GJ_set の後になる）
+            procs = []
+            for name in sorted(changed):
+                setters = CONDUCTANCE_SETTERS[name]
+                procs = [p for p in procs if p not in setters] + list(setters)
+            for proc in procs:
+                getattr(h, proc)()
+            return "set"
+        except Exception:
+            # 途中で失敗したら次の apply() で必ず作り直す
+            self.built = False
+            raise
+
+    def _build(self) -> None:
+        """細胞・入力・ノイズ・シナプス・ギャップ結合を現在のパラメータで作る。"""
+        if hasattr(h, "iclamps"):
+            # このプロセスで一度読み込み済み（別の Network が作った分も含む）。
+            # objref の配列を宣言し直すので、古い細胞・point process はここで解放される
+            h.xopen("createcells.hoc")
+            h.xopen("src/netconnection_fovea.hoc")
+        else:
+            h.load_file("createcells.hoc")
+            h.load_file("src/netconnection_fovea.hoc")
+
+        self.build_timings = {}
+        t0 = time.perf_counter()
+        h.iclamps(h.AMP)
+        self.build_timings["iclamps"] = time.perf_counter() - t0
+        if self.builder == "table":
+            params = effective_params(self.overrides, self.base_text)
+            if self.table is not None:
+                builder = TableBuilder(self.table.families(params, drop_zero=False), params, hoc_rules=False)
+            else:
+                builder = TableBuilder(fovea_connections(params, drop_zero=False), params)
+            self.build_timings.update(builder.build())
+        else:
+            for proc in BUILD_STEPS:
+                t0 = time.perf_counter()
+                getattr(h, proc)()
+                self.build_timings[proc] = time.perf_counter() - t0
+        self.built = True
+        self.n_builds += 1
+
+    def seeds(self) -> dict[str, int]:
+        """この実行で使う乱数の種（init() で入れ直す scop の種と、各細胞種のノイズの種）。"""
+        return noise_seeds(SCOP_SEED)
+
+    def init(self) -> None:
+        """新規プロセスで実行したときと同じ状態から finitialize する。"""
+        h.dt = h.step_dt      # finitialize より前に設定（後から変えると CoreNEURON 用の内部構造が古くなる）
+        ifluct = h.List("Ifluct1")
+        if ifluct.count() > 0:
+            ifluct.o(0).new_seed(SCOP_SEED)
+        h.finitialize(V_INIT)
+        h.fcurrent()
+
+    def simulate(self, tstop: float | None = None, block_ms: float | None = None,
+                 on_block=None, checkpoint=None, recorders=()) -> str:
+        """
+        初期化して tstop（省略時は h.tstop）まで実行し、実際に使った実行モードを返す。
+
+        on_block を渡すと block_ms ごとに止めて on_block() を呼ぶ（recording.BandPowerRecorder が
+        記録した膜電位をそこで取り出して捨てる）。CoreNEURON では psolve を途中で分けず、
+        終わった後に1回だけ呼ぶ。
+
+        checkpoint（checkpoint.WarmupCheckpoints）を渡すと、刺激前の区間（t_save まで）を
+        保存済みの状態から再開する（無ければ t_save まで実行して保存する）。recorders には
+        この実行で記録しているもの（recording.Probe など）を全部渡す（記録済みの値も一緒に保存・復元する）。
+        """
+        self.init()
+        tstop = h.tstop if tstop is None else tstop
+        reinit = self.init
+        if checkpoint is not None:
+            t_save, key = checkpoint.prepare(self, recorders, tstop)
+            if key is not None:
+                if not checkpoint.restore(key, recorders):
+                    self._advance(t_save, block_ms, on_block, reinit)
+                    checkpoint.save(key, recorders)
+                # recorders に t_save までの記録があるので、psolve の失敗時に t = 0 からやり直さない
+                reinit = None
+        return self._advance(tstop, block_ms, on_block, reinit)
+
+    def _advance(self, t_stop: float, block_ms: float | None, on_block, reinit) -> str:
+        """現在の h.t から t_stop まで実行する（simulate() の本体）。"""
+        if on_block is None or not block_ms or self.run_mode == "coreneuron":
+            mode = run_simulation(t_stop, self.run_mode, reinit=reinit, cell_permute=self.cell_permute)
+            if on_block is not None:
+                on_block()
+            return mode
+
+        t_end = h.t
+        while t_end < t_stop - 0.5 * h.dt:
+            t_end = min(t_end + block_ms, t_stop)
+            run_simulation(t_end, "classic")
+            on_block()
+        return "classic"
@@ -0,0 +1,589 @@
+"""
+網膜回路ネットワークを ParallelContext で複数のプロセス（MPI のランク）に分けて構築・実行するモジュール。
+
+処理:
+- 細胞種ごとに gid を割り当て（パッチごと・細胞種ごとに連番）、ランクに分ける
+    balance="round_robin": gid % ランク数
+    balance="load"       : 細胞ごとの負荷（テンプレートの節ごとのメカニズムの数の和 + 置かれる point process の数）の
+                           大きい順に、その時点で負荷が最も小さいランクへ（どのランクでも同じ結果になる）
+- 自分のランクの細胞だけを作り、入力（PhotoPlay / RPRInput / IinjLT_cone）・ノイズ・スパイク検出器を置く
+- 結合は connectivity.fovea_connections() の表（table を渡したときは mosaic.py の表。細胞数も表のもの）から作り、
+  細胞をまたぐ値は全部 source_var / target_var で渡す
+    リボンシナプス: 前細胞に RibbonRelease / RibbonRelease_R2RB（放出の状態 w）→ 後細胞の RibbonPost.w_pre
+    depsyn        : 前細胞に DepRelease（mod/dep_release.mod。eff）→ 後細胞の RibbonPost（e = -70、g_max × weight）
+    ギャップ結合  : 細胞の soma(0.5) の v → 相手側の GapVar.vgap（mod/gap_var.mod）
+- ランクの中の細胞をさらに threads 本のスレッドに分ける（pc.nthread / pc.partition。thread_balance で分け方を選ぶ）
+    thread_balance="complexity": LoadBalance の cell_complexity（メカニズムごとの計算時間を実測した重みで、
+                                 置かれた point process も含む）の大きい順に、負荷が最も小さいスレッドへ
+    "load" / "round_robin"     : ランクの割り当てと同じ見積もり・分け方
+- pc.psolve で実行し、ON/OFF GC のスパイク時刻（SpikeHyst）をランク 0 に集める
+
+使い方:
+    mpiexec -n 8 python parallel_net.py --set Num_R=4000 --patches 4 -o spikes_R4000.spikes
+    mpiexec -n 4 python parallel_net.py --balance round_robin --tstop 3000
+    python parallel_net.py                         # 1プロセスでも動く
+    python parallel_net.py --threads 8             # 1プロセス・8スレッド
+    mpiexec -n 8 python parallel_net.py --table patch_5mm.npz    # mosaic.py で作った偏心度 5 mm のパッチ
+
+    net = ParallelNetwork({"Num_R": 4000}, patches=2)
+    net.simulate()
+    spikes = net.spikes()       # ランク 0 だけ {細胞名: スパイク時刻}、ほかは None
+
+補足:
+- createcells.hoc / netconnection_fovea.hoc の global な objref 配列・setpointer は使わない（細胞のテンプレートと
+  src/photo_wave.hoc だけを読み込む）。結合の規則・パラメータ・ノイズの系列（IfluctR123 の (細胞種, 番号, noise_trial)）は
+  1プロセスの構築と同じなので、ランク数・分け方を変えても結果は変わらない
+- 1プロセスの構築との違い: ribbon_syn / ribbon_syn_R2RB / depsyn で直接つないでいた結合（Cone -> ONCB / OFFCB、
+  ONCB -> ONGC、OFFCB -> OFFGC、AIIAC -> OFFGC / OFFCB）も放出と後側に分けるので、R2RB などと同じく後側の値が
+  1ステップ遅れる。ギャップ結合は gap_linear によらず GapVar（陽的）
+- パッチ（patches > 1）は同じ回路を独立に並べたもの（パッチどうしはつながない）。パッチ p の細胞 i のノイズの系列は
+  番号 p * 細胞数 + i（パッチ 0 は1プロセスの構築と同じ）。出力の列名は P{p}.ON_GC[i]（パッチが1つなら ON_GC[i]）
+- Ifluct1（noise_r123 = 0）は scop の乱数列をランクごとに使うので、ランク数で結果が変わる（IfluctR123 を使うこと）。
+  スレッドでは使えないので、Ifluct1 があるとき（execution.thread_blockers() が空でないとき）は1スレッドで実行する
+- スレッドをまたぐ値も source_var / target_var で渡すので、スレッド数・分け方を変えても結果は変わらない。
+  細胞は分割しない（multisplit は使わない）。1細胞の負荷がスレッドの平均の負荷より大きいときは警告する
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from neuron import h
+
+from connectivity import POPULATIONS, Family, cell_counts, fovea_connections, in_degree
+from execution import (coreneuron_blockers, partition_threads, report_fallback, run_coreneuron,
+                       thread_blockers, thread_times)
+from network import PARAM_PATH, V_INIT, effective_params, load_model
+from recording import RECORD_START_MS, SPIKE_THR_HI, SPIKE_THR_LO
+
+# 細胞種 → テンプレート（createcells.hoc と同じ）
+TEMPLATES = {
+    "Rods":    "Rod",
+    "Cones":   "Cone",
+    "R_BC":    "RBC",
+    "ON_CBC":  "ONCB",
+    "OFF_CBC": "OFFCB",
+    "AIIAC":   "AC",
+    "ON_GC":   "GC",
+    "OFF_GC":  "GC",
+}
+# 細胞種 → (Random123 の1つ目の番号（createcells.hoc の NOISE_ID_*）, ノイズのパラメータ名の末尾)
+NOISE = {
+    "Rods":    (1, "R"),
+    "Cones":   (2, "C"),
+    "R_BC":    (3, "RBC"),
+    "ON_CBC":  (4, "ONCBC"),
+    "OFF_CBC": (5, "OFFCBC"),
+    "AIIAC":   (6, "AC"),
+    "ON_GC":   (7, "ONGC"),
+    "OFF_GC":  (8, "OFFGC"),
+}
+# スパイクを記録する細胞種
+SPIKE_POPS = ("ON_GC", "OFF_GC")
+
+# 放出側に入れるパラメータ（属性 → parameters_new.hoc の {属性}_{結合名}。netconnection_fovea.hoc と同じもの。
+# act / p1 / p2 は INITIAL で決まるので入れない）
+RELEASE_ATTRS = {
+    "R2RB":        ("v_th", "v_slp", "alpha", "beta"),
+    "C2ONCB":      ("v_th", "v_slp", "alpha", "beta", "tau_1A"),
+    "C2OFFCB":     ("v_th", "v_slp", "alpha", "beta", "tau_1A", "tau_21", "tau_A3"),
+    "RBC2AC":      ("v_th", "v_slp", "alpha", "beta", "tau_1A", "tau_21", "tau_A3"),
+    "ONCB2ONGC":   ("v_th", "v_slp", "tau_1A", "tau_21", "tau_A3"),
+    "OFFCB2OFFGC": ("v_th", "v_slp", "tau_1A", "tau_21", "tau_A3"),
+    "OFFCB2AC":    (),
+    "AC2OFFGC":    ("v_th", "v_slp", "tau_e", "tau_r", "u"),
+    "AC2OFFCB":    ("v_th", "v_slp", "tau_e", "tau_r", "u"),
+}
+# depsyn の逆転電位（mod/depsyn.mod の既定値。netconnection_fovea.hoc は e を変えていない）
+DEPSYN_E = -70.0
+# 放出のメカニズムの GLOBAL exact（syn_update_set() と同じもの + DepRelease）
+EXACT_GLOBALS = ("exact_ribbon_syn", "exact_ribbon_syn_R2RB", "exact_RibbonRelease",
+                 "exact_RibbonRelease_R2RB", "exact_depsyn", "exact_DepRelease")
+# rate_table_set() と同じ
+RATE_TABLE_GLOBALS = ("usetable_spike2", "usetable_Kvpub", "usetable_Kv_conepub", "usetable_h_conepub")
+# 負荷の見積もりで point process 1つを何単位とみなすか（節1つのメカニズム1つ = 1）
+PP_COST = 1.0
+
+BALANCE = ("load", "round_robin")
+THREAD_BALANCE = ("complexity",) + BALANCE
+
+
+class GidLayout:
+    """パッチ → 細胞種 → 番号 の順に gid を連番で振る（0 から len(layout) - 1）。"""
+
+    def __init__(self, counts: dict[str, int], patches: int = 1):
+        self.counts = {pop: int(counts[pop]) for pop in POPULATIONS}
+        self.patches = int(patches)
+        self.base = {}
+        offset = 0
+        for pop, n in self.counts.items():
+            self.base[pop] = offset
+            offset += n
+        self.per_patch = offset
+
+    def __len__(self) -> int:
+        return self.per_patch * self.patches
+
+    def gid(self, patch: int, pop: str, i):
+        """(パッチ, 細胞種, 番号) → gid（i は配列でもよい）。"""
+        return patch * self.per_patch + self.base[pop] + i
+
+    def locate(self, gid: int) -> tuple[int, str, int]:
+        """gid → (パッチ, 細胞種, 番号)。"""
+        patch, rest = divmod(int(gid), self.per_patch)
+        for pop, base in reversed(self.base.items()):
+            if rest >= base and self.counts[pop]:
+                return patch, pop, rest - base
+        raise IndexError(gid)
+
+    def name(self, gid: int) -> str:
+        patch, pop, i = self.locate(gid)
+        return f"{pop}[{i}]" if self.patches == 1 else f"P{patch}.{pop}[{i}]"
+
+
+def template_costs() -> dict[str, float]:
+    """テンプレートごとの負荷（節ごとの 1 + メカニズムの数 の和）。1つずつ作って数え、すぐ消す。"""
+    costs = {}
+    for tem in dict.fromkeys(TEMPLATES.values()):
+        cell = getattr(h, tem)()
+        costs[tem] = float(sum(1 + sum(1 for _ in seg)
+                               for sec in h.allsec() if sec.cell() == cell for seg in sec))
+        del cell
+    return {pop: costs[tem] for pop, tem in TEMPLATES.items()}
+
+
+def cell_costs(layout: GidLayout, fams: list[Family], tem_costs: dict[str, float]) -> np.ndarray:
+    """gid → 負荷の見積もり（テンプレートの負荷 + 置かれる point process の数 × PP_COST）。"""
+    deg = in_degree(fams, layout.counts)
+    one = np.concatenate([tem_costs[pop] + PP_COST * (deg[pop] + 1) for pop in POPULATIONS])   # +1 はノイズ
+    return np.tile(one, layout.patches)
+
+
+def assign_ranks(costs: np.ndarray, nhost: int, balance: str = "load") -> np.ndarray:
+    """gid → ランク（スレッドの割り当てにも使う。そのときは nhost がスレッド数）。"""
+    if balance not in BALANCE:
+        raise ValueError(f"balance must be one of {BALANCE}, got {balance!r}")
+    n = len(costs)
+    if balance == "round_robin" or nhost == 1:
+        return np.arange(n, dtype=np.int64) % nhost
+    ranks = np.empty(n, dtype=np.int64)
+    heap = [(0.0, r) for r in range(nhost)]
+    # 負荷の大きい順（同じなら gid の順）に、負荷が最も小さいランクへ
+    for gid in np.lexsort((np.arange(n), -costs)):
+        load, r = heapq.heappop(heap)
+        ranks[gid] = r
+        heapq.heappush(heap, (load + float(costs[gid]), r))
+    return ranks
+
+
+def cell_complexity(cells: list) -> np.ndarray:
+    """
+    細胞ごとの LoadBalance.cell_complexity（multisplit の負荷分散と同じ重み）。
+
+    メカニズムごとの重みは ExperimentalMechComplex で実測する（結果は mcomplex.dat に保存され、次からはそれを読む）。
+    """
+    h.load_file("loadbal.hoc")
+    lb = h.LoadBalance()
+    lb.ExperimentalMechComplex()
+    return np.array([lb.cell_complexity(sec=h.SectionRef(sec=cell.soma).root) for cell in cells], dtype=float)
+
+
+class ParallelNetwork:
+    """ランクごとに自分の細胞だけを持つネットワーク（どのランクでも同じ引数で作ること）。"""
+
+    def __init__(self, overrides: dict | None = None, patches: int = 1, balance: str = "load",
+                 threads: int = 1, thread_balance: str = "complexity", param_path: Path = PARAM_PATH,
+                 table=None):
+        load_model()
+        self.pc = h.ParallelContext()
+        self.rank = int(self.pc.id())
+        self.nhost = int(self.pc.nhost())
+        self.table = None
+        self.overrides = dict(overrides or {})
+        if table is not None:
+            from mosaic import load_table   # scipy は表を使うときだけ
+            self.table = load_table(table)
+            self.overrides = self.table.with_counts(self.overrides)
+        self.params = effective_params(self.overrides, Path(param_path).read_text(encoding="utf-8"))
+        h.dt = h.step_dt
+        for tem in dict.fromkeys(TEMPLATES.values()):
+            h.load_file(f"cell/{tem}.tem")
+        h.load_file("src/photo_wave.hoc")
+
+        self.fams = fovea_connections(self.params) if self.table is None else self.table.families(self.params)
+        self.layout = GidLayout(cell_counts(self.params), patches)
+        self.costs = cell_costs(self.layout, self.fams, template_costs())
+        self.ranks = assign_ranks(self.costs, self.nhost, balance)
+        self.balance = balance
+        if thread_balance not in THREAD_BALANCE:
+            raise ValueError(f"thread_balance must be one of {THREAD_BALANCE}, got {thread_balance!r}")
+        self.thread_balance = thread_balance
+        self.nthread = int(threads)
+        self.thread_of: dict[int, int] = {}     # gid → スレッド
+        self.thread_costs = np.zeros(1)
+        self.cells: dict[int, object] = {}
+        self._objs: list = []          # point process・NetCon などを生かしておく
+        self._spike_t = h.Vector()
+        self._spike_gid = h.Vector()
+        self.timings: dict[str, float] = {}
+        self._build()
+
+    # --- 構築 ---
+    def owned(self, gids) -> np.ndarray:
+        """gids のうち自分のランクのものか（配列）。"""
+        return self.ranks[np.asarray(gids, dtype=np.int64)] == self.rank
+
+    def cell(self, pop: str, i: int, patch: int = 0):
+        """自分のランクにあればその細胞（なければ None）。Probe などを付けるときに使う。"""
+        return self.cells.get(int(self.layout.gid(patch, pop, i)))
+
+    def _timed(self, name: str, fn) -> None:
+        t0 = time.perf_counter()
+        fn()
+        self.timings[name] = time.perf_counter() - t0
+
+    def _build(self) -> None:
+        self.pc.gid_clear()
+        self._timed("cells", self._create_cells)
+        self._timed("globals", self._set_globals)
+        self._timed("inputs", self._inputs)
+        self._timed("noise", self._noise)
+        self._timed("synapses", self._synapses)
+        self._timed("gaps", self._gaps)
+        self._timed("threads", self._partition_threads)
+        self._timed("setup_transfer", self.pc.setup_transfer)
+
+    def _create_cells(self) -> None:
+        for gid in np.flatnonzero(self.ranks == self.rank):
+            gid = int(gid)
+            _, pop, _ = self.layout.locate(gid)
+            cell = getattr(h, TEMPLATES[pop])()
+            self.cells[gid] = cell
+            self.pc.set_gid2node(gid, self.rank)
+            if pop in SPIKE_POPS:
+                # recording.SpikeRecorder と同じ検出器（RECORD_START_MS で検出を許可し直す）
+                det = h.SpikeHyst(cell.soma(0.5))
+                det.thr_hi = SPIKE_THR_HI
+                det.thr_lo = SPIKE_THR_LO
+                det.t_arm = RECORD_START_MS
+                nc = h.NetCon(det, None)
+                self.pc.cell(gid, nc)
+                self._objs += [det, nc]
+        self.pc.spike_record(-1, self._spike_t, self._spike_gid)
+
+    def _set_globals(self) -> None:
+        for name in RATE_TABLE_GLOBALS:
+            setattr(h, name, h.rate_tables)
+        for name in EXACT_GLOBALS:
+            setattr(h, name, h.syn_exact)
+
+    def _local(self, pop: str):
+        """自分のランクにある pop の細胞（(パッチ, 番号, 細胞) の列）。"""
+        for gid, cell in self.cells.items():
+            patch, p, i = self.layout.locate(gid)
+            if p == pop:
+                yield patch, i, cell
+
+    def _inputs(self) -> None:
+        """createcells.hoc の iclamps(AMP) と同じ入力。"""
+        rods = list(self._local("Rods"))
+        if h.photo_play:
+            sgids = self._photo_sources() if rods else None
+            for _, _, cell in rods:
+                # Dim を先に作る（photo_iclamps() と同じ順）
+                for amp, ss, sgid in ((h.amp_Dim, 0.001 * h.ssI_Dim, sgids[1]), (h.AMP, 0.04, sgids[0])):
+                    pp = h.PhotoPlay(cell.soma(0.5))
+                    pp.ss = ss
+                    pp.amp = amp
+                    self.pc.target_var(pp, pp._ref_wave, sgid)
+                    self._objs.append(pp)
+        else:
+            for _, _, cell in rods:
+                rpr = h.RPRInput(cell.soma(0.5))
+                rpr.amp, rpr.num, rpr.ton, rpr.toff = h.AMP, h.num_stim, h.ton_stim, h.toff_stim
+                setattr(rpr, "del", h.stim)   # del は Python の予約語
+                dim = h.IinjLTDim(cell.soma(0.5))
+                dim.num, dim.ton, dim.toff, dim.ssI, dim.amp = h.num_Dim, h.ton_Dim, h.toff_Dim, h.ssI_Dim, h.amp_Dim
+                setattr(dim, "del", h.stim_Dim)
+                self._objs += [rpr, dim]
+
+        for _, _, cell in self._local("Cones"):
+            pp = h.IinjLT_cone(cell.soma(0.5))
+            pp.amp, pp.num, pp.ton, pp.toff, pp.ssI = h.AMP, h.num_stim2C, h.ton_C, h.toff_C, h.ssI_C
+            setattr(pp, "del", h.stim_C)
+            self._objs.append(pp)
+
+    def _photo_sources(self) -> tuple[int, int]:
+        """このランク用の PhotoWave（R, Dim）を作り、その sgid を返す（photo_iclamps() の前半と同じ波形）。"""
+        tend = max(h.photo_end(h.stim, h.ton_stim, h.toff_stim, h.num_stim),
+                   h.photo_end(h.stim_Dim, h.ton_Dim, h.toff_Dim, h.num_Dim))
+        h.photo_time(tend)
+        sec = h.Section(name="photo_src")
+        sec.nseg = 2
+        sgid0 = self._sgid_block(len(self.fams) + 1) + 2 * self.rank
+        waves = (h.photo_wave(0, h.stim, h.ton_stim, h.toff_stim, h.num_stim),
+                 h.photo_wave(1, h.stim_Dim, h.ton_Dim, h.toff_Dim, h.num_Dim))
+        for k, (x, wave) in enumerate(zip((0.25, 0.75), waves)):
+            src = h.PhotoWave(sec(x))
+            wave.play(src._ref_wave, h.photo_t, 1)
+            self.pc.source_var(src._ref_wave, sgid0 + k, sec=sec)
+            self._objs += [src, wave]
+        self._objs.append(sec)
+        return sgid0, sgid0 + 1
+
+    def _noise(self) -> None:
+        """createcells.hoc の noise() / noise_set() と同じノイズ。"""
+        for gid, cell in self.cells.items():
+            patch, pop, i = self.layout.locate(gid)
+            noise_id, suffix = NOISE[pop]
+            if h.noise_r123:
+                pp = h.IfluctR123(cell.soma(0.5))
+            else:
+                pp = h.Ifluct1(cell.soma(0.5))
+            pp.m = getattr(h, f"noise_mean_{suffix}")
+            pp.s = getattr(h, f"noise_std_{suffix}")
+            pp.tau = getattr(h, f"tau_noise_{suffix}")
+            if h.noise_r123:
+                pp.noiseFromRandom123(noise_id, patch * self.layout.counts[pop] + i, h.noise_trial)
+            else:
+                pp.seed = getattr(h, f"seed_noise_{suffix}")
+            self._objs.append(pp)
+
+    def _sgid_block(self, k: int) -> int:
+        """source_var の番号の区画（0: 細胞の膜電位 = gid、1..: 結合の種類ごとの放出 = 区画 + 前細胞の gid）。"""
+        return k * len(self.layout)
+
+    def _synapses(self) -> None:
+        for k, fam in enumerate(self.fams):
+            if fam.kind == "gap":
+                continue
+            block = self._sgid_block(k + 1)
+            attrs = RELEASE_ATTRS[fam.name]
+            mech, var = ("DepRelease", "eff") if fam.kind == "depsyn" else (fam.release, "w")
+            for patch in range(self.layout.patches):
+                pre_gids = self.layout.gid(patch, fam.pre, np.unique(fam.pre_idx))
+                for gid in pre_gids[self.owned(pre_gids)]:
+                    sec = self.cells[int(gid)].soma
+                    rel = getattr(h, mech)(sec(1))
+                    for attr in attrs:
+                        setattr(rel, attr, getattr(h, f"{attr}_{fam.name}"))
+                    self.pc.source_var(getattr(rel, f"_ref_{var}"), block + int(gid), sec=sec)
+                    self._objs.append(rel)
+
+                post_gids = self.layout.gid(patch, fam.post, fam.post_idx)
+                pre_gids = self.layout.gid(patch, fam.pre, fam.pre_idx)
+                for e in np.flatnonzero(self.owned(post_gids)):
+                    post = h.RibbonPost(self.cells[int(post_gids[e])].soma(1))
+                    post.g_max = fam.g[e] * fam.weight
+                    if fam.kind == "depsyn":
+                        post.e = DEPSYN_E
+                    self.pc.target_var(post, post._ref_w_pre, block + int(pre_gids[e]))
+                    self._objs.append(post)
+
+    def _gaps(self) -> None:
+        sources = set()
+        for fam in self.fams:
+            if fam.kind != "gap":
+                continue
+            for patch in range(self.layout.patches):
+                a = self.layout.gid(patch, fam.pre, fam.pre_idx)
+                b = self.layout.gid(patch, fam.post, fam.post_idx)
+                sides = [(a, b)] + ([(b, a)] if fam.sym else [])
+                for here, there in sides:
+                    for e in np.flatnonzero(self.owned(here)):
+                        gap = h.GapVar(self.cells[int(here[e])].soma(0.5))
+                        gap.g = fam.g[e]
+                        self.pc.target_var(gap, gap._ref_vgap, int(there[e]))
+                        self._objs.append(gap)
+                    sources.update(int(g) for g in there[self.owned(there)])
+        for gid in sorted(sources):
+            sec = self.cells[gid].soma
+            self.pc.source_var(sec(0.5)._ref_v, gid, sec=sec)
+
+    def set_threads(self, nthread: int, thread_balance: str | None = None) -> int:
+        """構築済みのネットワークをスレッドに分け直し、実際のスレッド数を返す（全ランクで呼ぶこと）。"""
+        if thread_balance is not None:
+            if thread_balance not in THREAD_BALANCE:
+                raise ValueError(f"thread_balance must be one of {THREAD_BALANCE}, got {thread_balance!r}")
+            self.thread_balance = thread_balance
+        self.nthread = int(nthread)
+        self._timed("threads", self._partition_threads)
+        self._timed("setup_transfer", self.pc.setup_transfer)
+        return self.nthread
+
+    def _partition_threads(self) -> None:
+        if self.nthread > 1:
+            blockers = thread_blockers()
+            if blockers:
+                print(f"[THREADS] rank {self.rank}: 1 スレッドで実行します:")
+                for b in blockers:
+                    print(f"  - {b}")
+                self.nthread = 1
+        # スレッドの数は全ランクで揃える（1つのランクでも使えなければ全ランクで1スレッド。thread_report() の表示のため）
+        self.nthread = int(self.pc.allreduce(float(self.nthread), 3))
+
+        gids = sorted(self.cells)
+        if self.thread_balance == "complexity" and gids and self.nthread > 1:
+            costs = cell_complexity([self.cells[g] for g in gids])
+        else:
+            costs = self.costs[np.asarray(gids, dtype=np.int64)]
+        balance = "round_robin" if self.thread_balance == "round_robin" else "load"
+        threads = assign_ranks(costs, self.nthread, balance)
+        self.thread_of = dict(zip(gids, (int(i) for i in threads)))
+        self.thread_costs = np.bincount(threads, weights=costs, minlength=self.nthread)
+        if self.nthread > 1 and len(costs) and costs.max() > self.thread_costs.mean():
+            print(f"[THREADS] rank {self.rank}: 1細胞の負荷 {costs.max():.0f} がスレッドの平均 "
+                  f"{self.thread_costs.mean():.0f} より大きい（細胞を分けないと速くならない）")
+
+        # 根の section をスレッドに（photo_src など細胞に属さないものはスレッド 0）
+        thread_by_cell = {self.cells[g].hname(): i for g, i in self.thread_of.items()}
+        roots = [[] for _ in range(self.nthread)]
+        for sec in h.allsec():
+            if sec.parentseg() is None:
+                cell = sec.cell()
+                roots[thread_by_cell.get(cell.hname(), 0) if cell is not None else 0].append(sec)
+        partition_threads(roots)
+
+    # --- 実行 ---
+    def simulate(self, tstop: float | None = None, run_mode: str = "classic") -> str:
+        """全ランクで初期化して tstop（省略時は h.tstop）まで実行し、実際に使った実行モードを返す。"""
+        tstop = h.tstop if tstop is None else tstop
+        self._spike_t.resize(0)
+        self._spike_gid.resize(0)
+        h.dt = h.step_dt
+        h.finitialize(V_INIT)
+        if run_mode == "coreneuron":
+            # 使えない理由はランクごとに違いうる（置かれたメカニズムが違う）ので、1つでもあれば全ランクで classic
+            blockers = coreneuron_blockers()
+            if self.pc.allreduce(float(bool(blockers)), 2) == 0:
+                run_coreneuron(tstop)
+                return "coreneuron"
+            if blockers:
+                report_fallback([f"rank {self.rank}: {b}" for b in blockers])
+        self.pc.set_maxstep(10)
+        self.pc.psolve(tstop)
+        return "classic"
+
+    def spikes(self) -> dict[str, np.ndarray] | None:
+        """ランク 0 では 細胞名 → スパイク時刻（SPIKE_POPS の全細胞、gid の順）、ほかのランクでは None。"""
+        t = np.array(self._spike_t)
+        gid = np.array(self._spike_gid, dtype=np.int64)
+        local = {int(g): t[gid == g] for g in self.cells if self.layout.locate(g)[1] in SPIKE_POPS}
+        parts = self.pc.py_gather(local, 0)
+        if self.rank != 0:
+            return None
+        merged = {}
+        for part in parts:
+            merged.update(part)
+        return {self.layout.name(g): merged[g] for g in sorted(merged)}
+
+    def load_report(self) -> list[dict] | None:
+        """ランクごとの細胞数・point process の数・負荷の見積もり・構築時間（ランク 0 だけ。ほかは None）。"""
+        mine = {"rank": self.rank, "cells": len(self.cells), "point_processes": len(self._objs),
+                "cost": float(self.costs[self.ranks == self.rank].sum()), "build_s": dict(self.timings)}
+        return self.pc.py_gather(mine, 0) if self.nhost > 1 else [mine]
+
+    def thread_report(self) -> list[dict] | None:
+        """
+        ランク・スレッドごとの細胞数・負荷の見積もり・直前の実行の計算時間（ランク 0 だけ。ほかは None）。
+
+        負荷の見積もりは thread_balance の重み（"complexity" なら cell_complexity）。
+        """
+        ctime = thread_times()
+        counts = np.bincount(np.fromiter(self.thread_of.values(), dtype=np.int64, count=len(self.thread_of)),
+                             minlength=self.nthread)
+        mine = [{"rank": self.rank, "thread": i, "cells": int(counts[i]), "cost": float(self.thread_costs[i]),
+                 "ctime_s": ctime[i] if i < len(ctime) else 0.0} for i in range(self.nthread)]
+        if self.nhost == 1:
+            return mine
+        parts = self.pc.py_gather(mine, 0)
+        return None if self.rank != 0 else [row for part in parts for row in part]
+
+
+def print_load(report: list[dict]) -> None:
+    total = sum(r["cost"] for r in report) or 1.0
+    print(f"{'rank':>5} {'cells':>7} {'pp':>8} {'cost':>10} {'share':>6} {'build (s)':>10}")
+    for r in report:
+        print(f"{r['rank']:>5} {r['cells']:>7} {r['point_processes']:>8} {r['cost']:>10.0f} "
+              f"{r['cost'] / total:>6.1%} {sum(r['build_s'].values()):>10.2f}")
+
+
+def print_threads(report: list[dict]) -> None:
+    total = sum(r["cost"] for r in report) or 1.0
+    total_t = sum(r["ctime_s"] for r in report) or 1.0
+    print(f"{'rank':>5} {'thread':>6} {'cells':>7} {'cost':>10} {'share':>6} {'ctime (s)':>10} {'share':>6}")
+    for r in report:
+        print(f"{r['rank']:>5} {r['thread']:>6} {r['cells']:>7} {r['cost']:>10.0f} {r['cost'] / total:>6.1%} "
+              f"{r['ctime_s']:>10.2f} {r['ctime_s'] / total_t:>6.1%}")
+
+
+def _parse_set(items: list[str]) -> dict:
+    out = {}
+    for item in items:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--set expects NAME=VALUE, got {item!r}")
+        out[name.strip()] = value.strip()   # hoc の式としてそのまま渡す（network.format_value）
+    return out
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build and run the retina network across ParallelContext ranks.")
+    ap.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                    help="override a parameter of parameters_new.hoc (repeatable)")
+    ap.add_argument("--patches", type=int, default=1, help="independent copies of the circuit")
+    ap.add_argument("--table", type=Path, default=None, help=".npz connectivity table written by mosaic.py")
+    ap.add_argument("--balance", choices=BALANCE, default="load")
+    ap.add_argument("--threads", type=int, default=1, help="threads per rank (pc.nthread)")
+    ap.add_argument("--thread-balance", choices=THREAD_BALANCE, default="complexity")
+    ap.add_argument("--run-mode", choices=("classic", "coreneuron"), default="classic")
+    ap.add_argument("--tstop", type=float, default=None, help="ms (default: tstop of parameters_new.hoc)")
+    ap.add_argument("-o", "--output", type=Path, default=None, help=".spikes file written by rank 0")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    net = ParallelNetwork(_parse_set(args.set), patches=args.patches, balance=args.balance,
+                          threads=args.threads, thread_balance=args.thread_balance, table=args.table)
+    net.pc.barrier()
+    t_build = time.perf_counter() - t0
+    report = net.load_report()
+    if net.rank == 0:
+        print(f"[PARALLEL] {net.nhost} ranks x {net.nthread} threads, {len(net.layout)} cells "
+              f"({args.patches} patches), balance={args.balance}, build {t_build:.1f} s")
+        print_load(report)
+
+    t0 = time.perf_counter()
+    used_mode = net.simulate(args.tstop, args.run_mode)
+    t_run = time.perf_counter() - t0
+    spikes = net.spikes()
+    threads = net.thread_report() if net.nthread > 1 else None
+    if net.rank == 0:
+        if threads is not None:
+            print_threads(threads)
+        n_spk = sum(len(v) for v in spikes.values())
+        print(f"[PARALLEL] run mode: {used_mode}, run {t_run:.1f} s, {n_spk} spikes in {len(spikes)} cells")
+        if args.output is not None:
+            from traces import write_spikes
+            meta = {"params": {k: str(v) for k, v in net.overrides.items()}, "patches": args.patches,
+                    "nhost": net.nhost, "nthread": net.nthread, "balance": args.balance, "run_mode": used_mode,
+                    "param_file": "parameters_new.hoc"}
+            if net.table is not None:
+                meta["table"] = {"path": str(args.table), **net.table.meta}
+            tstop = h.tstop if args.tstop is None else args.tstop
+            write_spikes(args.output, spikes, RECORD_START_MS, tstop, meta=meta)
+            print(f"[PARALLEL] -> {args.output}")
+    net.pc.barrier()
+    return 0
+
+
+if __name__ == "__main__":
+    h.nrnmpi_init()   # mpiexec で起動したときは MPI を使う（ParallelContext を作る前に呼ぶ）
+    status = main()
+    if h.ParallelContext().nhost() > 1:
+        h.quit()
+    raise SystemExit(status)
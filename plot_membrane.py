@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-フォルダ内の波形txt(CSV形式・2列)を一括で読み込み、
+フォルダ内の波形（.trace バイナリ、または CSV形式・2列の txt）を一括で読み込み、
 時間(ms)–膜電位(mV)の折れ線グラフを作って、各ファイルと同名のPDFを保存
 （xlim/ylimで表示範囲を固定、必要ならサブフォルダも探索）
 """
@@ -13,9 +13,11 @@ import re
 import sys
 from typing import Iterable, Optional, Tuple
 
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 
+from traces import load_trace, prefer_binary
+
 TARGET = "AIIAC"
 # TARGET = "ON_GC"
 # === USER CONFIG (edit here once) ============================================
@@ -26,16 +28,17 @@ TARGET = "AIIAC"
 # ROOT_DIR: str = "Dim_AIIAC_fovea"
 ROOT_DIR: str = "Dim_AIIAC_8-9M_gRBC2ACx_gjAC2CBy"
 RECURSIVE: bool = False      # True to also search subfolders
-# PATTERN: str = f"{TARGET}_R*_C*.txt"
-PATTERN: str = f"{TARGET}_x*_y*.txt"
+# PATTERN: str = f"{TARGET}_R*_C*.*"
+PATTERN: str = f"{TARGET}_x*_y*.*"     # .trace / .txt（同名があれば .trace）
 # PATTERN: str = "RBC_R*_C*.txt"
 # PATTERN: str = "ONCB_R*_C*.txt"
 # PATTERN: str = f"{TARGET}_R*_C*.txt"
+CELL: str = f"{TARGET}[0]"   # バンドル（複数細胞を1ファイルにまとめた出力）から描く列
 XLIM: Optional[Tuple[float, float]] = (1000, 1300)   # e.g., (1000, 6000) or None
 YLIM: Optional[Tuple[float, float]] =(-65, -40) # e.g., (-70, -40) or None
 # ============================================================================
 
-FILENAME_RE = re.compile(rf"^{TARGET}_R(\d+)_C(\d+)\.txt$", re.IGNORECASE)
+FILENAME_RE = re.compile(rf"^{TARGET}_R(\d+)_C(\d+)\.(?:trace|txt)$", re.IGNORECASE)
 # FILENAME_RE = re.compile(r"^RBC_R(\d+)_C(\d+)\.txt$", re.IGNORECASE)
 # FILENAME_RE = re.compile(r"^ONCB_R(\d+)_C(\d+)\.txt$", re.IGNORECASE)
 
@@ -52,28 +55,18 @@ def parse_rc_from_name(path: Path) -> Tuple[int, int]:
 
 
 def iter_files(folder: Path, pattern: str, recursive: bool) -> Iterable[Path]:
-    if recursive:
-        files = sorted(folder.rglob(pattern), key=parse_rc_from_name)
-    else:
-        files = sorted(folder.glob(pattern), key=parse_rc_from_name)
-    return [p for p in files if p.is_file()]
+    it = folder.rglob(pattern) if recursive else folder.glob(pattern)
+    files = prefer_binary(p for p in it if p.is_file())
+    return sorted(files, key=parse_rc_from_name)
 
 
-def read_trace(txt_path: Path) -> Tuple[pd.Series, pd.Series]:
-    """Read a two-column CSV with a header. Return (time_ms, voltage_mV)."""
+def read_trace(txt_path: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """Read a .trace file or a two-column CSV with a header. Return (time_ms, voltage_mV)."""
     try:
-        df = pd.read_csv(txt_path, comment="#")
+        return load_trace(txt_path, CELL)
     except Exception as e:
         raise RuntimeError(f"Failed to read {txt_path}: {e}")
 
-    if df.shape[1] < 2:
-        raise ValueError(f"{txt_path} does not have at least two columns")
-
-    # Be robust to exact column names; assume first two columns are time and voltage
-    time_col = df.columns[0]
-    volt_col = df.columns[1]
-    return df[time_col], df[volt_col]
-
 
 def plot_and_save_pdf(txt_path: Path, out_pdf: Optional[Path] = None,
                       xlim: Optional[Tuple[float, float]] = None,
@@ -85,7 +78,7 @@ def plot_and_save_pdf(txt_path: Path, out_pdf: Optional[Path] = None,
 
     fig = plt.figure(figsize=(6, 4))
     ax = fig.add_subplot(111)
-    ax.plot(t_ms.values, v_mV.values)
+    ax.plot(t_ms, v_mV)
     ax.set_xlabel("Time (ms)")
     ax.set_ylabel("Membrane potential (mV)")
 
@@ -119,7 +112,7 @@ def resolve_default_folder(cli_folder: Optional[Path]) -> Path:
 def main(argv: Optional[Iterable[str]] = None) -> int:
     p = argparse.ArgumentParser(description="Batch-plot AIIAC traces to PDFs.")
     p.add_argument("folder", nargs="?", type=Path, default=None,
-                   help="Folder with AIIAC_R*_C*.txt (default: CONFIG ROOT_DIR or script folder)")
+                   help="Folder with AIIAC_R*_C*.trace/.txt (default: CONFIG ROOT_DIR or script folder)")
     p.add_argument("--pattern", default=PATTERN,
                    help=f"Glob pattern to match files (default: {PATTERN!r})")
     # Note: nargs=2 cannot have a tuple default. We'll merge CLI with CONFIG below.
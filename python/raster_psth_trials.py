@@ -4,15 +4,23 @@
 
 処理:
 - data/ON_GC/ON_GC[0]_v_{amp}_{trial}.txt (trial=1..n_trials) を読み込む
+  （同名の .spikes があれば、記録済みのスパイク時刻をそのまま使う）
 - start_time〜end_time の範囲で、電位が閾値を跨いだ時刻をスパイクとして検出
 - Raster: (trial番号, spike_time) を点で描画 → data/raster_ONGC_{amp}.pdf
 - PSTH : 全試行のスパイク時刻をヒストグラム化 → data/PSTH_ONGC_{amp}.pdf
 """
 
+import sys
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+# リポジトリ直下の traces.py を使う（python/ から実行しても import できるように）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from traces import open_spikes
+
 # 解析パラメータの設定
 start_time = 1000    # 解析開始時刻 [ms]
 end_time = 6000      # 解析終了時刻 [ms]
@@ -34,6 +42,15 @@ amp = 10
 # 各試行のファイルを読み込み、スパイク検出
 for trial in range(1, n_trials + 1):
     filename = f'data/ON_GC/ON_GC[0]_v_{int(amp)}_{trial}.txt'
+    spikes_path = Path(filename).with_suffix(".spikes")
+    if spikes_path.exists():
+        # SpikeHyst で記録したスパイク時刻（閾値 0 mV を上に越えた時刻。-20 mV のヒステリシス付き）
+        spike_times = list(open_spikes(spikes_path).window("ON_GC[0]", start_time, end_time))
+        all_spike_times.extend(spike_times)
+        raster_data.extend((trial, st) for st in spike_times)
+        print(f"Trial {trial}: {len(spike_times)} spikes detected.")
+        continue
+
     # CSVファイルを読み込み（ヘッダー行がある前提）
     df = pd.read_csv(filename)
     
@@ -0,0 +1,402 @@
+"""
+NEURON の Vector.record を使って、膜電位やシナプス変数を一括で記録するモジュール。
+
+処理:
+- 記録したい変数（soma の v、point process の p1 / g / i など）に h.Vector().record を設定
+- h.continuerun(tstop) で1回にまとめて実行（Python側で fadvance を1ステップずつ回さない）
+- t >= RECORD_START_MS の区間だけ切り出して、テキスト（.txt）かバイナリ（.trace）へ一括で書き出し
+
+使い方（init.py / init_syn.py から）:
+    probe = Probe.soma(h.OFF_GC[0], "v", record_dt=h.step_dt)
+    h.finitialize()            # 記録は finitialize 時に開始される
+    run(h.tstop)
+    t, v = probe.window(RECORD_START_MS)
+    write_trace_txt("OFF_GC_400.txt", t, v, header="time(ms),voltage(mV)")
+    save_trace("OFF_GC_400.trace", t, v, header="time(ms),voltage(mV)")   # 拡張子で書式を選ぶ
+
+複数の細胞種をまとめて記録する（1回の実行 → 1つのバンドル）:
+    spec = RecordSpec({"AIIAC": "all", "ON_GC": [0], "OFF_GC": "0:5"})
+    bundle = spec.probes(per_step=False)      # 構築後（Num_R などが決まった後）に作る
+    h.finitialize(); run(h.tstop)
+    t, V = bundle.window(RECORD_START_MS)     # V は (サンプル数, 細胞数)。列名は bundle.columns
+    save_trace("BUNDLE_R400_C20.trace", t, V, header=bundle.header)
+
+GC のスパイク時刻だけを記録する（膜電位は保存しない）:
+    spikes = SpikeRecorder(RecordSpec({"ON_GC": "all", "OFF_GC": "all"}))
+    h.finitialize(); run(h.tstop)
+    write_spikes("BUNDLE_R400_C20.spikes", spikes.spikes(), RECORD_START_MS, h.tstop)
+
+AIIAC の 5–15 Hz バンドパワーだけを実行中に計算する（膜電位は保存しない）:
+    rec = BandPowerRecorder(RecordSpec({"AIIAC": "all"}), t_stop=h.tstop)
+    net.simulate(block_ms=rec.block_ms, on_block=rec.on_block)
+    write_bandpower("PSD_R400_C20.psd", rec.summary())
+
+補足:
+- record_dt は step_dt の整数倍を想定（step_dt と同じなら従来の1ステップごとの出力と同じ時刻列）
+- 時刻は t = k * record_dt として暗黙的に復元する（時刻用の Vector は持たない）
+- CoreNEURON は Dt 付きの Vector.record を転送しないので、per_step=True で毎ステップ記録し、
+  取り出すときに record_dt 間隔へ間引く（execution.py の coreneuron モード用）
+"""
+
+from __future__ import annotations
+
+import copy
+from pathlib import Path
+
+import numpy as np
+from neuron import h
+
+from bandpower import BAND_HZ, CROP_MS, BandPowerAccumulator
+from connectivity import POPULATIONS   # 記録できる細胞種（createcells.hoc の配列名） → 細胞数の変数
+from traces import TRACE_SUFFIX, write_spikes, write_trace_arrays
+
+# 従来の出力と同じく 1000 ms 以降だけを保存する
+RECORD_START_MS = 1000.0
+
+# createcells.hoc の noise_set() で使うノイズの乱数の設定（.trace のメタデータに残す）
+# noise_r123 = 1 なら IfluctR123 の系列（細胞種, 番号, noise_trial）、0 なら Ifluct1 の seed_noise_*
+NOISE_SEEDS = ("noise_r123", "noise_trial",
+               "seed_noise_R", "seed_noise_C", "seed_noise_RBC", "seed_noise_ONCBC",
+               "seed_noise_OFFCBC", "seed_noise_AC", "seed_noise_ONGC", "seed_noise_OFFGC")
+
+# スパイク検出の閾値（mGC_firingrate_heatmap.py / src/spike.py の thr_hi / thr_lo と同じ）
+SPIKE_THR_HI = 0.0
+SPIKE_THR_LO = -20.0
+# BandPowerRecorder が膜電位を取り出してバンドパワーに足し込む間隔 (ms)
+BANDPOWER_BLOCK_MS = 250.0
+# SpikeRecorder が使う gid の先頭（他の用途の gid とぶつからないよう大きめにとる）
+SPIKE_GID_BASE = 1_000_000
+
+
+def stable_name(obj) -> str:
+    """
+    hoc オブジェクトの、作り直しても変わらない名前（テンプレート名#今あるものの中での順番）。
+
+    hname() の番号（AC[8] など）は作り直すたびに増えるので、キーには使えない。
+    """
+    template = obj.hname().split("[")[0]
+    objs = h.List(template)
+    for i in range(int(objs.count())):
+        if objs.o(i) == obj:
+            return f"{template}#{i}"
+    return obj.hname()
+
+
+class Probe:
+    """1つの変数を Vector.record で記録するプローブ。"""
+
+    def __init__(self, label: str, ref, record_dt: float, per_step: bool = False,
+                 ident: str | None = None):
+        self.label = label
+        # 作り直しても変わらない名前（チェックポイントのキー用。省略時は label）
+        self.ident = label if ident is None else ident
+        self.record_dt = float(record_dt)
+        self.vec = h.Vector()
+        if per_step:
+            # 毎ステップ記録（CoreNEURON 互換）。h.dt は init() で step_dt に設定済みの前提
+            self.sample_dt = h.dt
+            self.stride = max(1, int(round(self.record_dt / self.sample_dt)))
+            self.vec.record(ref)
+        else:
+            self.sample_dt = self.record_dt
+            self.stride = 1
+            self.vec.record(ref, self.record_dt)
+        self._drained = 0   # drain() で取り出して捨てた生サンプルの数
+
+    @classmethod
+    def soma(cls, cell, var: str = "v", record_dt: float | None = None, x: float = 0.5,
+             per_step: bool = False) -> "Probe":
+        """cell.soma(x) の変数（既定は膜電位 v）を記録する。"""
+        dt = h.step_dt if record_dt is None else record_dt
+        return cls(f"{cell}.soma.{var}", getattr(cell.soma(x), f"_ref_{var}"), dt, per_step,
+                   ident=f"{stable_name(cell)}.soma({x}).{var}")
+
+    @classmethod
+    def point_process(cls, pp, var: str, record_dt: float | None = None,
+                      per_step: bool = False) -> "Probe":
+        """point process（ribbon_syn / depsyn など）の RANGE 変数を記録する。"""
+        dt = h.step_dt if record_dt is None else record_dt
+        return cls(f"{pp}.{var}", getattr(pp, f"_ref_{var}"), dt, per_step,
+                   ident=f"{stable_name(pp)}.{var}")
+
+    def samples(self) -> np.ndarray:
+        """record_dt 間隔に揃えた記録値。"""
+        return self.vec.as_numpy()[::self.stride]
+
+    def times(self) -> np.ndarray:
+        """記録サンプルの時刻 (ms)。"""
+        return np.arange(len(self.samples())) * self.sample_dt * self.stride
+
+    def window(self, t_start: float = RECORD_START_MS) -> tuple[np.ndarray, np.ndarray]:
+        """t >= t_start のサンプルを (time_ms, values) で返す。"""
+        t = self.times()
+        values = self.samples()
+        # 浮動小数の丸めで境界のサンプルを落とさないよう半ステップ分の余裕を持たせる
+        mask = t >= t_start - 0.5 * self.record_dt
+        return t[mask], np.array(values[mask])
+
+    def drain(self) -> tuple[int, np.ndarray]:
+        """
+        前回の drain() 以降に記録された値（record_dt 間隔）と、その先頭のサンプル番号
+        （t = k * record_dt の k）を返し、Vector を空にする（記録はそのまま続く）。
+        """
+        raw = self.vec.as_numpy()
+        first = -self._drained % self.stride
+        values = np.array(raw[first::self.stride])
+        k0 = (self._drained + first) // self.stride
+        self._drained += len(raw)
+        self.vec.resize(0)
+        return k0, values
+
+    def checkpoint_signature(self) -> dict:
+        """チェックポイント（checkpoint.py）のキーに入れる記録の構成。"""
+        return {"kind": "probe", "ident": self.ident, "record_dt": self.record_dt,
+                "sample_dt": self.sample_dt, "stride": self.stride}
+
+    def checkpoint_state(self):
+        """ここまでに記録した値（チェックポイントに保存する）。"""
+        return np.array(self.vec), self._drained
+
+    def restore_checkpoint(self, state) -> None:
+        """checkpoint_state() の値に戻す（SaveState で復元した直後に呼ぶ。記録はその後に続く）。"""
+        values, self._drained = state
+        self.vec.from_python(values)
+
+
+class MultiProbe:
+    """複数のプローブをまとめたもの（window は (時刻, (サンプル数, プローブ数) の行列) を返す）。"""
+
+    def __init__(self, probes: list[Probe], columns: list[str]):
+        self.probes = probes
+        self.columns = columns
+
+    @property
+    def header(self) -> str:
+        return ",".join(["time(ms)"] + self.columns)
+
+    def window(self, t_start: float = RECORD_START_MS) -> tuple[np.ndarray, np.ndarray]:
+        t = None
+        cols = []
+        for probe in self.probes:
+            t, values = probe.window(t_start)
+            cols.append(values)
+        if t is None:
+            return np.empty(0), np.empty((0, 0))
+        return t, np.column_stack(cols)
+
+    def drain(self) -> tuple[int, np.ndarray]:
+        """各プローブの drain() をまとめたもの（値は (サンプル数, プローブ数)）。"""
+        k0, cols = 0, []
+        for probe in self.probes:
+            k0, values = probe.drain()
+            cols.append(values)
+        if not cols:
+            return k0, np.empty((0, 0))
+        return k0, np.column_stack(cols)
+
+    def checkpoint_signature(self) -> dict:
+        return {"kind": "bundle", "probes": [p.checkpoint_signature() for p in self.probes]}
+
+    def checkpoint_state(self):
+        return [p.checkpoint_state() for p in self.probes]
+
+    def restore_checkpoint(self, state) -> None:
+        for probe, st in zip(self.probes, state):
+            probe.restore_checkpoint(st)
+
+
+def _normalize_selection(sel) -> str | list[int]:
+    """選び方（"all" / "0:5" / 3 / range(0, 5) / [0, 3]）を "all"・"a:b"・番号のリストのどれかにそろえる。"""
+    if isinstance(sel, str):
+        sel = sel.strip()
+        if sel == "all":
+            return sel
+        start, sep, stop = sel.partition(":")
+        if sep:
+            return f"{int(start or 0)}:{'' if not stop else int(stop)}"
+        return [int(sel)]
+    if isinstance(sel, range):
+        if sel.step != 1:
+            return list(sel)
+        return f"{sel.start}:{sel.stop}"
+    if isinstance(sel, int):
+        return [sel]
+    return [int(i) for i in sel]
+
+
+class RecordSpec:
+    """
+    どの細胞種の何番目を記録するか（細胞種 → "all" / "a:b" / 番号のリスト）。
+
+    細胞数は Num_R などで変わるので、番号は probes() を呼んだ時点の値で決める。
+    範囲（"all" / "a:b"）はその時点の細胞数で切り詰め、明示した番号が無ければ IndexError にする。
+    """
+
+    def __init__(self, cells: dict, var: str = "v"):
+        unknown = set(cells) - set(POPULATIONS)
+        if unknown:
+            raise ValueError(f"unknown cell population(s) {sorted(unknown)}; choose from {list(POPULATIONS)}")
+        # 記録の順番（= 列の順番）は POPULATIONS の順にそろえる
+        self.cells = {pop: _normalize_selection(cells[pop]) for pop in POPULATIONS if pop in cells}
+        self.var = var
+
+    def describe(self) -> dict:
+        """キャッシュのキー・メタデータに入れる記録内容の説明。"""
+        return {"kind": "bundle", "cells": self.cells, "var": self.var}
+
+    def indices(self, pop: str) -> list[int]:
+        n = int(getattr(h, POPULATIONS[pop]))
+        sel = self.cells[pop]
+        if sel == "all":
+            return list(range(n))
+        if isinstance(sel, str):
+            start, _, stop = sel.partition(":")
+            return list(range(int(start), min(n, int(stop)) if stop else n))
+        for i in sel:
+            if not 0 <= i < n:
+                raise IndexError(f"{pop}[{i}] does not exist ({POPULATIONS[pop]} = {n})")
+        return list(sel)
+
+    def probes(self, per_step: bool = False, record_dt: float | None = None) -> MultiProbe:
+        probes, columns = [], []
+        for pop in self.cells:
+            cells = getattr(h, pop)
+            for i in self.indices(pop):
+                probes.append(Probe.soma(cells[i], self.var, record_dt=record_dt, per_step=per_step))
+                columns.append(f"{pop}[{i}]" if self.var == "v" else f"{pop}[{i}].{self.var}")
+        return MultiProbe(probes, columns)
+
+
+class SpikeRecorder:
+    """
+    RecordSpec で選んだ細胞の soma に SpikeHyst（mod/spike_hyst.mod）を置き、スパイク時刻だけを記録する。
+
+    判定は解析スクリプトのヒステリシス（thr_hi を上に越えたらスパイク、thr_lo を下回ったら次を許可）と
+    同じ規則を毎ステップ行い、t_arm（解析区間の開始）で検出を許可し直すので、区間内のスパイクは
+    保存した膜電位から数えた結果と一致する（記録間隔 = step_dt のとき）。
+    NetCon → ParallelContext.spike_record で受け取るので、CoreNEURON の psolve でも記録できる。
+
+    ParallelContext のスパイク用 gid は作るたびに消して付け直す（作り直し後は古い細胞が無いため）。
+    リボンシナプスの w の受け渡し（source_var / target_var）は消さない。
+    """
+
+    def __init__(self, spec: RecordSpec, thr_hi: float = SPIKE_THR_HI, thr_lo: float = SPIKE_THR_LO,
+                 t_arm: float = RECORD_START_MS, gid_base: int = SPIKE_GID_BASE):
+        pc = h.ParallelContext()
+        pc.gid_clear(1)
+        self.columns: list[str] = []
+        self.vecs = []
+        self._objs = []   # 検出器と NetCon を記録が終わるまで生かしておく
+        for pop in spec.cells:
+            cells = getattr(h, pop)
+            for i in spec.indices(pop):
+                soma = cells[i].soma
+                det = h.SpikeHyst(soma(0.5))
+                det.thr_hi = thr_hi
+                det.thr_lo = thr_lo
+                det.t_arm = t_arm
+                gid = gid_base + len(self.columns)
+                pc.set_gid2node(gid, pc.id())
+                nc = h.NetCon(det, None)
+                pc.cell(gid, nc)
+                tvec, idvec = h.Vector(), h.Vector()
+                pc.spike_record(gid, tvec, idvec)
+                self.columns.append(f"{pop}[{i}]")
+                self.vecs.append(tvec)
+                self._objs.append((det, nc, idvec))
+
+    def spikes(self) -> dict[str, np.ndarray]:
+        """細胞名 → スパイク時刻 (ms)。"""
+        return {name: np.array(vec) for name, vec in zip(self.columns, self.vecs)}
+
+    def checkpoint_signature(self) -> dict:
+        det = self._objs[0][0] if self._objs else None
+        return {"kind": "spikes", "columns": self.columns,
+                "thr": None if det is None else [det.thr_hi, det.thr_lo, det.t_arm]}
+
+    def checkpoint_state(self):
+        return [(np.array(tvec), np.array(idvec)) for tvec, (_, _, idvec) in zip(self.vecs, self._objs)]
+
+    def restore_checkpoint(self, state) -> None:
+        for tvec, (_, _, idvec), (t, ids) in zip(self.vecs, self._objs, state):
+            tvec.from_python(t)
+            idvec.from_python(ids)
+
+
+class BandPowerRecorder:
+    """
+    RecordSpec で選んだ細胞の膜電位を block_ms ごとに取り出し、bandpower.BandPowerAccumulator に
+    足し込む（Network.simulate(block_ms=..., on_block=recorder.on_block) から呼ばれる）。
+
+    記録した Vector は取り出すたびに空にするので、持っておく膜電位は1ブロック分だけになる。
+    """
+
+    def __init__(self, spec: RecordSpec, t_stop: float, crop_ms=CROP_MS, band_hz=BAND_HZ,
+                 use_hann: bool = True, per_step: bool = False, block_ms: float = BANDPOWER_BLOCK_MS):
+        self.bundle = spec.probes(per_step=per_step)
+        self.columns = self.bundle.columns
+        self.block_ms = block_ms
+        self.acc = BandPowerAccumulator(self.columns, h.step_dt, t_stop, crop_ms, band_hz, use_hann)
+
+    def on_block(self) -> None:
+        k0, values = self.bundle.drain()
+        if len(values):
+            self.acc.feed(k0, values)
+
+    def summary(self) -> dict:
+        self.on_block()   # 最後のブロックの残り
+        return self.acc.summary()
+
+    def checkpoint_signature(self) -> dict:
+        acc = self.acc
+        return {"kind": "bandpower", "bundle": self.bundle.checkpoint_signature(), "block_ms": self.block_ms,
+                "window": [acc.k_first, acc.k_last], "band_hz": list(acc.band_hz), "use_hann": acc.use_hann}
+
+    def checkpoint_state(self):
+        return self.bundle.checkpoint_state(), copy.deepcopy(self.acc)
+
+    def restore_checkpoint(self, state) -> None:
+        bundle, acc = state
+        self.bundle.restore_checkpoint(bundle)
+        self.acc = copy.deepcopy(acc)
+
+
+def noise_seeds(scop_seed: int = 1) -> dict[str, int]:
+    """scop 乱数の種（新規プロセスの既定は 1）と、各細胞種のノイズの種の現在値。"""
+    seeds = {"scop": scop_seed}
+    seeds.update({name: int(getattr(h, name)) for name in NOISE_SEEDS if hasattr(h, name)})
+    return seeds
+
+
+def run(tstop: float) -> None:
+    """
+    finitialize 済みのモデルを tstop まで一括実行する。
+
+    stdrun の continuerun は steps_per_ms から1回の step() あたりの fadvance 数を決めるので、
+    h.dt（= step_dt）が変わらないよう steps_per_ms を合わせてから呼ぶ。
+    """
+    h.steps_per_ms = 1.0 / h.dt
+    h.setdt()
+    h.continuerun(tstop)
+
+
+def write_trace_txt(filename, t: np.ndarray, values: np.ndarray, header: str,
+                    value_fmt: str = "%.4f") -> None:
+    """time(ms), value の2列CSVを一括で書き出す（従来の出力と同じ書式。values が2次元なら列を並べる）。"""
+    data = np.column_stack([t, values])
+    np.savetxt(filename, data, fmt=["%.4f"] + [value_fmt] * (data.shape[1] - 1),
+               delimiter=",", header=header, comments="")
+
+
+def save_trace(filename, t: np.ndarray, values: np.ndarray, header: str,
+               value_fmt: str = "%.4f", meta: dict | None = None) -> None:
+    """
+    拡張子が .trace ならバイナリ（traces.py）、それ以外は従来の txt で書き出す。
+
+    .trace には header の2列目以降を列名として、meta（記録対象・パラメータ・乱数の種など）と一緒に保存する。
+    """
+    if Path(filename).suffix == TRACE_SUFFIX:
+        columns = header.split(",")[1:] if "," in header else [header]
+        write_trace_arrays(filename, t, values, columns=columns, meta=meta)
+    else:
+        write_trace_txt(filename, t, values, header=header, value_fmt=value_fmt)
@@ -1,8 +1,17 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
-# ファイル名
-filename = "ON_GC_200.txt"
+# リポジトリ直下の traces.py を使う（src/ から実行しても import できるように）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from traces import SPIKES_SUFFIX, load_trace, open_spikes
+
+# ファイル名（.trace / .txt のどちらでもよい。.spikes ならスパイク時刻をそのまま使う）
+filename = "ON_GC_200.trace"
+# バンドル（複数細胞を1ファイルにまとめた出力）なら読む列（1細胞だけのファイルでは無視）
+cell = "ON_GC[0]"
 
 # ヒステリシスしきい値 (mV)
 thr_hi = 0.0     # 上抜けでスパイク開始
@@ -12,34 +21,37 @@ thr_lo = -20.0   # ここまで下降したら次の検出を許可
 start_time = 1000.0
 end_time   = 6000.0
 
-# ファイルを読み込み（元コードに合わせて1行スキップ）
-# ※ header=None と names を指定して、先頭データ行がヘッダー扱いされないようにする
-data = pd.read_csv(filename, skiprows=1, header=None, names=["time", "voltage"])
-
-# 数値化（非数は NaN → 除去）で型比較エラーを防止
-data["time"] = pd.to_numeric(data["time"], errors="coerce")
-data["voltage"] = pd.to_numeric(data["voltage"], errors="coerce")
-data = data.dropna(subset=["time", "voltage"])
-
-# 指定時間範囲で切り出し（ここは元コードの意図を踏襲）
-seg = data[(data["time"] >= start_time) & (data["time"] <= end_time)].reset_index(drop=True)
-
-# ===== ヒステリシスによるスパイク検出 =====
-t = seg["time"].to_numpy()
-v = seg["voltage"].to_numpy()
-
-spike_times = []
-armed = True  # True=次のスパイク検出が可能
-for i in range(1, len(v)):
-    if armed:
-        # 上向き閾値を超えたらスパイク
-        if v[i-1] <= thr_hi and v[i] > thr_hi:
-            spike_times.append(t[i])  # 必要なら線形補間に変更可
-            armed = False
-    else:
-        # 下向き閾値を下回ったら次の検出を許可
-        if v[i] < thr_lo:
-            armed = True
+def detect_spikes(path) -> list[float]:
+    """膜電位からヒステリシスでスパイク時刻を検出する（.spikes は記録済みの時刻を返す）。"""
+    if Path(path).suffix == SPIKES_SUFFIX:
+        # SpikeHyst が同じ thr_hi / thr_lo で判定済み（区間の境界も下のループと同じ）
+        return list(open_spikes(path).window(cell, start_time, end_time))
+
+    # ファイルを読み込み（.trace は memmap、.txt は先頭1行をヘッダーとして2列CSVで読む）
+    t_all, v_all = load_trace(path, cell)
+
+    # 指定時間範囲で切り出し（ここは元コードの意図を踏襲）
+    mask = (t_all >= start_time) & (t_all <= end_time)
+    t = t_all[mask]
+    v = np.asarray(v_all[mask], dtype=float)
+
+    # ===== ヒステリシスによるスパイク検出 =====
+    spike_times = []
+    armed = True  # True=次のスパイク検出が可能
+    for i in range(1, len(v)):
+        if armed:
+            # 上向き閾値を超えたらスパイク
+            if v[i-1] <= thr_hi and v[i] > thr_hi:
+                spike_times.append(t[i])  # 必要なら線形補間に変更可
+                armed = False
+        else:
+            # 下向き閾値を下回ったら次の検出を許可
+            if v[i] < thr_lo:
+                armed = True
+    return spike_times
+
+
+spike_times = detect_spikes(filename)
 
 # 以降は元の集計フローに合わせる
 spike_times = pd.Series(spike_times)
@@ -0,0 +1,489 @@
+"""
+刺激平面上の任意の光刺激（動画・フリッカー・ドリフトする縞・スポット）を、視細胞ごとの光電流に変換して
+Rod / Cone に流すモジュール。
+
+処理:
+- 刺激は刺激平面（視距離 500 mm。python/export_gc_rf_stimulus_areas.py と同じ座標, mm）上の輝度 I(x, y, t)
+  - MovieStimulus   : np.save した (フレーム, 高さ, 幅) の配列を mmap で開き、BLOCK_FRAMES フレームずつ読む
+                      （動画全体はメモリに載せない）
+  - FlickerStimulus : 全視野のフリッカー（正弦波 / 矩形波）
+  - GratingStimulus : ドリフトする正弦波の縞
+  - SpotStimulus    : 円形のスポット。SpotStimulus.from_csv() で python/GC_*_StimulusAreas.csv の行
+                      （GC の受容野に相当する刺激平面上の円）から作る
+- 視細胞の配置（PhotoreceptorLayout）: 網膜上の偏心度 ecc_mm を中心に、一辺 patch_um の正方形と同じ面積に
+  六方格子で Rod / Cone を並べ、網膜上の位置 (mm → deg, Watson) → 刺激平面の位置 (500 mm × tan) に写す
+  （PhotoreceptorLayout.from_table() なら mosaic.py の表の位置を使う）
+- 各視細胞の位置で輝度をサンプルし（フレームの間は値を保持）、DRIVE_DT_MS 刻みの輝度の変化に
+  光電流のステップ応答を畳み込む（線形フィルタ）
+    Rod : RPRInput の光電流（mod/RPRInput.mod の photo）
+    Cone: IinjLT 系の光電流（mod/RPRInput_Dim.mod の3つの指数関数の和、負の部分は 0）
+  全視野で輝度 0 → 1 のステップなら、点灯中は Rod の波形が RPRInput と同じになる
+  （消灯後は線形フィルタの応答なので、RPRInput のように瞬時には 0 に戻らない）
+- 視細胞ごとに PhotoPlay（mod/PhotoPlay.mod。ss = 0, i = -amp * wave）を1つ足し、wave に Vector.play で流す
+  （暗電流は createcells.hoc の iclamps() の入力がそのまま流す。フラッシュを止めるには AMP = 0）
+
+使い方:
+    net = Network()
+    net.apply({"AMP": 0})                          # iclamps() のフラッシュは止めて暗電流だけにする
+    stim = SpotStimulus.from_csv(3, t_on=2000, duration=1000)
+    engine = StimulusEngine(stim, amp={"Rods": 50, "Cones": 50})
+    engine.attach()                                # 構築後・finitialize 前（作り直したら付け直す）
+    spikes = SpikeRecorder(RecordSpec({"ON_GC": "all", "OFF_GC": "all"}))
+    net.simulate()
+
+    python stimulus.py --spot-row 3                                   # 受容野のスポット（CSV の行）
+    python stimulus.py --spot-center 20.5 0 --spot-radius 1.5         # 位置・半径 (mm) を指定
+    python stimulus.py --movie movie.npy --fps 60 --pixel-mm 0.05     # 動画（np.save した配列）
+    python stimulus.py --grating --period-mm 2 --tf 2 --orientation 45
+    python stimulus.py --flicker --tf 4 --square
+
+補足:
+- 輝度は 0〜1（uint8 の動画は /255）。background は刺激の前後・動画の外の輝度
+- 視細胞ごとの光電流（細胞数 × t_stop / DRIVE_DT_MS）はメモリに持つ。読むのは動画の必要なフレームだけ
+- 同じ波形になった視細胞（全視野の刺激など）は Vector を共有する
+- Vector.play（連続）は CoreNEURON でも動く
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import math
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from neuron import h
+
+BASE = Path(__file__).resolve().parent
+STIMULUS_AREA_CSV = {
+    "midget": BASE / "python" / "GC_Midget_StimulusAreas.csv",
+    "parasol": BASE / "python" / "GC_Parasol_StimulusAreas.csv",
+}
+
+# 刺激平面までの視距離（python/export_gc_rf_stimulus_areas.py と同じ）
+VIEWING_DISTANCE_MM = 500.0
+# モデルの偏心度（README: 偏心度 1 mm）と、視細胞を並べる正方形の一辺
+ECC_MM = 1.0
+PATCH_UM = 60.0
+# 光電流を計算する時間刻み（Vector.play はこの間を線形補間する）と、ステップ応答の長さ
+DRIVE_DT_MS = 1.0
+KERNEL_MS = 8000.0
+# 動画を読むときの1ブロックのフレーム数
+BLOCK_FRAMES = 256
+# 手続き的な刺激のフレーム間隔（60 Hz のモニタ）
+FRAME_MS = 1000.0 / 60.0
+
+POPULATIONS = {"Rods": "Num_R", "Cones": "Num_C"}
+
+
+# ---------------------------------------------------------------------------
+# 座標
+# ---------------------------------------------------------------------------
+
+def mm_to_deg(r_mm):
+    """網膜上の偏心度 (mm) → 視角 (deg)（Watson の式）。"""
+    r_mm = np.asarray(r_mm, dtype=float)
+    return 3.556 * r_mm + 0.05993 * r_mm**2 - 0.007358 * r_mm**3 + 0.0003027 * r_mm**4
+
+
+def deg_to_stimulus_mm(deg, viewing_distance_mm: float = VIEWING_DISTANCE_MM):
+    """視角 (deg) → 刺激平面上の距離 (mm)。"""
+    return viewing_distance_mm * np.tan(np.deg2rad(deg))
+
+
+def hex_positions(n: int, patch_um: float, center_um=(0.0, 0.0)) -> np.ndarray:
+    """一辺 patch_um の正方形と同じ面積に n 個を六方格子で並べた位置 (µm)。中心に近い n 個を返す。"""
+    if n <= 0:
+        return np.empty((0, 2))
+    spacing = math.sqrt(2.0 * patch_um**2 / (math.sqrt(3.0) * n))
+    k = int(math.ceil(math.sqrt(n))) + 2
+    ii, jj = np.meshgrid(np.arange(-k, k + 1), np.arange(-k, k + 1), indexing="ij")
+    x = spacing * (ii + 0.5 * (jj % 2))
+    y = spacing * math.sqrt(3.0) / 2.0 * jj
+    pts = np.c_[x.ravel(), y.ravel()]
+    order = np.lexsort((pts[:, 0], pts[:, 1], np.hypot(pts[:, 0], pts[:, 1])))
+    return pts[order[:n]] + np.asarray(center_um, dtype=float)
+
+
+def retina_to_stimulus_mm(xy_um: np.ndarray, viewing_distance_mm: float = VIEWING_DISTANCE_MM) -> np.ndarray:
+    """網膜上の位置 (µm, 中心窩が原点) → 刺激平面上の位置 (mm)。偏心度の方向は保つ。"""
+    xy_um = np.asarray(xy_um, dtype=float)
+    r_mm = np.hypot(xy_um[:, 0], xy_um[:, 1]) / 1000.0
+    r_stim = deg_to_stimulus_mm(mm_to_deg(r_mm), viewing_distance_mm)
+    scale = np.divide(r_stim, r_mm, out=np.zeros_like(r_mm), where=r_mm > 0)
+    return xy_um / 1000.0 * scale[:, None]
+
+
+class PhotoreceptorLayout:
+    """Rod / Cone の網膜上の位置（µm）と刺激平面上の位置（mm）。"""
+
+    def __init__(self, counts: dict[str, int], ecc_mm: float = ECC_MM, patch_um: float = PATCH_UM,
+                 retina_um: dict[str, np.ndarray] | None = None):
+        self.ecc_mm = ecc_mm
+        self.patch_um = patch_um
+        center = (ecc_mm * 1000.0, 0.0)
+        if retina_um is None:
+            retina_um = {pop: hex_positions(n, patch_um, center) for pop, n in counts.items()}
+        self.retina_um = {pop: np.asarray(retina_um[pop], dtype=float)[:n] for pop, n in counts.items()}
+        self.stimulus_mm = {pop: retina_to_stimulus_mm(xy) for pop, xy in self.retina_um.items()}
+
+    @classmethod
+    def from_model(cls, ecc_mm: float = ECC_MM, patch_um: float = PATCH_UM) -> "PhotoreceptorLayout":
+        """構築済みのモデルの Num_R / Num_C に合わせて作る。"""
+        return cls({pop: int(getattr(h, num)) for pop, num in POPULATIONS.items()}, ecc_mm, patch_um)
+
+    @classmethod
+    def from_table(cls, table) -> "PhotoreceptorLayout":
+        """mosaic.py の表（.npz か Patch）の Rod / Cone の位置で作る。"""
+        from mosaic import load_table
+        patch = load_table(table)
+        retina_um = {pop: patch.positions[pop] for pop in POPULATIONS}
+        return cls({pop: len(xy) for pop, xy in retina_um.items()}, patch.meta["ecc_mm"], patch.meta["size_um"],
+                   retina_um)
+
+
+# ---------------------------------------------------------------------------
+# 刺激
+# ---------------------------------------------------------------------------
+
+class Stimulus(ABC):
+    """
+    刺激平面上の輝度。フレーム k を [t_on + k * frame_ms, t_on + (k + 1) * frame_ms) の間表示し、
+    それ以外（刺激の前後）は background。
+    """
+
+    def __init__(self, frame_ms: float, n_frames: int, t_on: float = 0.0, background: float = 0.0):
+        self.frame_ms = float(frame_ms)
+        self.n_frames = int(n_frames)
+        self.t_on = float(t_on)
+        self.background = float(background)
+
+    @abstractmethod
+    def frames(self, xy_mm: np.ndarray, k0: int, k1: int) -> np.ndarray:
+        """フレーム k0..k1-1 の、各位置での輝度（(k1 - k0, 位置の数)）。"""
+
+    def describe(self) -> dict:
+        """.spikes のメタデータ用。"""
+        return {"kind": type(self).__name__, "frame_ms": self.frame_ms, "n_frames": self.n_frames,
+                "t_on": self.t_on, "background": self.background}
+
+    def _frame_times(self, k0: int, k1: int) -> np.ndarray:
+        """フレームの表示開始時刻（t_on からの相対, ms）。"""
+        return np.arange(k0, k1) * self.frame_ms
+
+
+class MovieStimulus(Stimulus):
+    """np.save した (フレーム, 高さ, 幅) の配列。画素 (行, 列) = (0, 0) が左上。"""
+
+    def __init__(self, path, fps: float, pixel_mm: float, center_mm=(0.0, 0.0),
+                 t_on: float = 0.0, background: float = 0.0):
+        self.path = Path(path)
+        self.movie = np.load(self.path, mmap_mode="r")
+        if self.movie.ndim != 3:
+            raise ValueError(f"{self.path}: (フレーム, 高さ, 幅) の配列が必要です（shape={self.movie.shape}）")
+        super().__init__(1000.0 / fps, self.movie.shape[0], t_on, background)
+        self.pixel_mm = float(pixel_mm)
+        self.center_mm = tuple(float(c) for c in center_mm)
+        self.scale = 1.0 / 255.0 if self.movie.dtype == np.uint8 else 1.0
+
+    def pixels(self, xy_mm: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """各位置の画素の (行, 列) と、動画の中にあるか。"""
+        n_rows, n_cols = self.movie.shape[1:]
+        col = np.floor((xy_mm[:, 0] - self.center_mm[0]) / self.pixel_mm + n_cols / 2.0).astype(int)
+        row = np.floor((self.center_mm[1] - xy_mm[:, 1]) / self.pixel_mm + n_rows / 2.0).astype(int)
+        inside = (row >= 0) & (row < n_rows) & (col >= 0) & (col < n_cols)
+        return row, col, inside
+
+    def frames(self, xy_mm, k0, k1):
+        row, col, inside = self.pixels(xy_mm)
+        out = np.full((k1 - k0, len(xy_mm)), self.background)
+        # mmap のスライスなので、読むのはこのブロックのフレームだけ
+        block = self.movie[k0:k1]
+        out[:, inside] = np.asarray(block[:, row[inside], col[inside]], dtype=float) * self.scale
+        return out
+
+    def describe(self):
+        return {**super().describe(), "path": str(self.path), "pixel_mm": self.pixel_mm,
+                "center_mm": list(self.center_mm), "shape": list(self.movie.shape)}
+
+
+class FlickerStimulus(Stimulus):
+    """全視野のフリッカー: mean * (1 + contrast * sin(2π tf t))（square なら sin の符号）。"""
+
+    def __init__(self, tf_hz: float, duration: float, mean: float = 0.5, contrast: float = 1.0,
+                 square: bool = False, t_on: float = 0.0, background: float = 0.0, frame_ms: float = FRAME_MS):
+        super().__init__(frame_ms, math.ceil(duration / frame_ms), t_on, background)
+        self.tf_hz, self.mean, self.contrast, self.square = float(tf_hz), float(mean), float(contrast), square
+
+    def frames(self, xy_mm, k0, k1):
+        s = np.sin(2.0 * np.pi * self.tf_hz * self._frame_times(k0, k1) / 1000.0)
+        if self.square:
+            s = np.sign(s)
+        return np.repeat((self.mean * (1.0 + self.contrast * s))[:, None], len(xy_mm), axis=1)
+
+    def describe(self):
+        return {**super().describe(), "tf_hz": self.tf_hz, "mean": self.mean,
+                "contrast": self.contrast, "square": self.square}
+
+
+class GratingStimulus(Stimulus):
+    """ドリフトする正弦波の縞: mean * (1 + contrast * cos(2π (x' / period_mm - tf t)))。x' は orientation 方向。"""
+
+    def __init__(self, period_mm: float, tf_hz: float, duration: float, orientation_deg: float = 0.0,
+                 mean: float = 0.5, contrast: float = 1.0, t_on: float = 0.0, background: float = 0.0,
+                 frame_ms: float = FRAME_MS):
+        super().__init__(frame_ms, math.ceil(duration / frame_ms), t_on, background)
+        self.period_mm, self.tf_hz = float(period_mm), float(tf_hz)
+        self.orientation_deg, self.mean, self.contrast = float(orientation_deg), float(mean), float(contrast)
+
+    def frames(self, xy_mm, k0, k1):
+        theta = np.deg2rad(self.orientation_deg)
+        x = xy_mm[:, 0] * np.cos(theta) + xy_mm[:, 1] * np.sin(theta)
+        phase = x[None, :] / self.period_mm - self.tf_hz * self._frame_times(k0, k1)[:, None] / 1000.0
+        return self.mean * (1.0 + self.contrast * np.cos(2.0 * np.pi * phase))
+
+    def describe(self):
+        return {**super().describe(), "period_mm": self.period_mm, "tf_hz": self.tf_hz,
+                "orientation_deg": self.orientation_deg, "mean": self.mean, "contrast": self.contrast}
+
+
+class SpotStimulus(Stimulus):
+    """中心 center_mm・半径 radius_mm の円の中を intensity にする（duration の間1フレーム）。"""
+
+    def __init__(self, center_mm, radius_mm: float, duration: float, intensity: float = 1.0,
+                 t_on: float = 0.0, background: float = 0.0):
+        super().__init__(duration, 1, t_on, background)
+        self.center_mm = tuple(float(c) for c in center_mm)
+        self.radius_mm, self.intensity = float(radius_mm), float(intensity)
+
+    @classmethod
+    def from_csv(cls, row: int, cell: str = "midget", **kwargs) -> "SpotStimulus":
+        """python/GC_{Midget,Parasol}_StimulusAreas.csv の row 行目（0 始まり）の受容野の円。"""
+        with open(STIMULUS_AREA_CSV[cell], newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        r = rows[row]
+        return cls((float(r["X_center (computed)"]), 0.0), float(r["radius"]), **kwargs)
+
+    def frames(self, xy_mm, k0, k1):
+        d = np.hypot(xy_mm[:, 0] - self.center_mm[0], xy_mm[:, 1] - self.center_mm[1])
+        value = np.where(d <= self.radius_mm, self.intensity, self.background)
+        return np.repeat(value[None, :], k1 - k0, axis=0)
+
+    def describe(self):
+        return {**super().describe(), "center_mm": list(self.center_mm), "radius_mm": self.radius_mm,
+                "intensity": self.intensity}
+
+
+def stimulus_area_ecc_mm(row: int, cell: str = "midget") -> float:
+    """CSV の row 行目の GC の偏心度 (mm)。"""
+    with open(STIMULUS_AREA_CSV[cell], newline="", encoding="utf-8") as f:
+        return float(list(csv.DictReader(f))[row]["Eccentricity (mm)"])
+
+
+# ---------------------------------------------------------------------------
+# 輝度 → 光電流
+# ---------------------------------------------------------------------------
+
+def rod_step_response(t_ms: np.ndarray) -> np.ndarray:
+    """RPRInput の光電流（点灯からの時刻 t_ms での photo。正規化、1 で amp）。"""
+    light = np.asarray(t_ms, dtype=float) / 1000.0
+    return (32 * (1 - np.exp(-light / 0.05)) - 33 / (1 + np.exp(-(light - 3.8) / 0.45))
+            + 1 - np.exp(-light / 0.8)) / 33.0
+
+
+def cone_step_response(t_ms: np.ndarray) -> np.ndarray:
+    """IinjLT 系（RPRInput_Dim.mod）の光電流。3つの指数関数の和で、負になる間は 0。"""
+    tt = np.asarray(t_ms, dtype=float) / 1000.0
+    photo = (-np.exp(-(tt - 0.230595125) / 0.140104647) + np.exp(-(tt - 0.691774291) / 0.596464897)
+             - np.exp(-(tt - 0.035251144) / 0.590572966))
+    return np.maximum(photo, 0.0)
+
+
+STEP_RESPONSES = {"Rods": rod_step_response, "Cones": cone_step_response}
+
+
+def intensity_grid(stim: Stimulus, xy_mm: np.ndarray, t_grid: np.ndarray,
+                   block_frames: int = BLOCK_FRAMES) -> np.ndarray:
+    """各位置・各時刻（t_grid）の輝度（(位置の数, 時刻の数)）。フレームは block_frames ずつ読む。"""
+    out = np.full((len(xy_mm), len(t_grid)), stim.background)
+    frame = np.floor((t_grid - stim.t_on) / stim.frame_ms).astype(np.int64)
+    shown = (frame >= 0) & (frame < stim.n_frames)
+    if not shown.any() or len(xy_mm) == 0:
+        return out
+    last = int(frame[shown].max()) + 1
+    for k0 in range(int(frame[shown].min()), last, block_frames):
+        k1 = min(k0 + block_frames, last)
+        sel = shown & (frame >= k0) & (frame < k1)
+        if sel.any():
+            out[:, sel] = stim.frames(xy_mm, k0, k1)[frame[sel] - k0].T
+    return out
+
+
+def photocurrent_drive(intensity: np.ndarray, background: float, step_response, dt: float = DRIVE_DT_MS,
+                       kernel_ms: float = KERNEL_MS, chunk: int = 64) -> np.ndarray:
+    """
+    輝度の変化（各時刻での段差）にステップ応答を畳み込んだ光電流の波形（PhotoPlay の wave）。
+
+    刺激の前は background が十分長く続いていたとみなす（background の段差は 0）。
+    """
+    n_cells, n_t = intensity.shape
+    step = np.diff(intensity, axis=1, prepend=background)
+    kernel = step_response(np.arange(min(n_t, int(round(kernel_ms / dt)) + 1)) * dt)
+    n_fft = 1 << int(math.ceil(math.log2(n_t + len(kernel) - 1)))
+    k_f = np.fft.rfft(kernel, n_fft)
+    out = np.empty_like(intensity)
+    for i in range(0, n_cells, chunk):
+        out[i:i + chunk] = np.fft.irfft(np.fft.rfft(step[i:i + chunk], n_fft, axis=1) * k_f, n_fft, axis=1)[:, :n_t]
+    return out
+
+
+class StimulusEngine:
+    """刺激を Rod / Cone の光電流に変換し、視細胞ごとに足した PhotoPlay に Vector.play で流す。"""
+
+    def __init__(self, stim: Stimulus, amp: dict[str, float], layout: PhotoreceptorLayout | None = None,
+                 t_stop: float | None = None, dt: float = DRIVE_DT_MS, block_frames: int = BLOCK_FRAMES):
+        self.stim = stim
+        self.amp = dict(amp)
+        self.layout = layout
+        self.t_stop = t_stop
+        self.dt = dt
+        self.block_frames = block_frames
+        self._objs: list = []
+
+    def drives(self) -> dict[str, np.ndarray]:
+        """細胞種 → 視細胞ごとの光電流の波形（(細胞数, 時刻の数)）。時刻は k * dt。"""
+        t_stop = float(h.tstop) if self.t_stop is None else self.t_stop
+        t_grid = np.arange(int(math.ceil(t_stop / self.dt)) + 1) * self.dt
+        out = {}
+        for pop, num in POPULATIONS.items():
+            xy = self.layout.stimulus_mm[pop][:int(getattr(h, num))]
+            light = intensity_grid(self.stim, xy, t_grid, self.block_frames)
+            out[pop] = photocurrent_drive(light, self.stim.background, STEP_RESPONSES[pop], self.dt)
+        return out
+
+    def attach(self) -> dict[str, np.ndarray]:
+        """
+        構築済みの Rods / Cones に光電流を付け（finitialize の前に呼ぶ）、付けた光電流（drives() の値）を返す。
+        """
+        self.detach()
+        if self.layout is None:
+            self.layout = PhotoreceptorLayout.from_model()
+        drives = self.drives()
+        n_t = next(iter(drives.values())).shape[1]
+        # 最後の値を保つ（範囲の外では最後の2点で外挿されるため）
+        tvec = h.Vector(np.r_[np.arange(n_t) * self.dt, (n_t - 1) * self.dt + 1.0])
+        self._objs.append(tvec)
+        for pop, drive in drives.items():
+            cells = getattr(h, pop)
+            # 同じ波形の視細胞は Vector を共有する
+            rows, inverse = np.unique(drive, axis=0, return_inverse=True)
+            vecs = [h.Vector(np.r_[r, r[-1]]) for r in rows]
+            self._objs += vecs
+            for i, k in enumerate(np.ravel(inverse)):
+                pp = h.PhotoPlay(cells[i].soma(0.5))
+                pp.ss = 0.0
+                pp.amp = self.amp[pop]
+                vecs[k].play(pp._ref_wave, tvec, True)
+                self._objs.append(pp)
+        return drives
+
+    def detach(self) -> None:
+        """付けた光電流を外す。"""
+        self._objs = []
+
+
+def mean_rate(spikes: dict[str, np.ndarray], pop: str, t0: float, t1: float) -> float:
+    """pop の細胞平均の発火率 (Hz)。[t0, t1) のスパイクを数える。"""
+    counts = [np.count_nonzero((t >= t0) & (t < t1)) for name, t in spikes.items() if name.startswith(pop + "[")]
+    return float(np.mean(counts)) / ((t1 - t0) / 1000.0) if counts and t1 > t0 else math.nan
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    from network import Network, effective_params
+    from recording import RECORD_START_MS, RecordSpec, SpikeRecorder
+    from traces import write_spikes
+
+    ap = argparse.ArgumentParser(description="Run the network with a spatiotemporal light stimulus.")
+    kind = ap.add_mutually_exclusive_group(required=True)
+    kind.add_argument("--movie", type=Path, help="np.save した (frames, height, width) の配列")
+    kind.add_argument("--flicker", action="store_true")
+    kind.add_argument("--grating", action="store_true")
+    kind.add_argument("--spot-row", type=int, help="python/GC_*_StimulusAreas.csv の行（0 始まり）")
+    kind.add_argument("--spot-center", type=float, nargs=2, metavar=("X_MM", "Y_MM"))
+    ap.add_argument("--spot-radius", type=float, default=1.0, help="--spot-center のときの半径 (mm)")
+    ap.add_argument("--gc", default="midget", choices=list(STIMULUS_AREA_CSV), help="--spot-row の CSV")
+    ap.add_argument("--fps", type=float, default=60.0, help="--movie のフレームレート")
+    ap.add_argument("--pixel-mm", type=float, default=0.05, help="--movie の1画素の大きさ（刺激平面, mm）")
+    ap.add_argument("--movie-center", type=float, nargs=2, default=None, metavar=("X_MM", "Y_MM"),
+                    help="--movie の中心の位置（省略時は視細胞の配置の中心）")
+    ap.add_argument("--tf", type=float, default=2.0, help="時間周波数 (Hz)")
+    ap.add_argument("--period-mm", type=float, default=2.0, help="--grating の周期 (mm)")
+    ap.add_argument("--orientation", type=float, default=0.0, help="--grating の向き (deg)")
+    ap.add_argument("--square", action="store_true", help="--flicker を矩形波にする")
+    ap.add_argument("--mean", type=float, default=0.5)
+    ap.add_argument("--contrast", type=float, default=1.0)
+    ap.add_argument("--intensity", type=float, default=1.0, help="スポットの輝度")
+    ap.add_argument("--background", type=float, default=0.0)
+    ap.add_argument("--t-on", type=float, default=None, help="刺激の開始 (ms)。省略時は stim")
+    ap.add_argument("--duration", type=float, default=None, help="刺激の長さ (ms)。省略時は ton_stim")
+    ap.add_argument("--ecc-mm", type=float, default=None,
+                    help="視細胞を並べる偏心度 (mm)。省略時は --spot-row の GC の偏心度か 1 mm")
+    ap.add_argument("--patch-um", type=float, default=PATCH_UM)
+    ap.add_argument("--run-mode", default="classic", choices=("classic", "coreneuron"))
+    ap.add_argument("--out", type=Path, default=Path("STIM.spikes"), help="GC のスパイク時刻（.spikes）")
+    args = ap.parse_args(argv)
+
+    net = Network(run_mode=args.run_mode)
+    params = effective_params({}, net.base_text)
+    # iclamps() のフラッシュは止めて（暗電流だけ）、その振幅を刺激の光電流に使う
+    amp = {"Rods": params["AMP"], "Cones": params["AMP_C"]}
+    net.apply({"AMP": 0})
+
+    t_on = params["stim"] if args.t_on is None else args.t_on
+    duration = params["ton_stim"] if args.duration is None else args.duration
+    ecc = args.ecc_mm
+    if ecc is None:
+        ecc = stimulus_area_ecc_mm(args.spot_row, args.gc) if args.spot_row is not None else ECC_MM
+    layout = PhotoreceptorLayout.from_model(ecc, args.patch_um)
+
+    common = {"t_on": t_on, "background": args.background}
+    if args.movie is not None:
+        center = args.movie_center
+        if center is None:
+            center = np.mean(np.vstack(list(layout.stimulus_mm.values())), axis=0)
+        stim = MovieStimulus(args.movie, args.fps, args.pixel_mm, center, **common)
+    elif args.flicker:
+        stim = FlickerStimulus(args.tf, duration, args.mean, args.contrast, args.square, **common)
+    elif args.grating:
+        stim = GratingStimulus(args.period_mm, args.tf, duration, args.orientation,
+                               args.mean, args.contrast, **common)
+    elif args.spot_row is not None:
+        stim = SpotStimulus.from_csv(args.spot_row, args.gc, duration=duration, intensity=args.intensity, **common)
+    else:
+        stim = SpotStimulus(args.spot_center, args.spot_radius, duration, args.intensity, **common)
+
+    engine = StimulusEngine(stim, amp, layout)
+    drives = engine.attach()
+    n_lit = {pop: int(np.count_nonzero(np.any(d != 0, axis=1))) for pop, d in drives.items()}
+    del drives
+    print(f"[stimulus] {type(stim).__name__}: ecc {ecc:g} mm, photoreceptors with light: {n_lit}")
+
+    spikes = SpikeRecorder(RecordSpec({"ON_GC": "all", "OFF_GC": "all"}))
+    mode = net.simulate()
+    times = spikes.spikes()
+    tstop = float(h.tstop)
+    t0, t1 = stim.t_on, min(stim.t_on + stim.n_frames * stim.frame_ms, tstop)
+    for pop in ("ON_GC", "OFF_GC"):
+        print(f"  {pop}: {mean_rate(times, pop, RECORD_START_MS, t0):.3g} Hz before, "
+              f"{mean_rate(times, pop, t0, t1):.3g} Hz during the stimulus")
+    write_spikes(args.out, times, 0.0, tstop,
+                 meta={"stimulus": stim.describe(), "ecc_mm": ecc, "patch_um": args.patch_um,
+                       "amp": amp, "run_mode": mode})
+    print(f"wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
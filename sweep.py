@@ -0,0 +1,317 @@
+"""
+スイープの各点をプロセスプールで並列に実行するモジュール。
+
+処理:
+- 各ワーカープロセスは起動時に network.Network を1つ作り、担当する点ごとに
+  パラメータの上書き値（メモリ上の dict）を apply() して実行する
+  （src/parameters_new.hoc は誰も書き換えないので、並列に動かしても競合しない）
+- 各点の出力ファイル名は呼び出し側が決めて SweepPoint.output に渡す
+  （「最新の txt を探す」ような共有ディレクトリ頼みの処理はしない）
+- 書き出しは一時ファイル → os.replace なので、途中で落ちても壊れたファイルは残らない
+- BundleTarget を渡すと、複数の細胞種（AIIAC 全部と ON/OFF GC の0番など）を1回の実行で記録して
+  1つのファイル（バンドル。列ごとに1細胞）にまとめる
+- SpikeTarget を渡すと、ON/OFF GC などのスパイク時刻だけを .spikes に保存する（膜電位は保存しない）
+- BandPowerTarget を渡すと、AIIAC などの 5–15 Hz バンドパワーを実行中にブロックごとに計算して
+  .psd に保存する（膜電位は保存しない。計算は bandpower.py）
+- 出力の拡張子が .trace ならバイナリ（traces.py。記録対象・パラメータ・乱数の種も一緒に保存）、
+  .txt なら従来の CSV で書き出す
+- cache=ResultCache(...) を渡すと、同じパラメータ・モデル・記録対象の結果がキャッシュにあれば
+  シミュレーションせずにコピーする（キーの作り方は cache.py を参照）。無ければ実行して登録する
+- checkpoints=WarmupCheckpoints(...) を渡すと、構造と刺激前のパラメータが同じ点どうしで刺激前の区間を
+  使い回す（最初の点が保存し、残りの点はその状態から刺激の区間だけを実行する。checkpoint.py）
+
+使い方（sweep_coupling_2d.py などから）:
+    points = [SweepPoint(f"x{ix:03d}_y{iy:03d}", {"g_RBC2AC": ..., "gj_AC2CB": ...}, out_path), ...]
+    for res in run_sweep(points, SomaTarget("OFF_GC", 0), workers=None, run_mode="coreneuron"):
+        print(res.key, res.ok)
+
+補足:
+- workers=None なら全コア、workers=1 ならプールを作らずこのプロセス内で順番に実行する
+- ワーカーは spawn で起動するので、呼び出し側のスクリプトは if __name__ == "__main__": で守ること
+- 点は渡した順番に投入される。Num_R など構造が変わるパラメータで並べておくと作り直しが減る
+"""
+
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from network import PARAM_PATH, effective_params
+from bandpower import BAND_HZ, CROP_MS, write_bandpower
+from recording import (BANDPOWER_BLOCK_MS, BandPowerRecorder, Probe, RECORD_START_MS, RecordSpec,
+                       SPIKE_THR_HI, SPIKE_THR_LO, SpikeRecorder, save_trace)
+from traces import write_spikes
+
+
+class SweepPoint:
+    """スイープの1点（名前・パラメータの上書き値・出力ファイル）。"""
+
+    def __init__(self, key: str, params: dict, output: Path):
+        self.key = key
+        self.params = dict(params)
+        self.output = Path(output)
+        self.cache_key = None   # run_sweep がキャッシュを使うときに入れる
+
+
+class SweepResult:
+    """1点の実行結果。error は失敗時の traceback（成功なら None）。"""
+
+    def __init__(self, key: str, output: Path, build: str = "", run_mode: str = "",
+                 elapsed: float = 0.0, worker: int = 0, error: str | None = None,
+                 cached: bool = False):
+        self.key = key
+        self.output = output
+        self.build = build
+        self.run_mode = run_mode
+        self.elapsed = elapsed
+        self.worker = worker
+        self.error = error
+        self.cached = cached
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class SomaTarget:
+    """h.<cell>[index].soma の膜電位などを記録する（init.py と同じ書式で保存）。"""
+
+    def __init__(self, cell: str, index: int = 0, var: str = "v"):
+        self.cell = cell
+        self.index = index
+        self.var = var
+        self.header = "time(ms),voltage(mV)" if var == "v" else f"time(ms),{var}"
+        self.value_fmt = "%.4f"
+
+    def describe(self) -> dict:
+        """キャッシュのキーに入れる記録内容の説明。"""
+        return {"kind": "soma", "cell": self.cell, "index": self.index, "var": self.var,
+                "header": self.header, "value_fmt": self.value_fmt, "t_start": RECORD_START_MS}
+
+    def probe(self, per_step: bool) -> Probe:
+        from neuron import h
+        return Probe.soma(getattr(h, self.cell)[self.index], self.var, per_step=per_step)
+
+
+class SynapseTarget:
+    """h.<array>[post][pre] のシナプス変数を記録する（init_syn.py と同じ書式で保存）。"""
+
+    def __init__(self, array: str, post: int, pre: int, var: str):
+        self.array = array
+        self.post = post
+        self.pre = pre
+        self.var = var
+        self.header = f"time(ms),{var}"
+        self.value_fmt = "%.6f"
+
+    def describe(self) -> dict:
+        """キャッシュのキーに入れる記録内容の説明。"""
+        return {"kind": "synapse", "array": self.array, "post": self.post, "pre": self.pre,
+                "var": self.var, "header": self.header, "value_fmt": self.value_fmt,
+                "t_start": RECORD_START_MS}
+
+    def probe(self, per_step: bool) -> Probe:
+        from neuron import h
+        # まず [post][pre] を試して、だめなら [pre][post] を試す（init_syn.py の pick_synapse と同じ）
+        syn_arr = getattr(h, self.array)
+        try:
+            syn = syn_arr[self.post][self.pre]
+        except Exception:
+            syn = syn_arr[self.pre][self.post]
+        return Probe.point_process(syn, self.var, per_step=per_step)
+
+
+class BundleTarget:
+    """recording.RecordSpec で選んだ細胞の膜電位などを、1つのファイルに列を並べて記録する。"""
+
+    def __init__(self, cells: dict, var: str = "v"):
+        self.spec = RecordSpec(cells, var)
+        # 列（細胞）の数は Num_R などで変わるので、ヘッダはプローブ（MultiProbe.header）から取る
+        self.header = None
+        self.value_fmt = "%.4f"
+
+    def describe(self) -> dict:
+        """キャッシュのキーに入れる記録内容の説明。"""
+        return {**self.spec.describe(), "value_fmt": self.value_fmt, "t_start": RECORD_START_MS}
+
+    def probe(self, per_step: bool):
+        return self.spec.probes(per_step=per_step)
+
+
+class SpikeTarget:
+    """RecordSpec で選んだ細胞（既定は ON_GC / OFF_GC 全部）のスパイク時刻を .spikes に記録する。"""
+
+    def __init__(self, cells: dict | None = None, thr_hi: float = SPIKE_THR_HI,
+                 thr_lo: float = SPIKE_THR_LO):
+        self.spec = RecordSpec(cells or {"ON_GC": "all", "OFF_GC": "all"})
+        self.thr_hi = thr_hi
+        self.thr_lo = thr_lo
+        self.header = None
+
+    def describe(self) -> dict:
+        """キャッシュのキーに入れる記録内容の説明。"""
+        return {"kind": "spikes", "cells": self.spec.cells, "thr_hi": self.thr_hi,
+                "thr_lo": self.thr_lo, "t_start": RECORD_START_MS}
+
+    def probe(self, per_step: bool) -> SpikeRecorder:
+        # スパイクは毎ステップ判定するので per_step は関係ない
+        return SpikeRecorder(self.spec, self.thr_hi, self.thr_lo, t_arm=RECORD_START_MS)
+
+    def save(self, probe: SpikeRecorder, path: Path, meta: dict) -> None:
+        from neuron import h
+        write_spikes(path, probe.spikes(), RECORD_START_MS, h.tstop, meta=meta)
+
+
+class BandPowerTarget:
+    """RecordSpec で選んだ細胞（既定は AIIAC 全部）のバンドパワーを実行中に計算して .psd に記録する。"""
+
+    def __init__(self, cells: dict | None = None, crop_ms=CROP_MS, band_hz=BAND_HZ,
+                 use_hann: bool = True, block_ms: float = BANDPOWER_BLOCK_MS):
+        self.spec = RecordSpec(cells or {"AIIAC": "all"})
+        self.crop_ms = tuple(crop_ms)
+        self.band_hz = tuple(band_hz)
+        self.use_hann = use_hann
+        self.block_ms = block_ms
+        self.header = None
+
+    def describe(self) -> dict:
+        """キャッシュのキーに入れる記録内容の説明（block_ms は結果を変えないので入れない）。"""
+        return {"kind": "bandpower", "cells": self.spec.cells, "crop_ms": list(self.crop_ms),
+                "band_hz": list(self.band_hz), "use_hann": self.use_hann}
+
+    def probe(self, per_step: bool) -> BandPowerRecorder:
+        from neuron import h
+        return BandPowerRecorder(self.spec, h.tstop, self.crop_ms, self.band_hz, self.use_hann,
+                                 per_step=per_step, block_ms=self.block_ms)
+
+    def save(self, probe: BandPowerRecorder, path: Path, meta: dict) -> None:
+        write_bandpower(path, probe.summary(), meta=meta)
+
+
+def tmp_path(path: Path) -> Path:
+    """path と同じフォルダの一時ファイル名（書式は拡張子で決まるので、拡張子はそのまま残す）。"""
+    return path.with_name(f".{path.stem}.{os.getpid()}.tmp{path.suffix}")
+
+
+def write_atomic(path: Path, t, values, header: str, value_fmt: str, meta: dict | None = None) -> None:
+    """一時ファイルに書いてから置き換える（並列実行・中断時に半端なファイルを残さない）。"""
+    tmp = tmp_path(path)
+    save_trace(tmp, t, values, header=header, value_fmt=value_fmt, meta=meta)
+    os.replace(tmp, path)
+
+
+# --- ワーカー側 ---
+_net = None
+_target = None
+_cache = None
+_journal = None
+_checkpoints = None
+
+
+def _init_worker(target, run_mode: str, cell_permute: int, cache=None, journal=None,
+                 checkpoints=None) -> None:
+    global _net, _target, _cache, _journal, _checkpoints
+    from network import Network
+    _net = Network(run_mode=run_mode, cell_permute=cell_permute)
+    _target = target
+    _cache = cache
+    _journal = journal
+    _checkpoints = checkpoints
+
+
+def _run_point(point: SweepPoint) -> SweepResult:
+    t0 = time.perf_counter()
+    if _journal is not None:
+        _journal.record(point.key, "running")
+    try:
+        how = _net.apply(point.params)
+        # 作り直すと細胞・シナプスも新しいオブジェクトになるので、プローブは毎回作る
+        probe = _target.probe(_net.per_step)
+        # BandPowerRecorder はブロックごとに膜電位を受け取る（他のプローブは最後にまとめて取り出す）
+        used_mode = _net.simulate(block_ms=getattr(probe, "block_ms", None),
+                                  on_block=getattr(probe, "on_block", None),
+                                  checkpoint=_checkpoints, recorders=[probe])
+        point.output.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"target": _target.describe(),
+                "params": {k: str(v) for k, v in point.params.items()},
+                "param_file": PARAM_PATH.name,
+                "seed": _net.seeds()}
+        if hasattr(_target, "save"):
+            # 膜電位以外（スパイク時刻など）はターゲットが自分の書式で書く
+            tmp = tmp_path(point.output)
+            _target.save(probe, tmp, meta)
+            os.replace(tmp, point.output)
+        else:
+            t, values = probe.window(RECORD_START_MS)
+            header = getattr(probe, "header", _target.header)
+            write_atomic(point.output, t, values, header, _target.value_fmt, meta=meta)
+        # classic に切り替わった実行は、頼んだ実行モードのキーに登録しない
+        if _cache is not None and point.cache_key is not None and used_mode == _net.run_mode:
+            _cache.put(point.cache_key, point.output, meta=meta)
+    except Exception:
+        return SweepResult(point.key, point.output, elapsed=time.perf_counter() - t0,
+                           worker=os.getpid(), error=traceback.format_exc())
+    return SweepResult(point.key, point.output, build=how, run_mode=used_mode,
+                       elapsed=time.perf_counter() - t0, worker=os.getpid())
+
+
+# --- 呼び出し側 ---
+def run_sweep(points: list[SweepPoint], target, workers: int | None = None,
+              run_mode: str = "classic", cell_permute: int = 1, cache=None, journal=None,
+              checkpoints=None):
+    """
+    points をワーカープールで実行し、終わった順に SweepResult を yield する。
+
+    workers=None なら os.cpu_count()。点の数より多いワーカーは起動しない。
+    cache を渡すと、ヒットした点はすぐに（cached=True で）返し、残りだけワーカーに回す。
+    journal（journal.SweepJournal）を渡すと、ワーカーが点を始めたときに running を記録する。
+    checkpoints（checkpoint.WarmupCheckpoints）を渡すと、各点の刺激前の区間を保存・再利用する。
+    """
+    points = list(points)
+    if cache is not None:
+        pending = []
+        for item in _take_cached(points, target, cache, run_mode):
+            if isinstance(item, SweepResult):
+                yield item
+            else:
+                pending.append(item)
+        points = pending
+    if not points:
+        return
+    n = min(workers or os.cpu_count() or 1, len(points))
+
+    if n == 1:
+        _init_worker(target, run_mode, cell_permute, cache, journal, checkpoints)
+        for point in points:
+            yield _run_point(point)
+        return
+
+    ctx = mp.get_context("spawn")   # NEURON の状態を親からコピーしない
+    with ProcessPoolExecutor(max_workers=n, mp_context=ctx, initializer=_init_worker,
+                             initargs=(target, run_mode, cell_permute, cache, journal, checkpoints)) as pool:
+        futures = {pool.submit(_run_point, p): p for p in points}
+        for fut in as_completed(futures):
+            try:
+                yield fut.result()
+            except Exception:
+                # ワーカー自体が落ちた（segfault など）
+                point = futures[fut]
+                yield SweepResult(point.key, point.output, error=traceback.format_exc())
+
+
+def _take_cached(points: list[SweepPoint], target, cache, run_mode: str = "classic"):
+    """キャッシュにある点は出力へコピーして SweepResult を、無い点は cache_key を付けて返す。"""
+    base_text = PARAM_PATH.read_text(encoding="utf-8")
+    desc = target.describe()
+    for point in points:
+        t0 = time.perf_counter()
+        point.cache_key = cache.key(effective_params(point.params, base_text), desc, run_mode)
+        if cache.copy_to(point.cache_key, point.output):
+            yield SweepResult(point.key, point.output, build="cache",
+                              elapsed=time.perf_counter() - t0, cached=True)
+        else:
+            yield point
@@ -3,14 +3,37 @@
 
 from itertools import product
 from pathlib import Path
-import subprocess, sys, re, shutil
+
+from cache import ResultCache
+from journal import SweepJournal, run_journaled
+from sweep import BandPowerTarget, BundleTarget, SpikeTarget, SweepPoint, SomaTarget
 
 BASE = Path(__file__).resolve().parent
-PY   = sys.executable
 
-PARAM_PATH = BASE / "src" / "parameters_new.hoc"
-INIT = str((BASE / "init.py").resolve())
 TARGET = "OFF_GC"
+TARGET_INDEX = 0
+# 1回の実行でまとめて記録する細胞（細胞種 → "all" / "a:b" / 番号のリスト）。
+# 1つのバンドル（BUNDLE_*.trace。列名は "AIIAC[0]" など）に保存し、解析スクリプトは PREFIX="BUNDLE" で読む。
+# None なら従来どおり TARGET[TARGET_INDEX] だけを記録する
+RECORD = {"AIIAC": "all", "ON_GC": [0], "OFF_GC": [0]}
+# True なら膜電位は保存せず、ON/OFF GC 全細胞のスパイク時刻だけを SPIKES_*.spikes に保存する
+# （mGC_firingrate_heatmap.py は PREFIX="SPIKES" でそのまま読める）
+SPIKES_ONLY = False
+# True なら膜電位は保存せず、AIIAC 全細胞の 5–15 Hz バンドパワーを実行中に計算して PSD_*.psd に保存する
+# （aiiac_bandpower_heatmap_*.py は PREFIX="PSD" でそのまま読める。区間・帯域は bandpower.py の既定値）
+BANDPOWER_ONLY = False
+LABEL = "SPIKES" if SPIKES_ONLY else "PSD" if BANDPOWER_ONLY else ("BUNDLE" if RECORD else TARGET)
+# 実行モード: "coreneuron"（psolve を CoreNEURON に渡す） or "classic"
+RUN_MODE = "coreneuron"
+# 並列ワーカー数（None なら全コア、1 なら並列にしない）
+WORKERS = None
+# 同じ条件の結果が .sim_cache/ にあれば再計算しない（False なら毎回計算する）
+USE_CACHE = True
+# 失敗した点をやり直す上限（RESULTS_DIR/sweep_journal.jsonl に記録。完了済みの点は再開時に飛ばす）
+MAX_ATTEMPTS = 3
+# 出力の書式: ".trace"（バイナリ。traces.py で memmap 読み込み） or ".txt"（従来の CSV）
+OUTPUT_SUFFIX = ".trace"
+SUFFIX = ".spikes" if SPIKES_ONLY else ".psd" if BANDPOWER_ONLY else OUTPUT_SUFFIX
 
 # ===== sweep settings (ONLY these two) =====
 x_list = [i / 20 for i in range(0, 21)]  # 0.0 ... 1.0
@@ -23,104 +46,56 @@ y_list = [i / 20 for i in range(0, 21)]  # 0.0 ... 1.0
 BASE_g_RBC2AC = 0.0012
 BASE_gj_AC2CB = 0.0005
 
-RESULTS_DIR = BASE / f"Dim_{TARGET}_8-9M_gRBC2ACx_gjAC2CBy"
+RESULTS_DIR = BASE / f"Dim_{LABEL}_8-9M_gRBC2ACx_gjAC2CBy"
 # RESULTS_DIR = BASE / f"Dim_{TARGET}_8-9M_gRBC2ACx_gjAC2CBy"
 RESULTS_DIR.mkdir(exist_ok=True)
 
-ORIGINAL_TEXT = PARAM_PATH.read_text(encoding="utf-8")
-
-
-def replace_var(src: str, name: str, value_str: str) -> str:
-    """
-    hocの「name = value ...」の value 部分だけ差し替える（コメント等は維持）。
-    """
-    pattern = re.compile(
-        rf'^(\s*{re.escape(name)}\s*=\s*)([^/\n]*)(.*)$',
-        re.MULTILINE
-    )
-    if not pattern.search(src):
-        raise RuntimeError(f"[ERROR] {name} が {PARAM_PATH.name} 内に見つかりません。")
-
-    return pattern.sub(lambda m: f"{m.group(1)}{value_str}{m.group(3)}", src, count=1)
 
-
-def make_param_text(x: float, y: float) -> str:
+def point_params(x: float, y: float) -> dict:
     """
-    g_RBC2AC と gj_AC2CB だけを書き換えたhocテキストを返す。
-    それ以外は ORIGINAL_TEXT のまま固定。
+    g_RBC2AC と gj_AC2CB だけを上書きする（hoc の式として渡す）。
+    それ以外は parameters_new.hoc のまま固定。
     """
-    text = ORIGINAL_TEXT
-    text = replace_var(text, "g_RBC2AC", f"{BASE_g_RBC2AC:.6g} * {x:.2f}")
-    text = replace_var(text, "gj_AC2CB", f"{BASE_gj_AC2CB:.6g} * {y:.2f}")
-    return text
-
+    return {
+        "g_RBC2AC": f"{BASE_g_RBC2AC:.6g} * {x:.2f}",
+        "gj_AC2CB": f"{BASE_gj_AC2CB:.6g} * {y:.2f}",
+    }
 
-def write_parameters(x: float, y: float) -> None:
-    new_text = make_param_text(x, y)
 
-    # 念のためバックアップを1回だけ作る
-    bak = PARAM_PATH.with_suffix(PARAM_PATH.suffix + ".bak")
-    if not bak.exists():
-        shutil.copy2(PARAM_PATH, bak)
-
-    PARAM_PATH.write_text(new_text, encoding="utf-8")
-
-
-def restore_parameters() -> None:
-    bak = PARAM_PATH.with_suffix(PARAM_PATH.suffix + ".bak")
-    if bak.exists():
-        shutil.copy2(bak, PARAM_PATH)
-
-
-try:
+def make_points() -> list[SweepPoint]:
+    points = []
     for x, y in product(x_list, y_list):
         ix, iy = int(round(x * 100)), int(round(y * 100))
-        print(f"[RUN] x={x:.2f}, y={y:.2f}  "
-              f"(g_RBC2AC={BASE_g_RBC2AC}*{x:.2f}, gj_AC2CB={BASE_gj_AC2CB}*{y:.2f})")
-
-        # 1) hoc書き換え（2変数のみ）
-        write_parameters(x, y)
-
-        # 2) 実行前に「既にあるtxt」を記録して、実行後に増えた分だけ拾う
-        before = {p.resolve() for p in BASE.glob("*.txt")}
-
-        res = subprocess.run(
-            [PY, INIT],
-            cwd=BASE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
-        )
-
-        if res.returncode != 0:
-            log_path = RESULTS_DIR / f"FAIL_x{ix:02d}_y{iy:02d}.log"
-            log_path.write_text(res.stdout, encoding="utf-8")
-            tail = "\n".join(res.stdout.splitlines()[-40:])
-            print(f"[WARN] FAILED x{ix:02d}_y{iy:02d} (code={res.returncode}) "
-                  f"log -> {log_path.name}\n--- log tail ---\n{tail}\n--- end ---")
+        # 条件が分かる名前で保存（x,yは0..100の整数化）
+        key = f"x{ix:03d}_y{iy:03d}"
+        points.append(SweepPoint(key, point_params(x, y), RESULTS_DIR / f"{LABEL}_{key}{SUFFIX}"))
+    return points
+
+
+if __name__ == "__main__":
+    # 2変数ともコンダクタンスなので、各ワーカーはネットワークを最初の1回だけ作る
+    # （各点では Ribbon_syn_set / AC_ONBC_GJ_set で値を入れ直して finitialize し直す）
+    points = make_points()
+    print(f"[RUN] {len(points)} points (g_RBC2AC={BASE_g_RBC2AC}*x, gj_AC2CB={BASE_gj_AC2CB}*y)")
+
+    journal = SweepJournal(RESULTS_DIR / "sweep_journal.jsonl", max_attempts=MAX_ATTEMPTS)
+    cache = ResultCache() if USE_CACHE else None
+    if SPIKES_ONLY:
+        target = SpikeTarget({"ON_GC": "all", "OFF_GC": "all"})
+    elif BANDPOWER_ONLY:
+        target = BandPowerTarget({"AIIAC": "all"})
+    else:
+        target = BundleTarget(RECORD) if RECORD else SomaTarget(TARGET, TARGET_INDEX)
+    for res in run_journaled(points, target, journal,
+                             workers=WORKERS, run_mode=RUN_MODE, cache=cache):
+        if not res.ok:
+            log_path = RESULTS_DIR / f"FAIL_{res.key}.log"
+            log_path.write_text(res.error, encoding="utf-8")
+            print(f"[WARN] FAILED {res.key} log -> {log_path.name}")
             continue
-
-        after = [p for p in BASE.glob("*.txt") if p.resolve() not in before]
-        if not after:
-            # 念のためフォールバック（最新txt）
-            out_candidates = list(BASE.glob("*.txt"))
-            if not out_candidates:
-                print(f"[WARN] x{ix:02d}_y{iy:02d} で .txt 出力が見つかりませんでした。")
-                continue
-            out_txt = max(out_candidates, key=lambda p: p.stat().st_mtime)
-        else:
-            # 新規に増えたtxtのうち最新
-            out_txt = max(after, key=lambda p: p.stat().st_mtime)
-
-        # 3) 条件が分かる名前で保存（x,yは0..10の整数化）
-        new_name = RESULTS_DIR / f"{TARGET}_x{ix:03d}_y{iy:03d}.txt"
-        if new_name.exists():
-            new_name.unlink()
-        shutil.move(str(out_txt), str(new_name))
-        print(f"[OK] -> {new_name.name}")
+        if res.cached:
+            print(f"[CACHE] -> {res.output.name}")
+            continue
+        print(f"[OK] -> {res.output.name} ({res.run_mode}, {res.elapsed:.1f} s)")
 
     print("[DONE] all sweeps finished.")
-
-finally:
-    # 実験後にparameters_new.hocを元に戻したい場合は有効
-    restore_parameters()
@@ -3,116 +3,93 @@
 
 from itertools import product
 from pathlib import Path
-import subprocess, sys, re, shutil
 
-BASE = Path(__file__).resolve().parent
-PY   = sys.executable
+from cache import ResultCache
+from journal import SweepJournal, run_journaled
+from sweep import BandPowerTarget, BundleTarget, SpikeTarget, SweepPoint, SomaTarget
 
-PARAM_PATH = BASE / "src" / "parameters_new.hoc"
+BASE = Path(__file__).resolve().parent
 
-INIT = str((BASE / "init.py").resolve())
 TARGET = "AIIAC"
+TARGET_INDEX = 0
+# 1回の実行でまとめて記録する細胞（細胞種 → "all" / "a:b" / 番号のリスト）。
+# 1つのバンドル（BUNDLE_*.trace。列名は "AIIAC[0]" など）に保存し、解析スクリプトは PREFIX="BUNDLE" で読む。
+# None なら従来どおり TARGET[TARGET_INDEX] だけを記録する
+RECORD = {"AIIAC": "all", "ON_GC": [0], "OFF_GC": [0]}
+# True なら膜電位は保存せず、ON/OFF GC 全細胞のスパイク時刻だけを SPIKES_*.spikes に保存する
+# （mGC_firingrate_heatmap.py は PREFIX="SPIKES" でそのまま読める）
+SPIKES_ONLY = False
+# True なら膜電位は保存せず、AIIAC 全細胞の 5–15 Hz バンドパワーを実行中に計算して PSD_*.psd に保存する
+# （aiiac_bandpower_heatmap_*.py は PREFIX="PSD" でそのまま読める。区間・帯域は bandpower.py の既定値）
+BANDPOWER_ONLY = False
+LABEL = "SPIKES" if SPIKES_ONLY else "PSD" if BANDPOWER_ONLY else ("BUNDLE" if RECORD else TARGET)
+# 実行モード: "coreneuron"（psolve を CoreNEURON に渡す） or "classic"
+RUN_MODE = "coreneuron"
+# 並列ワーカー数（None なら全コア、1 なら並列にしない）
+WORKERS = None
+# 同じ条件の結果が .sim_cache/ にあれば再計算しない（False なら毎回計算する）
+USE_CACHE = True
+# 失敗した点をやり直す上限（RESULTS_DIR/sweep_journal.jsonl に記録。完了済みの点は再開時に飛ばす）
+MAX_ATTEMPTS = 3
+# 出力の書式: ".trace"（バイナリ。traces.py で memmap 読み込み） or ".txt"（従来の CSV）
+OUTPUT_SUFFIX = ".trace"
+SUFFIX = ".spikes" if SPIKES_ONLY else ".psd" if BANDPOWER_ONLY else OUTPUT_SUFFIX
 
 Num_R_list    = [1, 40, 80, 120, 160, 200, 240, 280, 320, 360, 400]
 Num_C_RP_list = list(range(20, -1, -2))   # 20,18,...,0
 
 # Num_R_list    = [1]
-# Num_C_RP_list = [0]  
+# Num_C_RP_list = [0]
 
 # 結果を出力したテキストをまとめるフォルダ
-RESULTS_DIR = BASE / f"Dim_{TARGET}_fovea"
+RESULTS_DIR = BASE / f"Dim_{LABEL}_fovea"
 RESULTS_DIR.mkdir(exist_ok=True)
 
-# --- parameters.hoc をいじるための準備 ---
-# 元の parameters.hoc をテンプレートとして読み込んでおく
-
-ORIGINAL_TEXT = PARAM_PATH.read_text(encoding="utf-8")
 
-def make_param_text(num_r: int, num_c_rp: int, g_r2rb: float) -> str:
+def point_params(num_r: int, num_c_rp: int) -> dict:
     """
-    Num_R / Num_C_RP / g_R2RB だけ値を差し替えた文字列を返す。
-    他の部分（コメントなど）は一切変えない。
+    Num_R / Num_C_RP / g_R2RB だけ上書きする（他は parameters_new.hoc のまま）。
     """
-    text = ORIGINAL_TEXT  # 作業用
-
-    def replace_var(src: str, name: str, value_str: str) -> str:
-        # 例: Num_R    = 400     // コメント
-        pattern = re.compile(
-            rf'^(\s*{name}\s*=\s*)([^/\n]*)(.*)$',
-            re.MULTILINE
-        )
-
-        if not pattern.search(src):
-            print(f"[WARN] {name} が {PARAM_PATH.name} 内に見つかりませんでした。")
-            return src  # 見つからなければ何も変えない
-
-        def repl(m: re.Match) -> str:
-            # m.group(1): "Num_R =" など左側
-            # m.group(2): もとの数値部
-            # m.group(3): コメントなど行末
-            return f"{m.group(1)}{value_str}{m.group(3)}"
-
-        return pattern.sub(repl, src, count=1)
-
-    # 3つの変数だけ順番に書き換え
-    text = replace_var(text, "Num_R",    str(num_r))
-    text = replace_var(text, "Num_C_RP", str(num_c_rp))
-    text = replace_var(text, "g_R2RB",   f"{g_r2rb:.8g}")
-
-    return text  # ★ここが超重要：必ず文字列を返す
-
-
-def write_parameters(num_r: int, num_c_rp: int, g_r2rb: float) -> None:
-    new_text = make_param_text(num_r, num_c_rp, g_r2rb)
-    if new_text is None:
-        raise RuntimeError("make_param_text が None を返しました。")
-
-    # 念のためバックアップを1回だけ作っておく
-    bak = PARAM_PATH.with_suffix(PARAM_PATH.suffix + ".bak")
-    if not bak.exists():
-        shutil.copy2(PARAM_PATH, bak)
-
-    PARAM_PATH.write_text(new_text, encoding="utf-8")
-
-# --- 実行ループ ---
-
-for R, C in product(Num_R_list, Num_C_RP_list):
     # 条件ごとの g_R2RB
-    g = 0.0 if R == 1 else 1e-5
-
-    print(f"[RUN] Num_R={R:3d}, Num_C_RP={C:2d}, g_R2RB={g}")
+    g = 0.0 if num_r == 1 else 1e-5
+    return {"Num_R": num_r, "Num_C_RP": num_c_rp, "g_R2RB": g}
 
-    # 1) parameters.hoc の変数を上書き
-    write_parameters(R, C, g)
 
-    # 2) init.py を実行（毎回メモリ解放）
-    res = subprocess.run([PY, INIT],
-                         cwd=BASE,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT,
-                         text=True)
+def make_points() -> list[SweepPoint]:
+    # Num_R ごとにまとめて並べる（同じワーカーが続けて受け取れば作り直さずに済む）
+    points = []
+    for R, C in product(Num_R_list, Num_C_RP_list):
+        key = f"R{R:03d}_C{C:02d}"
+        # 出力ファイル名を BUNDLE_Rxxx_Cyy.trace（RECORD=None なら AIIAC_Rxxx_Cyy.trace）に固定
+        points.append(SweepPoint(key, point_params(R, C), RESULTS_DIR / f"{LABEL}_{key}{SUFFIX}"))
+    return points
 
-    if res.returncode != 0:
-        # エラー時はログ末尾だけ表示して次へ
-        tail = "\n".join(res.stdout.splitlines()[-20:])
-        print(f"[WARN] FAILED R{R:03d}_C{C:02d} (code={res.returncode})\n--- log tail ---\n{tail}\n--- end ---")
-        continue
 
-    # init.py が出力した .txtをフォルダに移す（名前に R/C を付ける）
-    out_candidates = list(BASE.glob("*.txt"))
-    if not out_candidates:
-        print(f"[WARN] R{R}_C{C} で .txt 出力が見つかりませんでした。")
-        continue
-
-    out_txt = max(out_candidates, key=lambda p: p.stat().st_mtime)
-
-    # 出力ファイル名を AIIAC_Rxxx_Cyy.txt に固定
-    # new_name = RESULTS_DIR / f"AIIAC_R{R:03d}_C{C:02d}.txt"
-    new_name = RESULTS_DIR / f"{TARGET}_R{R:03d}_C{C:02d}.txt"
-
-    if new_name.exists():
-        new_name.unlink()
-    shutil.move(str(out_txt), str(new_name))
-    print(f"[OK] -> {new_name.name}")
-
-print("[DONE] all sweeps finished.")
+# --- 実行ループ ---
+# 各ワーカーはネットワークを1回だけ作り、Num_R が変わったときだけ作り直す
+# （Num_C_RP / g_R2RB は構築済みのシナプス・ギャップ結合に値を入れ直すだけ）
+if __name__ == "__main__":
+    points = make_points()
+    print(f"[RUN] {len(points)} points (Num_R x Num_C_RP)")
+
+    journal = SweepJournal(RESULTS_DIR / "sweep_journal.jsonl", max_attempts=MAX_ATTEMPTS)
+    cache = ResultCache() if USE_CACHE else None
+    if SPIKES_ONLY:
+        target = SpikeTarget({"ON_GC": "all", "OFF_GC": "all"})
+    elif BANDPOWER_ONLY:
+        target = BandPowerTarget({"AIIAC": "all"})
+    else:
+        target = BundleTarget(RECORD) if RECORD else SomaTarget(TARGET, TARGET_INDEX)
+    for res in run_journaled(points, target, journal,
+                             workers=WORKERS, run_mode=RUN_MODE, cache=cache):
+        if not res.ok:
+            # エラー時はログ末尾だけ表示して次へ
+            tail = "\n".join(res.error.splitlines()[-20:])
+            print(f"[WARN] FAILED {res.key}\n--- log tail ---\n{tail}\n--- end ---")
+            continue
+        if res.cached:
+            print(f"[CACHE] -> {res.output.name}")
+            continue
+        print(f"[OK] -> {res.output.name} ({res.build}, {res.run_mode}, {res.elapsed:.1f} s)")
+
+    print("[DONE] all sweeps finished.")
@@ -3,18 +3,32 @@
 
 from itertools import product
 from pathlib import Path
-import subprocess, sys, re, shutil, time
 
-BASE = Path(__file__).resolve().parent
-PY   = sys.executable
-
-PARAM_PATH = BASE / "src" / "parameters_new.hoc"
+from cache import ResultCache
+from journal import SweepJournal, run_journaled
+from sweep import SweepPoint, SynapseTarget
 
-# ★ここを init_syn.py にする
-INIT_SYN = str((BASE / "init_syn.py").resolve())
+BASE = Path(__file__).resolve().parent
 
 # sweep target label（フォルダ名に使うだけ。中身は自由）
 TARGET = "SYN"
+# 実行モード: "coreneuron"（psolve を CoreNEURON に渡す） or "classic"
+RUN_MODE = "coreneuron"
+# 並列ワーカー数（None なら全コア、1 なら並列にしない）
+WORKERS = None
+# 同じ条件の結果が .sim_cache/ にあれば再計算しない（False なら毎回計算する）
+USE_CACHE = True
+# 失敗した点をやり直す上限（RESULTS_DIR/sweep_journal.jsonl に記録。完了済みの点は再開時に飛ばす）
+MAX_ATTEMPTS = 3
+# 出力の書式: ".trace"（バイナリ。traces.py で memmap 読み込み） or ".txt"（従来の CSV）
+OUTPUT_SUFFIX = ".trace"
+
+# 計測対象シナプス（init_syn.py と同じ指定）
+SYN_ARRAY_NAME = "ONCB2ONGC"   # hoc 側の配列名に合わせる
+POST_IDX = 0
+PRE_IDX  = 0
+syn_name  = "p1"               # 例: "isyn", "i", "g", "u", "P1", "w" など
+syn_label = f"{SYN_ARRAY_NAME}_{syn_name}"
 
 Num_R_list    = [1, 40, 80, 120, 160, 200, 240, 280, 320, 360, 400]
 Num_C_RP_list = list(range(20, -1, -2))   # 20,18,...,0
@@ -22,116 +36,43 @@ Num_C_RP_list = list(range(20, -1, -2))   # 20,18,...,0
 RESULTS_DIR = BASE / f"Dim_{TARGET}_fovea"
 RESULTS_DIR.mkdir(exist_ok=True)
 
-ORIGINAL_TEXT = PARAM_PATH.read_text(encoding="utf-8")
 
-def make_param_text(num_r: int, num_c_rp: int, g_r2rb: float) -> str:
+def point_params(num_r: int, num_c_rp: int) -> dict:
     """
-    Num_R / Num_C_RP / g_R2RB だけ値を差し替えた文字列を返す。
-    他の部分（コメントなど）は一切変えない。
+    Num_R / Num_C_RP / g_R2RB だけ上書きする（他は parameters_new.hoc のまま）。
     """
-    text = ORIGINAL_TEXT
-
-    def replace_var(src: str, name: str, value_str: str) -> str:
-        pattern = re.compile(
-            rf'^(\s*{name}\s*=\s*)([^/\n]*)(.*)$',
-            re.MULTILINE
-        )
-
-        if not pattern.search(src):
-            print(f"[WARN] {name} が {PARAM_PATH.name} 内に見つかりませんでした。")
-            return src
-
-        def repl(m: re.Match) -> str:
-            return f"{m.group(1)}{value_str}{m.group(3)}"
-
-        return pattern.sub(repl, src, count=1)
+    g = 0.0 if num_r == 1 else 1e-5
+    return {"Num_R": num_r, "Num_C_RP": num_c_rp, "g_R2RB": g}
 
-    text = replace_var(text, "Num_R",    str(num_r))
-    text = replace_var(text, "Num_C_RP", str(num_c_rp))
-    text = replace_var(text, "g_R2RB",   f"{g_r2rb:.8g}")
-    return text
 
-
-def write_parameters(num_r: int, num_c_rp: int, g_r2rb: float) -> None:
-    new_text = make_param_text(num_r, num_c_rp, g_r2rb)
-    if new_text is None:
-        raise RuntimeError("make_param_text が None を返しました。")
-
-    bak = PARAM_PATH.with_suffix(PARAM_PATH.suffix + ".bak")
-    if not bak.exists():
-        shutil.copy2(PARAM_PATH, bak)
-
-    PARAM_PATH.write_text(new_text, encoding="utf-8")
-
-
-def extract_txt_name_from_stdout(stdout: str) -> str | None:
-    """
-    init_syn.py の stdout から *.txt を含む行を後ろから探してファイル名を抜く。
-    例: "ONCB2ONGC_post0_pre0_isyn_R040_C20.txt"
-    """
-    lines = stdout.splitlines()
-    for line in reversed(lines):
-        m = re.search(r'([A-Za-z0-9_\-\.]+\.txt)\b', line)
-        if m:
-            return m.group(1)
-    return None
-
-
-def newest_txt_since(t0: float) -> Path | None:
-    """
-    t0 以降に更新された txt のうち最新を返す（保険）
-    """
-    cands = []
-    for p in BASE.glob("*.txt"):
-        try:
-            if p.stat().st_mtime >= (t0 - 0.2):
-                cands.append(p)
-        except FileNotFoundError:
-            pass
-    if not cands:
-        return None
-    return max(cands, key=lambda p: p.stat().st_mtime)
+def make_points() -> list[SweepPoint]:
+    points = []
+    for R, C in product(Num_R_list, Num_C_RP_list):
+        # ファイル名は init_syn.py と同じ付け方
+        out = RESULTS_DIR / f"{syn_label}_R{R}_C{C}{OUTPUT_SUFFIX}"
+        points.append(SweepPoint(f"R{R:03d}_C{C:02d}", point_params(R, C), out))
+    return points
 
 
 # --- 実行ループ ---
-for R, C in product(Num_R_list, Num_C_RP_list):
-    g = 0.0 if R == 1 else 1e-5
-    print(f"[RUN] Num_R={R:3d}, Num_C_RP={C:2d}, g_R2RB={g}")
-
-    # 1) parameters_new.hoc を上書き
-    write_parameters(R, C, g)
-
-    # 2) init_syn.py を実行（毎回メモリ解放）
-    t_run = time.time()
-    res = subprocess.run([PY, INIT_SYN],
-                         cwd=BASE,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT,
-                         text=True)
-
-    if res.returncode != 0:
-        tail = "\n".join(res.stdout.splitlines()[-30:])
-        print(f"[WARN] FAILED R{R:03d}_C{C:02d} (code={res.returncode})\n--- log tail ---\n{tail}\n--- end ---")
-        continue
-
-    # 3) init_syn.py が print した txt 名を拾う（最優先）
-    out_name = extract_txt_name_from_stdout(res.stdout)
-    out_path = (BASE / out_name) if out_name else None
-
-    # 4) もし拾えなければ「最新の txt」を拾う（保険）
-    if (out_path is None) or (not out_path.exists()):
-        out_path = newest_txt_since(t_run)
-
-    if out_path is None or not out_path.exists():
-        print(f"[WARN] R{R}_C{C} で .txt 出力が見つかりませんでした。")
-        continue
-
-    # 5) 移動（ファイル名は init_syn.py が付けたものを尊重）
-    new_name = RESULTS_DIR / out_path.name
-    if new_name.exists():
-        new_name.unlink()
-    shutil.move(str(out_path), str(new_name))
-
-    print(f"[OK] -> {new_name.name}")
-
-print("[DONE] all sweeps finished.")
+# 各ワーカーはネットワークを1回だけ作り、Num_R が変わったときだけ作り直す
+# （シナプスは作り直すたびに新しいオブジェクトになるので、SynapseTarget が毎回選び直す）
+if __name__ == "__main__":
+    points = make_points()
+    target = SynapseTarget(SYN_ARRAY_NAME, POST_IDX, PRE_IDX, syn_name)
+    print(f"[RUN] {len(points)} points, recording {syn_label}")
+
+    journal = SweepJournal(RESULTS_DIR / "sweep_journal.jsonl", max_attempts=MAX_ATTEMPTS)
+    cache = ResultCache() if USE_CACHE else None
+    for res in run_journaled(points, target, journal,
+                             workers=WORKERS, run_mode=RUN_MODE, cache=cache):
+        if not res.ok:
+            tail = "\n".join(res.error.splitlines()[-30:])
+            print(f"[WARN] FAILED {res.key}\n--- log tail ---\n{tail}\n--- end ---")
+            continue
+        if res.cached:
+            print(f"[CACHE] -> {res.output.name}")
+            continue
+        print(f"[OK] -> {res.output.name} ({res.run_mode}, {res.elapsed:.1f} s)")
+
+    print("[DONE] all sweeps finished.")
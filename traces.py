@@ -0,0 +1,374 @@
+"""
+膜電位・シナプス変数のトレースをバイナリ（.trace）で保存・読み込みするモジュール。
+
+書式（1ファイル = 1トレース）:
+- 先頭 8 バイト: マジック b"RTRACE01"
+- 次の 4 バイト: ヘッダ長（リトルエンディアン uint32）
+- JSON ヘッダ（UTF-8。データの先頭が DATA_ALIGN バイト境界に来るよう空白で埋める）
+    {"dtype": "<f4", "shape": [n_samples, n_columns], "t0": 1000.0, "dt": 0.0625,
+     "columns": ["voltage(mV)"], "meta": {"target": ..., "params": ..., "seed": ...}}
+- 生データ: shape の C 順配列（時刻の列は持たず t = t0 + k * dt で復元する）
+
+読み込みは np.memmap なので、ファイル全体を読まずに必要な区間だけを切り出せる:
+    tr = open_trace("AIIAC_R400_C20.trace")
+    t, v = tr.window(1000.0, 6000.0)      # v は memmap のビュー（コピーしない）
+
+スパイク時刻だけを記録した .spikes（recording.SpikeRecorder の出力）も同じ作りで、
+細胞ごとのスパイク時刻 (ms, float64) を続けて並べ、ヘッダに細胞名と個数を持つ:
+    sp = open_spikes("BUNDLE_R400_C20.spikes")
+    sp["OFF_GC[0]"]                           # 1細胞分のスパイク時刻（memmap のビュー）
+    sp.rate_hz("OFF_GC[0]", 1000.0, 6000.0)   # 区間の発火率
+
+既存の .txt（time(ms),value の2列CSV）は load_trace() でそのまま読めるほか、
+コマンドラインから .trace にまとめて変換できる:
+    python traces.py Dim_AIIAC_fovea                  # フォルダ内の *.txt を変換
+    python traces.py Dim_AIIAC_fovea --delete-txt     # 変換できたら元の txt を消す
+    python traces.py --info AIIAC_R400_C20.trace      # ヘッダだけ表示
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+MAGIC = b"RTRACE01"
+SPIKES_MAGIC = b"RSPIKE01"
+DATA_ALIGN = 64
+TRACE_SUFFIX = ".trace"
+SPIKES_SUFFIX = ".spikes"
+TEXT_SUFFIX = ".txt"
+# 時刻列が等間隔かどうかの判定に使う許容誤差（txt は小数4桁で丸められている）
+TIME_TOL_MS = 1e-3
+
+
+class Trace:
+    """開いた .trace ファイル（data は読み取り専用の memmap）。"""
+
+    def __init__(self, path: Path, t0: float, dt: float, columns: list[str], meta: dict,
+                 data: np.ndarray):
+        self.path = Path(path)
+        self.t0 = float(t0)
+        self.dt = float(dt)
+        self.columns = list(columns)
+        self.meta = meta
+        self.data = data
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def times(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """サンプル番号 start..stop の時刻 (ms)。"""
+        stop = len(self) if stop is None else stop
+        return self.t0 + np.arange(start, stop) * self.dt
+
+    def values(self, column: int | str = 0) -> np.ndarray:
+        """1列分の値（memmap のビュー）。"""
+        return self.data[:, column_index(self.columns, column)]
+
+    def index_range(self, t_start: float | None = None, t_stop: float | None = None) -> tuple[int, int]:
+        """t_start <= t <= t_stop に入るサンプル番号の範囲 [i0, i1)。"""
+        n = len(self)
+        # 丸めで境界のサンプルを落とさないよう半サンプル分の余裕を持たせる
+        i0 = 0 if t_start is None else int(np.ceil((t_start - self.t0) / self.dt - 0.5))
+        i1 = n if t_stop is None else int(np.floor((t_stop - self.t0) / self.dt + 0.5)) + 1
+        return min(max(i0, 0), n), min(max(i1, 0), n)
+
+    def window(self, t_start: float | None = None, t_stop: float | None = None,
+               column: int | str = 0) -> tuple[np.ndarray, np.ndarray]:
+        """区間内の (time_ms, values)。values はコピーせずに切り出したビュー。"""
+        i0, i1 = self.index_range(t_start, t_stop)
+        return self.times(i0, i1), self.values(column)[i0:i1]
+
+
+def column_index(columns: list[str], column: int | str) -> int:
+    """
+    列名（"AIIAC[0]" など）または番号から列番号を返す。
+
+    1列しか無いファイル（1細胞だけ記録した従来の出力）は、列名が違ってもその列を返すので、
+    バンドルと単独の出力を同じ指定で読める。
+    """
+    if not isinstance(column, str):
+        return int(column)
+    if column in columns:
+        return columns.index(column)
+    if len(columns) == 1:
+        return 0
+    raise KeyError(f"column {column!r} not found; available: {columns}")
+
+
+def _read_header(f, expected: bytes = MAGIC) -> tuple[dict, int]:
+    magic = f.read(len(expected))
+    if magic != expected:
+        raise ValueError(f"{getattr(f, 'name', '?')}: not a {expected[1:-2].decode().lower()} file "
+                         f"(bad magic {magic!r})")
+    (size,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(size).decode("utf-8"))
+    return header, len(expected) + 4 + size
+
+
+def _write_file(path, magic: bytes, header: dict, data: np.ndarray) -> None:
+    """マジック・ヘッダ長・JSON ヘッダ（DATA_ALIGN 境界まで空白で埋める）・生データの順に書く。"""
+    text = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    pad = -(len(magic) + 4 + len(text)) % DATA_ALIGN
+    text += b" " * pad
+    with open(path, "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<I", len(text)))
+        f.write(text)
+        f.write(np.ascontiguousarray(data).tobytes())
+
+
+def open_trace(path) -> Trace:
+    """.trace を開く（データは memmap。ファイル全体は読まない）。"""
+    path = Path(path)
+    with path.open("rb") as f:
+        header, offset = _read_header(f)
+    shape = tuple(header["shape"])
+    if shape[0] == 0:
+        data = np.empty(shape, dtype=header["dtype"])
+    else:
+        data = np.memmap(path, dtype=header["dtype"], mode="r", offset=offset, shape=shape)
+    return Trace(path, header["t0"], header["dt"], header["columns"], header.get("meta", {}), data)
+
+
+def write_trace(path, values, t0: float, dt: float, columns: list[str] | None = None,
+                meta: dict | None = None, dtype: str = "<f4") -> None:
+    """
+    values（1次元 or (n_samples, n_columns)）を .trace として書き出す。
+
+    既定の float32 でも膜電位で 1e-5 mV 程度の分解能があり、txt の小数4桁より細かい。
+    """
+    data = np.asarray(values, dtype=dtype)
+    if data.ndim == 1:
+        data = data[:, None]
+    if columns is None:
+        columns = [f"col{i}" for i in range(data.shape[1])]
+    if len(columns) != data.shape[1]:
+        raise ValueError(f"{len(columns)} column names for {data.shape[1]} columns")
+    header = {"dtype": np.dtype(dtype).str, "shape": list(data.shape), "t0": float(t0),
+              "dt": float(dt), "columns": list(columns), "meta": meta or {}}
+    _write_file(path, MAGIC, header, data)
+
+
+class SpikeTrains:
+    """開いた .spikes ファイル（細胞名 → スパイク時刻 (ms)。data は memmap）。"""
+
+    def __init__(self, path: Path, cells: list[str], counts: list[int], t_start: float,
+                 t_stop: float, meta: dict, data: np.ndarray):
+        self.path = Path(path)
+        self.cells = list(cells)
+        self.counts = list(counts)
+        self.t_start = float(t_start)
+        self.t_stop = float(t_stop)
+        self.meta = meta
+        self.data = data
+        self._offsets = np.concatenate([[0], np.cumsum(self.counts)]).astype(int)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __getitem__(self, cell: int | str) -> np.ndarray:
+        k = column_index(self.cells, cell)
+        return self.data[self._offsets[k]:self._offsets[k + 1]]
+
+    def window(self, cell: int | str, t_start: float | None = None,
+               t_stop: float | None = None) -> np.ndarray:
+        """t_start < t <= t_stop のスパイク時刻（解析スクリプトの「前後2サンプルとも区間内」と同じ境界）。"""
+        times = self[cell]
+        lo = self.t_start if t_start is None else t_start
+        hi = self.t_stop if t_stop is None else t_stop
+        return times[(times > lo) & (times <= hi)]
+
+    def rate_hz(self, cell: int | str, t_start: float | None = None, t_stop: float | None = None) -> float:
+        lo = self.t_start if t_start is None else t_start
+        hi = self.t_stop if t_stop is None else t_stop
+        duration_s = (hi - lo) / 1000.0
+        return len(self.window(cell, lo, hi)) / duration_s if duration_s > 0 else float("nan")
+
+
+def write_spikes(path, spikes: dict[str, np.ndarray], t_start: float, t_stop: float,
+                 meta: dict | None = None) -> None:
+    """細胞名 → スパイク時刻 (ms) を .spikes として書き出す（t_start..t_stop は記録した区間）。"""
+    cells = list(spikes)
+    arrays = [np.asarray(spikes[c], dtype="<f8").ravel() for c in cells]
+    data = np.concatenate(arrays) if arrays else np.empty(0, dtype="<f8")
+    header = {"dtype": "<f8", "cells": cells, "counts": [len(a) for a in arrays],
+              "t_start": float(t_start), "t_stop": float(t_stop), "meta": meta or {}}
+    _write_file(path, SPIKES_MAGIC, header, data)
+
+
+def open_spikes(path) -> SpikeTrains:
+    """.spikes を開く（スパイク時刻は memmap）。"""
+    path = Path(path)
+    with path.open("rb") as f:
+        header, offset = _read_header(f, SPIKES_MAGIC)
+    n = int(sum(header["counts"]))
+    if n == 0:
+        data = np.empty(0, dtype=header["dtype"])
+    else:
+        data = np.memmap(path, dtype=header["dtype"], mode="r", offset=offset, shape=(n,))
+    return SpikeTrains(path, header["cells"], header["counts"], header["t_start"], header["t_stop"],
+                       header.get("meta", {}), data)
+
+
+def uniform_time(t: np.ndarray, tol: float = TIME_TOL_MS) -> tuple[float, float]:
+    """等間隔の時刻列から (t0, dt) を求める。等間隔でなければ ValueError。"""
+    t = np.asarray(t, dtype=float)
+    if len(t) == 0:
+        return 0.0, 0.0
+    if len(t) == 1:
+        return float(t[0]), 0.0
+    t0 = float(t[0])
+    dt = (float(t[-1]) - t0) / (len(t) - 1)
+    err = np.max(np.abs(t - (t0 + np.arange(len(t)) * dt)))
+    if err > tol:
+        raise ValueError(f"time column is not uniformly sampled (max deviation {err:.3g} ms)")
+    # txt 由来の丸め（小数4桁）を落とす
+    return round(t0, 6), round(dt, 9)
+
+
+def write_trace_arrays(path, t: np.ndarray, values: np.ndarray, columns: list[str] | None = None,
+                       meta: dict | None = None, dtype: str = "<f4") -> None:
+    """(t, values) から t0 / dt を求めて .trace に書き出す。"""
+    t0, dt = uniform_time(t)
+    write_trace(path, values, t0, dt, columns=columns, meta=meta, dtype=dtype)
+
+
+def read_text_trace(path) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """従来の txt（1行目がヘッダ、先頭列が time(ms)）を (t, values(n, k), 列名) で読む。"""
+    path = Path(path)
+    with path.open(encoding="utf-8") as f:
+        first = f.readline().strip()
+    try:
+        data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    except ValueError:
+        data = np.loadtxt(path, skiprows=1, ndmin=2)
+    if data.shape[1] < 2:
+        raise ValueError(f"{path.name}: not 2-column numeric data")
+    names = [c.strip() for c in (first.split(",") if "," in first else first.split())]
+    if len(names) >= data.shape[1]:
+        columns = names[1:data.shape[1]]
+    else:
+        columns = [f"col{i}" for i in range(data.shape[1] - 1)]
+    return data[:, 0], data[:, 1:], columns
+
+
+def load_trace(path, column: int | str = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    .trace / .txt のどちらでも (time_ms, values) を返す（解析スクリプト共通の入口）。
+
+    .trace の values は memmap のビュー。column はバンドル（複数細胞）の列名か番号。
+    """
+    path = Path(path)
+    if path.suffix == TRACE_SUFFIX:
+        tr = open_trace(path)
+        return tr.times(), tr.values(column)
+    t, values, columns = read_text_trace(path)
+    return t, values[:, column_index(columns, column)]
+
+
+# 同じ名前のファイルが複数の書式であるときの優先順（左ほど優先）
+VOLTAGE_SUFFIXES = (TRACE_SUFFIX, TEXT_SUFFIX)
+# スパイクだけ使う解析（発火率など）は .spikes があればそれを使う
+SPIKE_SUFFIXES = (SPIKES_SUFFIX,) + VOLTAGE_SUFFIXES
+
+
+def prefer_binary(paths: Iterable[Path], suffixes: tuple[str, ...] = VOLTAGE_SUFFIXES) -> list[Path]:
+    """
+    同じ名前の .trace と .txt があれば .trace だけを残す（変換途中のフォルダ用）。
+
+    suffixes（優先順）に無い拡張子（PDF や CSV など）は捨てる。発火率の解析は
+    suffixes=SPIKE_SUFFIXES で .spikes も拾う。
+    """
+    by_stem: dict[Path, Path] = {}
+    for p in paths:
+        p = Path(p)
+        if p.suffix not in suffixes:
+            continue
+        key = p.with_suffix("")
+        if key not in by_stem or suffixes.index(p.suffix) < suffixes.index(by_stem[key].suffix):
+            by_stem[key] = p
+    return sorted(by_stem.values(), key=lambda p: p.name)
+
+
+def convert_txt(src, dst=None, meta: dict | None = None, dtype: str = "<f4") -> Path:
+    """txt を .trace に変換して、書き出したパスを返す（一時ファイル → os.replace）。"""
+    src = Path(src)
+    dst = src.with_suffix(TRACE_SUFFIX) if dst is None else Path(dst)
+    t, values, columns = read_text_trace(src)
+    info = dict(meta or {}, source=src.name)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    write_trace_arrays(tmp, t, values, columns=columns, meta=info, dtype=dtype)
+    os.replace(tmp, dst)
+    return dst
+
+
+def _check_same(src: Path, dst: Path) -> None:
+    """変換結果を読み直して元の txt と一致するか確かめる（--delete-txt の前に使う）。"""
+    t, values, _ = read_text_trace(src)
+    tr = open_trace(dst)
+    if len(tr) != len(t) or not np.allclose(tr.times(), t, atol=TIME_TOL_MS):
+        raise ValueError(f"{dst.name}: time axis does not match {src.name}")
+    if not np.allclose(tr.data, values, rtol=1e-6, atol=1e-4):
+        raise ValueError(f"{dst.name}: values do not match {src.name}")
+
+
+def iter_txt(inputs: Iterable[Path], pattern: str, recursive: bool) -> list[Path]:
+    files: list[Path] = []
+    for p in inputs:
+        if p.is_dir():
+            it = p.rglob(pattern) if recursive else p.glob(pattern)
+            files.extend(q for q in it if q.is_file())
+        else:
+            files.append(p)
+    return sorted(files)
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Convert trace .txt files to the binary .trace format.")
+    ap.add_argument("inputs", nargs="+", type=Path, help="txt files or folders containing them")
+    ap.add_argument("--pattern", default="*.txt", help="glob pattern used inside folders (default: *.txt)")
+    ap.add_argument("--recursive", action="store_true", help="also search subfolders")
+    ap.add_argument("--float64", action="store_true", help="store float64 instead of float32")
+    ap.add_argument("--delete-txt", action="store_true", help="remove each txt after a verified conversion")
+    ap.add_argument("--info", action="store_true", help="print the header of .trace files and exit")
+    args = ap.parse_args(argv)
+
+    if args.info:
+        for p in args.inputs:
+            tr = open_trace(p)
+            print(f"{p}: {len(tr)} samples x {len(tr.columns)} {tr.columns}, "
+                  f"t0={tr.t0} ms, dt={tr.dt} ms, dtype={tr.data.dtype}")
+            if tr.meta:
+                print(f"  meta: {json.dumps(tr.meta, ensure_ascii=False)}")
+        return 0
+
+    dtype = "<f8" if args.float64 else "<f4"
+    files = iter_txt(args.inputs, args.pattern, args.recursive)
+    if not files:
+        print("No txt files found.", file=sys.stderr)
+        return 1
+    failed = 0
+    for src in files:
+        try:
+            dst = convert_txt(src, dtype=dtype)
+            if args.delete_txt:
+                _check_same(src, dst)
+                src.unlink()
+            print(f"[OK] {src} -> {dst.name}")
+        except Exception as e:
+            failed += 1
+            print(f"[SKIP] {src}: {e}")
+    print(f"[DONE] {len(files) - failed} converted, {failed} failed")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())